@@ -0,0 +1,161 @@
+"""
+Answer Cache - Semantic cache of generated answers
+Looks answers up by query-embedding similarity, scoped to the knowledge-base
+version they were generated against, with TTL and size-bounded eviction.
+An optional SQLite tier shares the cache between worker processes.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticAnswerCache:
+    """Answers keyed by normalized query embedding and a scope
+
+    `generation` counts invalidations (knowledge-base changes); an answer
+    passed to `store` with the `current_generation()` read before it was
+    generated is dropped if the knowledge base changed in the meantime. With `db_path`
+    entries and the generation live in SQLite, and every process keeps an
+    in-memory mirror that catches up before each lookup.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 1000, db_path: Optional[str] = None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str, Optional[List[str]], float, str]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._db = None
+        # Highest answer id loaded from the database
+        self._last_id = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, vector BLOB NOT NULL, "
+                "answer TEXT NOT NULL, sources TEXT, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+            self._db.commit()
+            self._data_version = None
+            self._sync()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def lookup(self, query_vector: List[float], scope: Tuple) -> Optional[Tuple[str, Optional[List[str]]]]:
+        """Return (answer, sources) of the most similar fresh entry in scope, if any"""
+        query = self._normalize(query_vector)
+        scope = repr(scope)
+        now = time.time()
+        with self._lock:
+            self._sync()
+            self._evict_expired(now)
+            best_id, best_score = None, self.threshold
+            for entry_id, (vector, _, _, _, entry_scope) in self._entries.items():
+                if entry_scope != scope:
+                    continue
+                score = float(np.dot(query, vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            _, answer, sources, _, _ = self._entries[best_id]
+            return answer, sources
+
+    def current_generation(self) -> int:
+        """The generation to pass to `store` for an answer about to be generated"""
+        with self._lock:
+            self._sync()
+            return self.generation
+
+    def store(self, query_vector: List[float], scope: Tuple, answer: str, sources: Optional[List[str]], generation: Optional[int] = None):
+        """Cache an answer for the query, unless the knowledge base changed since `generation`"""
+        vector = self._normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            self._sync()
+            if generation is not None and generation != self.generation:
+                return
+            if self._db is None:
+                entry_id = self._next_id
+                self._next_id += 1
+            else:
+                entry_id = self._db.execute(
+                    "INSERT INTO answers (scope, vector, answer, sources, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (repr(scope), vector.tobytes(), answer, json.dumps(sources), now)
+                ).lastrowid
+                self._db.execute(
+                    "DELETE FROM answers WHERE id <= ? OR created_at < ?", (entry_id - self.max_entries, now - self.ttl)
+                )
+                self._db.commit()
+            self._entries[entry_id] = (vector, answer, sources, now, repr(scope))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every cached answer (e.g. after the knowledge base changed)"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is None:
+                self.generation += 1
+                return
+            self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+            self._data_version = None
+            self._sync()
+
+    def _sync(self):
+        """Catch up with answers and invalidations written by other processes"""
+        if self._db is None:
+            return
+        # Changes only when another connection has committed
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._data_version = version
+        generation = self._db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+        if generation != self.generation:
+            self.generation = generation
+            self._entries.clear()
+            self._last_id = 0
+        rows = self._db.execute(
+            "SELECT id, scope, vector, answer, sources, created_at FROM answers WHERE id > ? AND created_at >= ? ORDER BY id",
+            (self._last_id, time.time() - self.ttl)
+        ).fetchall()
+        for entry_id, scope, vector, answer, sources, created_at in rows:
+            self._entries[entry_id] = (np.frombuffer(vector, dtype=np.float32), answer, json.loads(sources), created_at, scope)
+            self._last_id = entry_id
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _evict_expired(self, now: float):
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry[3] > self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "persistent": self._db is not None}
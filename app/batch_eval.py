@@ -0,0 +1,201 @@
+"""
+Batch Eval - Answer a file of test questions against the knowledge base
+Questions come from JSONL, one object per line; results stream out as they
+complete, scored against each question's expected sources, followed by a
+summary with retrieval hit rates and timing percentiles
+
+Usage: python -m app.batch_eval questions.jsonl [--output results.jsonl] [--concurrency 8] [--url http://localhost:8000]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def parse_question(item: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Normalize one JSONL object into a batch question
+
+    The text is read from `question` (or `message`); `id` defaults to the
+    1-based position. Optional: `use_rag`, `collection`, `document_ids` and
+    `expected_sources` (file names or document ids that should be retrieved).
+    """
+    text = item.get("question") or item.get("message")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError(f"Question {index} has no question text")
+    filters = None
+    if item.get("collection") or item.get("document_ids"):
+        filters = {"collection": item.get("collection"), "document_ids": item.get("document_ids") or None}
+    return {
+        "id": item.get("id", index),
+        "question": text,
+        "use_rag": item.get("use_rag", True),
+        "filters": filters,
+        "expected_sources": item.get("expected_sources")
+    }
+
+
+def parse_questions(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [parse_question(item, index) for index, item in enumerate(items, 1)]
+
+
+def read_jsonl(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """Objects from JSONL lines; blank lines are skipped"""
+    items = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number} is not valid JSON: {e}")
+        if not isinstance(item, dict):
+            raise ValueError(f"Line {number} is not a JSON object")
+        items.append(item)
+    return items
+
+
+def score_retrieval(retrieved: List[Dict[str, Any]], expected: List[str]) -> Dict[str, Any]:
+    """hit (any expected source retrieved), recall and the 1-based rank of the first hit"""
+    expected = set(expected)
+    found = set()
+    rank = None
+    for position, chunk in enumerate(retrieved, 1):
+        matches = expected & {chunk.get("source"), chunk.get("document_id")}
+        if matches:
+            found |= matches
+            rank = rank or position
+    return {"hit": rank is not None, "recall": round(len(found) / len(expected), 3), "rank": rank}
+
+
+def _percentile(values: List[float], share: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class BatchSummary:
+    """Aggregates batch results into hit rates and timing percentiles"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.questions = 0
+        self.errors = 0
+        self.scores: List[Dict[str, Any]] = []
+        self.timings: Dict[str, List[float]] = {}
+
+    def add(self, result: Dict[str, Any]):
+        self.questions += 1
+        self.errors += bool(result.get("error"))
+        if result.get("retrieval"):
+            self.scores.append(result["retrieval"])
+        for name, value in (result.get("timings") or {}).items():
+            self.timings.setdefault(name, []).append(value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        scored = len(self.scores)
+        return {
+            "questions": self.questions,
+            "errors": self.errors,
+            "wall_ms": round(elapsed * 1000, 1),
+            "questions_per_second": round(self.questions / elapsed, 2) if elapsed else None,
+            "retrieval": {
+                "scored": scored,
+                "hit_rate": round(sum(score["hit"] for score in self.scores) / scored, 3),
+                "mean_recall": round(sum(score["recall"] for score in self.scores) / scored, 3),
+                "mrr": round(sum(1 / score["rank"] for score in self.scores if score["rank"]) / scored, 3)
+            } if scored else None,
+            "timings": {
+                name: {"p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95)}
+                for name, values in self.timings.items()
+            }
+        }
+
+
+async def run_batch(engine, questions: List[Dict[str, Any]], concurrency: int = 8) -> AsyncIterator[Dict[str, Any]]:
+    """Yield each question's result as it completes, then {"summary": ...}"""
+    summary = BatchSummary()
+    async for i, answer in engine.abatch_generate(questions, concurrency=concurrency):
+        question = questions[i]
+        result = {"id": question["id"], "question": question["question"], **answer}
+        if question.get("expected_sources") and "retrieved" in answer:
+            result["retrieval"] = score_retrieval(answer["retrieved"], question["expected_sources"])
+        summary.add(result)
+        yield result
+    yield {"summary": summary.as_dict()}
+
+
+async def _run_local(items: List[Dict[str, Any]], concurrency: int, output):
+    try:
+        from .rag_engine import RAGEngine
+        from .workers import WriterLock
+    except ImportError:
+        from rag_engine import RAGEngine
+        from workers import WriterLock
+    # Opening the store next to a server that writes to it is unsafe (Chroma
+    # would run a second client on the same files), so that run goes to the server
+    lock = WriterLock(os.path.join(os.getenv("CHROMA_DB_PATH", "./chroma_db"), "writer.lock"))
+    if not lock.acquire():
+        raise SystemExit("A server is using this knowledge base; send the batch to it with --url")
+    try:
+        engine = RAGEngine(read_only=True)
+        if not engine.is_ready():
+            raise SystemExit(f"RAG engine is not ready: {engine.initialization_error or 'configure an LLM and embeddings'}")
+        async for result in run_batch(engine, parse_questions(items), concurrency):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        lock.release()
+
+
+async def _run_remote(url: str, items: List[Dict[str, Any]], concurrency: int, output):
+    import httpx
+    body = {"questions": items, "concurrency": concurrency}
+    async with httpx.AsyncClient(base_url=url, timeout=None) as client:
+        async with client.stream("POST", "/api/chat/batch", json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise SystemExit(f"{response.status_code}: {response.text}")
+            async for line in response.aiter_lines():
+                if line:
+                    output.write(line + "\n")
+                    output.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions against the knowledge base")
+    parser.add_argument("questions", help="JSONL file, one {\"question\": ...} per line ('-' for stdin)")
+    parser.add_argument("--output", default="-", help="Results JSONL file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("CHAT_BATCH_CONCURRENCY", "8")))
+    parser.add_argument("--url", help="Send the batch to a running server instead of answering in process")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.questions == "-":
+        items = read_jsonl(sys.stdin)
+    else:
+        with open(args.questions, encoding="utf-8") as f:
+            items = read_jsonl(f)
+    # Fail on a malformed question before starting any work
+    parse_questions(items)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        if args.url:
+            asyncio.run(_run_remote(args.url, items, args.concurrency, output))
+        else:
+            asyncio.run(_run_local(items, args.concurrency, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+BM25 Index - In-process inverted index for keyword retrieval
+Built incrementally as chunks are ingested and persisted in SQLite next to
+the vector store; results are fused with vector search using reciprocal
+rank fusion
+"""
+
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Identifiers such as "E-1042", "v2.3.1" or "ab_12" are kept whole and also split into parts
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what when "
+    "where which who why will with how do does did can".split()
+)
+# Metadata fields chunks can be filtered on
+_FILTER_FIELDS = ("document_id", "collection")
+# Entries kept in the change log read-only replicas catch up from
+_CHANGE_LOG_SIZE = 100000
+# Removed chunks are compacted out of the postings once there are this many,
+# and at least a quarter as many as live chunks
+_COMPACT_MIN_TOMBSTONES = 1000
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        parts = _PART_RE.findall(match)
+        if len(parts) > 1:
+            tokens.append(match)
+        tokens.extend(part for part in parts if part not in _STOPWORDS)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(id) = sum(1 / (k + rank))"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """BM25 over chunk ids; with a `path`, chunk text lives in SQLite rather than memory
+
+    Postings are appended to Python lists as chunks arrive and converted to
+    NumPy arrays on first use, so scoring a query is a few vectorized
+    scatter-adds rather than a Python loop over every matching chunk.
+    Every change is also appended to a log in the database, from which
+    `read_only` replicas in other server workers catch up before searching.
+    Removed chunks are tombstoned and compacted out of the postings in bulk.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75, read_only: bool = False):
+        self.k1 = k1
+        self.b = b
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._reset()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT)"
+            )
+            columns = {name for _, name, *_ in self._db.execute("PRAGMA table_info(chunks)")}
+            for name in _FILTER_FIELDS:
+                if name not in columns:
+                    self._db.execute(f"ALTER TABLE chunks ADD COLUMN {name} TEXT")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL, removed INTEGER NOT NULL)"
+            )
+            self._db.commit()
+            self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            self._load()
+
+    def _reset(self):
+        # term -> ([positions], [term frequencies])
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._ids: List[Optional[str]] = []
+        self._positions: Dict[str, int] = {}
+        self._lengths: List[int] = []
+        self._norms: Optional[np.ndarray] = None
+        # (field, value) -> positions, for document_id and collection filters
+        self._groups: Dict[Tuple[str, str], List[int]] = {}
+        self._group_arrays: Dict[Tuple[str, str], np.ndarray] = {}
+        self._labels: List[Tuple[Tuple[str, str], ...]] = []
+        # Only used without a database
+        self._documents: Dict[str, Tuple[str, Optional[dict]]] = {}
+        self._total_length = 0
+        # Positions of removed chunks; their postings stay, masked, until _compact
+        self._tombstones: List[int] = []
+        # Mask of tombstoned positions, rebuilt after the index changes
+        self._dead: Optional[np.ndarray] = None
+        # Last change log entry applied
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _load(self):
+        # Read first: changes made while loading are replayed by refresh(), which is idempotent
+        self._seq = self._db.execute(
+            "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'changes'), 0)"
+        ).fetchone()[0]
+        loaded = 0
+        for chunk_id, text, document_id, collection in self._db.execute(
+            "SELECT id, text, document_id, collection FROM chunks ORDER BY rowid"
+        ):
+            self._index(chunk_id, text, {"document_id": document_id, "collection": collection})
+            loaded += 1
+        if loaded:
+            logger.info(f"Loaded BM25 index with {loaded} chunks")
+
+    def _index(self, chunk_id: str, text: str, metadata: Optional[dict] = None) -> bool:
+        if chunk_id in self._positions:
+            return False
+        position = len(self._ids)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = ([], [])
+            postings[0].append(position)
+            postings[1].append(tf)
+            self._arrays.pop(term, None)
+        length = sum(counts.values())
+        labels = tuple(
+            (name, (metadata or {}).get(name)) for name in _FILTER_FIELDS if (metadata or {}).get(name) is not None
+        )
+        for label in labels:
+            self._groups.setdefault(label, []).append(position)
+            self._group_arrays.pop(label, None)
+        self._labels.append(labels)
+        self._ids.append(chunk_id)
+        self._positions[chunk_id] = position
+        self._lengths.append(length)
+        self._total_length += length
+        self._norms = None
+        self._dead = None
+        return True
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], metadatas: Optional[Sequence[Optional[dict]]] = None):
+        """Index chunks (ids already indexed are ignored)"""
+        self._check_writable()
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            added = [
+                (chunk_id, text, metadata)
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+                if self._index(chunk_id, text, metadata)
+            ]
+            if self._db is None:
+                for chunk_id, text, metadata in added:
+                    self._documents[chunk_id] = (text, metadata)
+            elif added:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO chunks (id, text, metadata, document_id, collection) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            chunk_id, text, json.dumps(metadata) if metadata else None,
+                            (metadata or {}).get("document_id"), (metadata or {}).get("collection")
+                        )
+                        for chunk_id, text, metadata in added
+                    ]
+                )
+                self._log([chunk_id for chunk_id, _, _ in added], removed=False)
+                self._db.commit()
+
+    def remove(self, ids: Iterable[str]):
+        """Drop chunks from the index"""
+        self._check_writable()
+        ids = list(ids)
+        with self._lock:
+            for chunk_id in ids:
+                self._discard(chunk_id)
+            if self._db is not None:
+                self._db.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+                self._log(ids, removed=True)
+                self._db.commit()
+            self._maybe_compact()
+
+    def _discard(self, chunk_id: str):
+        """Forget a chunk; its postings and filter groups keep the position, masked as a tombstone"""
+        position = self._positions.pop(chunk_id, None)
+        if position is None:
+            return
+        self._labels[position] = ()
+        self._total_length -= self._lengths[position]
+        self._lengths[position] = 0
+        self._ids[position] = None
+        self._documents.pop(chunk_id, None)
+        self._tombstones.append(position)
+        self._norms = None
+        self._dead = None
+
+    def _maybe_compact(self):
+        if len(self._tombstones) >= max(_COMPACT_MIN_TOMBSTONES, len(self._positions) // 4):
+            self._compact()
+
+    def _compact(self):
+        """Drop tombstoned positions from every posting list and filter group"""
+        dead = np.zeros(len(self._ids), dtype=bool)
+        dead[self._tombstones] = True
+        for term in list(self._postings):
+            positions, tfs = self._postings[term]
+            keep = ~dead[np.asarray(positions, dtype=np.int64)]
+            if keep.all():
+                continue
+            self._arrays.pop(term, None)
+            if not keep.any():
+                del self._postings[term]
+                continue
+            self._postings[term] = (
+                np.asarray(positions, dtype=np.int64)[keep].tolist(),
+                np.asarray(tfs, dtype=np.int64)[keep].tolist()
+            )
+        for label in list(self._groups):
+            positions = np.asarray(self._groups[label], dtype=np.int64)
+            keep = ~dead[positions]
+            if keep.all():
+                continue
+            self._group_arrays.pop(label, None)
+            if keep.any():
+                self._groups[label] = positions[keep].tolist()
+            else:
+                del self._groups[label]
+        logger.info(f"Compacted {len(self._tombstones)} removed chunks out of the BM25 index")
+        self._tombstones = []
+        self._dead = None
+
+    def _log(self, ids: Sequence[str], removed: bool):
+        self._db.executemany("INSERT INTO changes (id, removed) VALUES (?, ?)", [(chunk_id, int(removed)) for chunk_id in ids])
+        self._db.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (_CHANGE_LOG_SIZE,))
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("BM25 index is open read-only; writes go through the writer process")
+
+    def refresh(self):
+        """Apply chunks the writer process added or removed since the last call (read-only replicas)"""
+        if not self.read_only or self._db is None:
+            return
+        with self._lock:
+            # Changes only when another connection has committed
+            version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return
+            self._data_version = version
+            oldest = self._db.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            if oldest is not None and oldest > self._seq + 1:
+                # Entries this replica has not applied were pruned: start over
+                self._reset()
+                self._load()
+                return
+            changes = self._db.execute(
+                "SELECT changes.seq, changes.id, changes.removed, chunks.text, chunks.document_id, chunks.collection "
+                "FROM changes LEFT JOIN chunks ON chunks.id = changes.id WHERE changes.seq > ? ORDER BY changes.seq",
+                (self._seq,)
+            ).fetchall()
+            for seq, chunk_id, removed, text, document_id, collection in changes:
+                if removed:
+                    self._discard(chunk_id)
+                elif text is not None:
+                    self._index(chunk_id, text, {"document_id": document_id, "collection": collection})
+                self._seq = seq
+            self._maybe_compact()
+
+    def _term_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if postings is None:
+                return None
+            arrays = self._arrays[term] = (
+                np.array(postings[0], dtype=np.int64),
+                np.array(postings[1], dtype=np.float32)
+            )
+        return arrays
+
+    def _group_array(self, label: Tuple[str, str]) -> np.ndarray:
+        array = self._group_arrays.get(label)
+        if array is None:
+            array = self._group_arrays[label] = np.array(self._groups.get(label, []), dtype=np.int64)
+        return array
+
+    def _allowed(self, collection: Optional[str], document_ids: Optional[Sequence[str]]) -> Optional[np.ndarray]:
+        """Positions passing the filters, or None when unfiltered"""
+        allowed = None
+        if collection is not None:
+            allowed = self._group_array(("collection", collection))
+        if document_ids is not None:
+            documents = np.concatenate(
+                [self._group_array(("document_id", document_id)) for document_id in document_ids] or [np.array([], dtype=np.int64)]
+            )
+            allowed = documents if allowed is None else np.intersect1d(allowed, documents)
+        return allowed
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        collection: Optional[str] = None,
+        document_ids: Optional[Sequence[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """Top-k (id, BM25 score) for the query, optionally within a collection or set of documents"""
+        terms = set(tokenize(query))
+        self.refresh()
+        with self._lock:
+            n = len(self._positions)
+            if not n or not terms:
+                return []
+            if self._norms is None:
+                # Per-chunk length normalization, recomputed only after the index changes
+                lengths = np.array(self._lengths, dtype=np.float32)
+                self._norms = self.k1 * (1 - self.b + self.b * lengths / (self._total_length / n))
+            if self._tombstones and self._dead is None:
+                self._dead = np.zeros(len(self._ids), dtype=bool)
+                self._dead[self._tombstones] = True
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+            for term in terms:
+                arrays = self._term_arrays(term)
+                if arrays is None:
+                    continue
+                positions, tfs = arrays
+                # Chunks containing the term, not counting removed ones still in its postings
+                df = len(positions) - (int(np.count_nonzero(self._dead[positions])) if self._tombstones else 0)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                scores[positions] += idf * tfs * (self.k1 + 1) / (tfs + self._norms[positions])
+            if self._tombstones:
+                scores[self._dead] = 0
+            allowed = self._allowed(collection, document_ids)
+            if allowed is None:
+                matched = np.flatnonzero(scores)
+            else:
+                matched = allowed[scores[allowed] > 0]
+            if len(matched) > k:
+                matched = matched[np.argpartition(-scores[matched], k)[:k]]
+            matched = matched[np.argsort(-scores[matched])]
+            return [(self._ids[position], float(scores[position])) for position in matched]
+
+    def get(self, chunk_id: str) -> Optional[Tuple[str, Optional[dict]]]:
+        """(text, metadata) of an indexed chunk"""
+        with self._lock:
+            if self._db is None:
+                return self._documents.get(chunk_id)
+            row = self._db.execute("SELECT text, metadata FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else None
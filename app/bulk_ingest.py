@@ -0,0 +1,408 @@
+"""
+Bulk Ingest - Index a directory or a zip/tar archive of documents in one run
+Files whose content is already indexed in the collection are skipped by
+sha256; the rest are parsed and chunked across a process pool while the
+chunks of earlier files are embedded and stored, so parsing, chunking and
+embedding overlap. Every file reports a status, and the run reports its
+throughput
+
+Usage: python -m app.bulk_ingest PATH [--collection default] [--workers 4] [--output results.jsonl] [--url http://localhost:8000]
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tarfile
+import zipfile
+import tempfile
+import functools
+import threading
+import multiprocessing
+from collections import Counter
+from dataclasses import dataclass
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from .dedup import document_id
+    from .document_processor import DEFAULT_COLLECTION, ChunkRecord, DocumentProcessor
+    from .uploads import MAX_UPLOAD_BYTES
+except ImportError:
+    from dedup import document_id
+    from document_processor import DEFAULT_COLLECTION, ChunkRecord, DocumentProcessor
+    from uploads import MAX_UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+_BLOCK_BYTES = 1024 * 1024
+
+
+@dataclass
+class SourceFile:
+    """A file under a directory (`path`) or in an archive (`open` reads the member)"""
+    name: str
+    size: int
+    path: Optional[str] = None
+    open: Optional[Callable[[], BinaryIO]] = None
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _member_name(name: str) -> str:
+    """An archive member's name without "./" or leading slashes"""
+    return "/".join(part for part in name.split("/") if part not in ("", "."))
+
+
+def _hidden(name: str) -> bool:
+    # Dotfiles, and the resource forks macOS adds to zip files
+    return any(part.startswith(".") or part == "__MACOSX" for part in name.split("/"))
+
+
+def iter_files(path: str) -> Iterator[SourceFile]:
+    """Every file under a directory or in a zip/tar archive, named relative to its root
+
+    Archive members are only read when the consumer opens them, and their
+    names are never used as paths on disk.
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                full_path = os.path.join(root, filename)
+                name = os.path.relpath(full_path, path).replace(os.sep, "/")
+                if not _hidden(name) and os.path.isfile(full_path):
+                    yield SourceFile(name, os.path.getsize(full_path), path=full_path)
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                name = _member_name(info.filename)
+                if not info.is_dir() and name and not _hidden(name):
+                    yield SourceFile(name, info.file_size, open=functools.partial(archive.open, info))
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as archive:
+            for member in archive:
+                name = _member_name(member.name)
+                if member.isfile() and name and not _hidden(name):
+                    yield SourceFile(name, member.size, open=functools.partial(archive.extractfile, member))
+    else:
+        raise ValueError(f"{os.path.basename(path)} is not a directory, zip or tar archive")
+
+
+def count_files(path: str) -> Optional[int]:
+    """Files `iter_files` will yield, when that is cheap to know (not for tar archives)"""
+    try:
+        if os.path.isdir(path) or zipfile.is_zipfile(path):
+            return sum(1 for _ in iter_files(path))
+    except (OSError, ValueError, zipfile.BadZipFile):
+        pass
+    return None
+
+
+def _extract(source: SourceFile, target: str, max_bytes: int):
+    """Copy an archive member to `target`, failing once it passes `max_bytes`"""
+    copied = 0
+    with source.open() as member, open(target, "wb") as f:
+        while True:
+            block = member.read(_BLOCK_BYTES)
+            if not block:
+                return
+            copied += len(block)
+            if copied > max_bytes:
+                raise ValueError(f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB")
+            f.write(block)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _parse_file(processor: DocumentProcessor, path: str, name: str, collection: str) -> Tuple[List[ChunkRecord], Dict[str, float]]:
+    timings = {}
+    with open(path, "rb") as f:
+        records = list(processor.iter_records(path, f, collection=collection, timings=timings, source=name))
+    return records, timings
+
+
+_worker_processor: Optional[DocumentProcessor] = None
+
+
+def _init_worker(default_settings, collection_settings):
+    global _worker_processor
+    _worker_processor = DocumentProcessor(default_settings.chunk_tokens, default_settings.overlap_tokens, collection_settings)
+    # Files are already spread across processes; no page pool per PDF
+    _worker_processor.pdf_workers = 1
+
+
+def _parse_in_worker(path: str, name: str, collection: str) -> Tuple[List[ChunkRecord], Dict[str, float]]:
+    """Runs in a pool process"""
+    return _parse_file(_worker_processor, path, name, collection)
+
+
+def ingest_path(
+    rag_engine,
+    document_processor: DocumentProcessor,
+    path: str,
+    collection: str = DEFAULT_COLLECTION,
+    workers: Optional[int] = None,
+    on_file: Optional[Callable[[Dict[str, Any]], None]] = None,
+    max_file_bytes: int = MAX_UPLOAD_BYTES,
+    on_embedding_started: Optional[Callable[[], None]] = None
+) -> Dict[str, Any]:
+    """Index every supported file under a directory or in a zip/tar archive
+
+    Files are parsed and chunked in `workers` processes (one thread when
+    `workers` is 1), at most two per worker ahead of the embedder, and their
+    chunks go through a single RAGEngine.add_documents call, which registers
+    each file as soon as its last chunk is stored. Each file's result goes
+    to `on_file` once it is skipped, fails, or is registered; its status is one of indexed, unchanged (this document,
+    same content), duplicate (another document has the same content),
+    unsupported or failed. A failure while embedding or storing fails the
+    run; files indexed before it stay indexed, so running again resumes
+    where it stopped. `on_embedding_started()` is called as the first new
+    chunks are sent to the embedder.
+    Returns {"files": [...], "summary": {...}} with counts, chunk totals,
+    throughput and timings (parse_ms and chunk_ms summed across workers).
+    """
+    workers = workers or int(os.getenv("BULK_INGEST_WORKERS", str(os.cpu_count() or 1)))
+    results: List[Dict[str, Any]] = []
+    content_hashes: Dict[str, str] = {}
+    # document_id -> result of a parsed file, reported once RAGEngine registers it
+    stored: Dict[str, Dict[str, Any]] = {}
+    report_lock = threading.Lock()
+    # sha256 -> name of the file in this run that claimed it
+    claimed: Dict[str, str] = {}
+    parsed = {"bytes": 0, "chunks": 0, "parse_ms": 0.0, "chunk_ms": 0.0}
+
+    def report(result: Dict[str, Any]):
+        # Stored files are reported from the embedding writer thread
+        with report_lock:
+            results.append(result)
+            if on_file:
+                on_file(result)
+
+    def prepare(source: SourceFile, scratch: str, index: int) -> Optional[Tuple[Dict[str, Any], str, bool]]:
+        """(result, path on disk, extracted) of a file to parse, or None once it is reported as skipped"""
+        result = {"name": source.name, "bytes": source.size}
+        ext = os.path.splitext(source.name)[1].lower()
+        if ext not in DocumentProcessor.SUPPORTED_EXTENSIONS:
+            report(dict(result, status="unsupported"))
+            return None
+        if source.size == 0:
+            report(dict(result, status="failed", error="File is empty"))
+            return None
+        local_path, extracted = source.path, False
+        try:
+            if source.size > max_file_bytes:
+                raise ValueError(f"File too large. Maximum size is {max_file_bytes // (1024 * 1024)}MB")
+            if local_path is None:
+                local_path, extracted = os.path.join(scratch, f"{index}{ext}"), True
+                _extract(source, local_path, max_file_bytes)
+            digest = file_sha256(local_path)
+        except Exception as e:
+            _remove(local_path if extracted else None)
+            report(dict(result, status="failed", error=str(e)))
+            return None
+        result.update(document_id=document_id(collection, source.name), sha256=digest)
+        existing = claimed.get(digest)
+        if existing is None:
+            indexed = rag_engine.find_document_by_content(collection, digest)
+            if indexed is not None and indexed["document_id"] == result["document_id"]:
+                _remove(local_path if extracted else None)
+                report(dict(result, status="unchanged"))
+                return None
+            existing = indexed["filename"] if indexed is not None else None
+        if existing is not None:
+            _remove(local_path if extracted else None)
+            report(dict(result, status="duplicate", duplicate_of=existing))
+            return None
+        claimed[digest] = source.name
+        return result, local_path, extracted
+
+    def records(pool, parse, scratch: str) -> Iterator[ChunkRecord]:
+        files = iter_files(path)
+        in_flight = {}
+        index = 0
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < 2 * workers:
+                source = next(files, None)
+                if source is None:
+                    exhausted = True
+                    break
+                index += 1
+                task = prepare(source, scratch, index)
+                if task is not None:
+                    result, local_path, _ = task
+                    in_flight[pool.submit(parse, local_path, result["name"], collection)] = task
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                result, local_path, extracted = in_flight.pop(future)
+                _remove(local_path if extracted else None)
+                try:
+                    chunks, timings = future.result()
+                    if not chunks:
+                        raise ValueError("No text could be extracted from the document")
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    report(dict(result, status="failed", error=str(e)))
+                    continue
+                parsed["bytes"] += result["bytes"]
+                parsed["chunks"] += len(chunks)
+                parsed["parse_ms"] += timings.get("parse_ms", 0.0)
+                parsed["chunk_ms"] += timings.get("chunk_ms", 0.0)
+                content_hashes[result["document_id"]] = result["sha256"]
+                stored[result["document_id"]] = dict(result, status="indexed", chunks=len(chunks))
+                yield from chunks
+
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    if workers > 1:
+        # spawn: forking a process that runs worker threads is unsafe
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(document_processor.default_settings, document_processor.collection_settings)
+        )
+        parse = _parse_in_worker
+    else:
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-parse")
+        parse = functools.partial(_parse_file, document_processor)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bulk-ingest-") as scratch:
+            counts = rag_engine.add_documents(
+                records(pool, parse, scratch),
+                timings=timings,
+                content_hashes=content_hashes,
+                on_document=lambda document_id: report(stored.pop(document_id)),
+                on_embedding_started=on_embedding_started
+            )
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    elapsed = time.perf_counter() - start
+
+    statuses = Counter(result["status"] for result in results)
+    summary = {
+        "files": len(results),
+        **{status: statuses.get(status, 0) for status in ("indexed", "unchanged", "duplicate", "unsupported", "failed")},
+        "chunks": parsed["chunks"],
+        "new_chunks": counts["added"],
+        "skipped_chunks": counts["skipped"],
+        "removed_chunks": counts["removed"],
+        "megabytes": round(parsed["bytes"] / 1e6, 2),
+        "seconds": round(elapsed, 2),
+        "files_per_s": round(len(results) / elapsed, 2) if elapsed else None,
+        "chunks_per_s": round(parsed["chunks"] / elapsed, 1) if elapsed else None,
+        "mb_per_s": round(parsed["bytes"] / 1e6 / elapsed, 3) if elapsed else None,
+        "timings": {"parse_ms": round(parsed["parse_ms"], 1), "chunk_ms": round(parsed["chunk_ms"], 1), **timings}
+    }
+    logger.info(f"Bulk ingest of {os.path.basename(path)} finished: {summary}")
+    return {"files": results, "summary": summary}
+
+
+def _remove(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _run_local(path: str, collection: str, workers: Optional[int], output):
+    try:
+        from .rag_engine import RAGEngine
+        from .workers import WriterLock
+    except ImportError:
+        from rag_engine import RAGEngine
+        from workers import WriterLock
+    # Only one process writes to a knowledge base (see workers.py)
+    lock = WriterLock(os.path.join(os.getenv("CHROMA_DB_PATH", "./chroma_db"), "writer.lock"))
+    if not lock.acquire():
+        raise SystemExit("A server is writing to this knowledge base; send the run to it with --url")
+    try:
+        engine = RAGEngine()
+        if not engine.is_ready():
+            raise SystemExit(f"RAG engine is not ready: {engine.initialization_error or 'configure an LLM and embeddings'}")
+
+        def on_file(result):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+        report = ingest_path(engine, DocumentProcessor(), path, collection, workers, on_file)
+        output.write(json.dumps({"summary": report["summary"]}) + "\n")
+    finally:
+        lock.release()
+
+
+def _run_remote(url: str, path: str, collection: str, output, poll_interval: float = 1.0):
+    import httpx
+    with tempfile.TemporaryDirectory() as tmp:
+        if os.path.isdir(path):
+            # Directories travel as an uncompressed tar
+            archive = os.path.join(tmp, f"{os.path.basename(os.path.abspath(path))}.tar")
+            with tarfile.open(archive, "w") as tar:
+                tar.add(path, arcname="")
+        else:
+            archive = path
+        with httpx.Client(base_url=url, timeout=None) as client:
+            with open(archive, "rb") as f:
+                response = client.post("/api/bulk-ingest", files={"file": (os.path.basename(archive), f)}, data={"collection": collection})
+            if response.status_code != 202:
+                raise SystemExit(f"{response.status_code}: {response.text}")
+            job_id = response.json()["job_id"]
+            written = 0
+            while True:
+                job = client.get(f"/api/jobs/{job_id}").json()
+                files = (job.get("details") or {}).get("files", [])
+                for result in files[written:]:
+                    output.write(json.dumps(result) + "\n")
+                output.flush()
+                written = len(files)
+                if job["status"] == "failed":
+                    raise SystemExit(f"Bulk ingest failed: {job['error']}")
+                if job["status"] == "done":
+                    output.write(json.dumps({"summary": job["details"]["summary"]}) + "\n")
+                    return
+                time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a directory or a zip/tar archive of PDF, DOCX and TXT files")
+    parser.add_argument("path", help="Directory or .zip/.tar(.gz) archive")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--workers", type=int, help="Parser processes (default: BULK_INGEST_WORKERS or the CPU count)")
+    parser.add_argument("--output", default="-", help="Per-file results and the summary as JSONL (default: stdout)")
+    parser.add_argument("--url", help="Send the run to a running server instead of indexing in process")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if not os.path.isdir(args.path) and not os.path.isfile(args.path):
+        raise SystemExit(f"{args.path} does not exist")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        if args.url:
+            _run_remote(args.url, args.path, args.collection, output)
+        else:
+            _run_local(args.path, args.collection, args.workers, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
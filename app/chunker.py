@@ -0,0 +1,243 @@
+"""
+Chunker - Token-aware, structure-aware text chunking in one pass
+Text is scanned once into paragraphs (and the sentences of paragraphs too
+long for one chunk); chunks are packed from them up to a token budget,
+preferring to end at a paragraph break. Headings and pages
+are hard boundaries (callers chunk each section or page on its own), and
+each chunk is a single slice of the source text, so offsets are exact.
+"""
+
+import re
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from .tokens import count_tokens
+except ImportError:
+    from tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# A sentence runs to a terminator followed by whitespace, or to a blank line;
+# single newlines (wrapped lines) do not end it
+_SENTENCE_RE = re.compile(r"\S(?:[^.!?\n]+|[.!?]+(?!\s)|\n(?![ \t]*\n))*[.!?]*")
+_PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t\r]*\n\s*")
+_WORD_RE = re.compile(r"\S+")
+_MARKDOWN_HEADING_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+_NON_SPACE_RE = re.compile(r"\S")
+
+
+@dataclass(frozen=True)
+class ChunkingSettings:
+    chunk_tokens: int = 256
+    overlap_tokens: int = 48
+
+
+def parse_collection_settings(value: Optional[str], default: ChunkingSettings) -> Dict[str, ChunkingSettings]:
+    """Per-collection settings from JSON: {"legal": {"chunk_tokens": 512, "overlap_tokens": 64}}
+
+    Fields left out fall back to `default`.
+    """
+    if not value:
+        return {}
+    try:
+        settings = json.loads(value)
+        return {
+            collection: ChunkingSettings(
+                chunk_tokens=int(options.get("chunk_tokens", default.chunk_tokens)),
+                overlap_tokens=int(options.get("overlap_tokens", default.overlap_tokens))
+            )
+            for collection, options in settings.items()
+        }
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Ignoring invalid per-collection chunking settings: {e}")
+        return {}
+
+
+def markdown_sections(text: str) -> Iterator[Tuple[int, int, Optional[str]]]:
+    """(start, end, heading path) spans of text split at markdown headings"""
+    headings = (
+        (match.start(), match.end(), len(match.group(1)), match.group(2))
+        for match in _MARKDOWN_HEADING_RE.finditer(text)
+    )
+    return sections(text, headings)
+
+
+def sections(text: str, headings: Iterable[Tuple[int, int, int, str]]) -> Iterator[Tuple[int, int, Optional[str]]]:
+    """(start, end, heading path) spans of text split at headings
+
+    `headings` are (start, end, level, title) in document order. A heading
+    with no text before the next one is kept with the next section, so a
+    title directly followed by a subheading does not make a chunk of its own.
+    """
+    path: List[Tuple[int, str]] = []
+    start, body_start, section = 0, 0, None
+    for heading_start, heading_end, level, title in headings:
+        if _NON_SPACE_RE.search(text, body_start, heading_start):
+            yield start, heading_start, section
+            start = heading_start
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, title))
+        body_start, section = heading_end, " > ".join(heading for _, heading in path)
+    if _NON_SPACE_RE.search(text, start):
+        yield start, len(text), section
+
+
+class Chunker:
+    """Split text into chunks of at most `chunk_tokens` tokens
+
+    A chunk ends at the last paragraph break once it is at least half full;
+    otherwise at a sentence boundary, in which case the next chunk repeats
+    up to `overlap_tokens` of trailing sentences. Sentences longer than the
+    budget are split at words (and words longer than it by characters).
+    A chunk's size is the sum of its pieces' counts, separators included,
+    which is never less than the count of the joined text.
+    """
+
+    def __init__(self, chunk_tokens: int = 256, overlap_tokens: int = 48, count: Callable[[str], int] = count_tokens):
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.chunk_tokens // 2))
+        self.count = count
+
+    def split(self, text: str, start: int = 0, end: Optional[int] = None, offset: int = 0) -> Iterator[Tuple[int, str]]:
+        """(offset + start index, chunk text) for text[start:end]"""
+        # Sentences of the current chunk: (start, end, tokens, starts a paragraph,
+        # tokens of the separator before it); the separators between them count
+        # toward the budget, so a chunk's pieces tile it exactly
+        window: deque = deque()
+        tokens = 0
+        previous_end = None
+        for unit in self._units(text, start, len(text) if end is None else end):
+            unit += (self.count(text[previous_end:unit[0]]) if previous_end is not None else 0,)
+            previous_end = unit[1]
+            if window and tokens + unit[4] + unit[2] > self.chunk_tokens:
+                cut = self._paragraph_cut(window)
+                if cut:
+                    emitted = [window.popleft() for _ in range(cut)]
+                    yield offset + emitted[0][0], text[emitted[0][0]:emitted[-1][1]]
+                    tokens = self._size(window)
+                if window and tokens + unit[4] + unit[2] > self.chunk_tokens:
+                    yield offset + window[0][0], text[window[0][0]:window[-1][1]]
+                    window, tokens = self._overlap(window, unit[3])
+                    # Room for the new sentence comes out of the carried-over text
+                    while window and tokens + unit[4] + unit[2] > self.chunk_tokens:
+                        window.popleft()
+                        tokens = self._size(window)
+            tokens += unit[2] + (unit[4] if window else 0)
+            window.append(unit)
+        if window:
+            yield offset + window[0][0], text[window[0][0]:window[-1][1]]
+
+    @staticmethod
+    def _size(window: Iterable[Tuple]) -> int:
+        """Tokens of a run of sentences, counting the separators between them"""
+        size = 0
+        for index, item in enumerate(window):
+            size += item[2] + (item[4] if index else 0)
+        return size
+
+    def _paragraph_cut(self, window: deque) -> int:
+        """Sentences to emit so the chunk ends at a paragraph break, or 0"""
+        filled = 0
+        cut = best = 0
+        for item in window:
+            if item[3] and cut and filled >= self.chunk_tokens // 2:
+                best = cut
+            filled += item[2] + (item[4] if cut else 0)
+            cut += 1
+        return best
+
+    def _overlap(self, window: deque, next_starts_paragraph: bool) -> Tuple[deque, int]:
+        """Trailing sentences repeated at the start of the next chunk"""
+        carried: deque = deque()
+        tokens = 0
+        if next_starts_paragraph:
+            # The chunk ended on a paragraph break: nothing is cut mid-thought
+            return carried, 0
+        for item in reversed(window):
+            added = item[2] + (carried[0][4] if carried else 0)
+            if tokens + added > self.overlap_tokens:
+                break
+            carried.appendleft(item)
+            tokens += added
+            if item[3]:
+                break
+        return carried, tokens
+
+    def _units(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int, int, bool]]:
+        """Paragraphs that fit the budget whole, otherwise their sentences"""
+        for paragraph_start, paragraph_end in self._paragraphs(text, start, end):
+            tokens = self.count(text[paragraph_start:paragraph_end])
+            if tokens <= self.chunk_tokens:
+                yield paragraph_start, paragraph_end, tokens, True
+                continue
+            new_paragraph = True
+            for match in _SENTENCE_RE.finditer(text, paragraph_start, paragraph_end):
+                unit_start, unit_end = match.span()
+                # Trailing spaces of an unterminated sentence are not part of it
+                while text[unit_end - 1] in " \t\r":
+                    unit_end -= 1
+                tokens = self.count(text[unit_start:unit_end])
+                if tokens <= self.chunk_tokens:
+                    yield unit_start, unit_end, tokens, new_paragraph
+                else:
+                    for piece in self._split_long(text, unit_start, unit_end):
+                        yield piece + (new_paragraph,)
+                        new_paragraph = False
+                new_paragraph = False
+
+    @staticmethod
+    def _paragraphs(text: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """(start, end) of the blank-line separated paragraphs in text[start:end]"""
+        first = _NON_SPACE_RE.search(text, start, end)
+        if first is None:
+            return
+        position = first.start()
+        for match in _PARAGRAPH_BREAK_RE.finditer(text, position, end):
+            paragraph_end = match.start()
+            while text[paragraph_end - 1] in " \t\r":
+                paragraph_end -= 1
+            yield position, paragraph_end
+            position = match.end()
+        while position < end and text[end - 1].isspace():
+            end -= 1
+        if position < end:
+            yield position, end
+
+    def _split_long(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+        """Pieces of an over-budget sentence: runs of words, or of characters for an over-budget word"""
+        piece_start = piece_end = None
+        tokens = 0
+        for match in _WORD_RE.finditer(text, start, end):
+            word_tokens = self.count(match.group())
+            if word_tokens > self.chunk_tokens:
+                if piece_start is not None:
+                    yield piece_start, piece_end, tokens
+                    piece_start, tokens = None, 0
+                yield from self._split_chars(text, match.start(), match.end(), word_tokens)
+                continue
+            if piece_start is not None and tokens + word_tokens > self.chunk_tokens:
+                yield piece_start, piece_end, tokens
+                piece_start, tokens = None, 0
+            if piece_start is None:
+                piece_start = match.start()
+            piece_end = match.end()
+            # Words counted apart can total more than the joined text; never less
+            tokens += word_tokens
+        if piece_start is not None:
+            yield piece_start, piece_end, tokens
+
+    def _split_chars(self, text: str, start: int, end: int, tokens: int) -> Iterator[Tuple[int, int, int]]:
+        step = max(1, (end - start) * self.chunk_tokens // tokens)
+        while start < end:
+            piece_end = min(end, start + step)
+            piece_tokens = self.count(text[start:piece_end])
+            while piece_tokens > self.chunk_tokens and piece_end - start > 1:
+                piece_end = start + (piece_end - start) // 2
+                piece_tokens = self.count(text[start:piece_end])
+            yield start, piece_end, piece_tokens
+            start = piece_end
@@ -0,0 +1,194 @@
+"""
+Context Builder - Token-budgeted packing of retrieved chunks into the prompt
+Ranked candidates are added until the budget is spent; overlapping or
+adjacent chunks of the same document are stitched into one passage and
+near-duplicates are dropped, so the budget buys distinct text
+"""
+
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .tokens import count_tokens
+except ImportError:
+    from tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+SEPARATOR = "\n\n"
+
+
+def token_counter(llm) -> Callable[[str], int]:
+    """Count tokens with the LLM's own tokenizer where it can be found
+
+    Local HuggingFace pipelines expose their tokenizer; OpenAI models map to
+    a tiktoken encoding. Anything else falls back to count_tokens.
+    """
+    tokenizer = getattr(getattr(llm, "pipeline", None), "tokenizer", None)
+    if tokenizer is not None:
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    if isinstance(model_name, str):
+        try:
+            import tiktoken
+            encoding = tiktoken.encoding_for_model(model_name)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return count_tokens
+
+
+def model_context_limit(llm) -> Optional[int]:
+    """Maximum input tokens of a local model, when its tokenizer reports one"""
+    tokenizer = getattr(getattr(llm, "pipeline", None), "tokenizer", None)
+    limit = getattr(tokenizer, "model_max_length", None)
+    # Tokenizers without a limit report a huge sentinel value
+    return limit if isinstance(limit, int) and limit < 1_000_000 else None
+
+
+def _shingles(text: str, size: int = 3) -> frozenset:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+@dataclass
+class Passage:
+    """Contiguous text from one document, stitched from one or more chunks"""
+    text: str
+    metadata: Dict[str, Any]
+    # Character span in the document, when the chunks carry offsets
+    start: Optional[int] = None
+    end: Optional[int] = None
+    pages: List[int] = field(default_factory=list)
+
+    @classmethod
+    def from_document(cls, doc) -> "Passage":
+        metadata = doc.metadata or {}
+        pages = [metadata["page"]] if metadata.get("page") is not None else []
+        return cls(doc.page_content, metadata, metadata.get("start_index"), metadata.get("end_index"), pages)
+
+    @property
+    def source(self) -> str:
+        source = self.metadata.get("source", "Unknown")
+        if not self.pages:
+            return source
+        first, last = min(self.pages), max(self.pages)
+        return f"{source}, page {first}" if first == last else f"{source}, pages {first}-{last}"
+
+
+class ContextBuilder:
+    def __init__(
+        self,
+        budget_tokens: int = 800,
+        count: Callable[[str], int] = count_tokens,
+        duplicate_threshold: float = 0.8,
+        max_gap: int = 4
+    ):
+        self.budget_tokens = budget_tokens
+        self.count = count
+        # Word-shingle Jaccard similarity above which a chunk is a near-duplicate
+        self.duplicate_threshold = duplicate_threshold
+        # Chunks of a document at most this many characters apart are stitched
+        self.max_gap = max_gap
+
+    def build(self, docs: Sequence[Any]) -> Tuple[List[str], List[str]]:
+        """(passages, sources) for ranked LangChain Documents, within the token budget"""
+        passages = self.pack(docs)
+        return [passage.text for passage in passages], [passage.source for passage in passages]
+
+    def pack(self, docs: Sequence[Any]) -> List[Passage]:
+        passages: List[Passage] = []
+        fingerprints: List[frozenset] = []
+        used = 0
+        for doc in docs:
+            chunk = Passage.from_document(doc)
+            shingles = _shingles(chunk.text)
+            if any(self._similar(shingles, other) for other in fingerprints):
+                continue
+
+            trial = self._with(passages, chunk)
+            if trial is None:
+                # Already covered by a passage
+                continue
+            cost = self.count(SEPARATOR.join(passage.text for passage in trial))
+            if cost > self.budget_tokens:
+                if not passages:
+                    # The best chunk alone is over budget: keep what fits of it
+                    passages.append(self._truncate(chunk))
+                    used = self.count(passages[0].text)
+                    break
+                # A shorter, lower-ranked chunk may still fit
+                continue
+            passages, used = trial, cost
+            fingerprints.append(shingles)
+        logger.debug(f"Packed {len(passages)} passages from {len(docs)} candidates into {used}/{self.budget_tokens} tokens")
+        return passages
+
+    def _with(self, passages: List[Passage], chunk: Passage) -> Optional[List[Passage]]:
+        """Passages after adding the chunk, or None if it adds no text
+
+        The chunk is stitched into every passage of its document it overlaps
+        or touches; the merged passage takes the place of the best-ranked one.
+        """
+        merged, position = chunk, None
+        absorbed = set()
+        while True:
+            index = self._adjacent(passages, merged, absorbed)
+            if index is None:
+                break
+            stitched = self._stitch(passages[index], merged)
+            if stitched is None:
+                # Contained in an existing passage
+                return None if position is None else passages
+            merged = stitched
+            absorbed.add(index)
+            position = index if position is None else min(position, index)
+        if position is None:
+            return passages + [chunk]
+        return [merged if i == position else passage for i, passage in enumerate(passages) if i not in absorbed or i == position]
+
+    def _similar(self, a: frozenset, b: frozenset) -> bool:
+        if not a or not b:
+            return a == b
+        return len(a & b) / len(a | b) >= self.duplicate_threshold
+
+    def _adjacent(self, passages: List[Passage], chunk: Passage, skip: set) -> Optional[int]:
+        """Index of a passage from the chunk's document that it overlaps or touches"""
+        document = chunk.metadata.get("document_id")
+        if document is None or chunk.start is None or chunk.end is None:
+            return None
+        for index, passage in enumerate(passages):
+            if index in skip or passage.metadata.get("document_id") != document or passage.start is None:
+                continue
+            if chunk.start <= passage.end + self.max_gap and chunk.end >= passage.start - self.max_gap:
+                return index
+        return None
+
+    @staticmethod
+    def _stitch(passage: Passage, chunk: Passage) -> Optional[Passage]:
+        """The passage extended by an overlapping chunk, or None if it adds nothing"""
+        if chunk.start >= passage.start and chunk.end <= passage.end:
+            return None
+        text = passage.text
+        if chunk.end > passage.end:
+            # Extends the passage forwards: append what comes after its end
+            text = text + (chunk.text[passage.end - chunk.start:] if chunk.start <= passage.end else "\n" + chunk.text)
+        if chunk.start < passage.start:
+            # Extends it backwards: prepend what comes before its start
+            text = (chunk.text[:passage.start - chunk.start] if chunk.end >= passage.start else chunk.text + "\n") + text
+        return Passage(
+            text, passage.metadata, min(passage.start, chunk.start), max(passage.end, chunk.end),
+            passage.pages + chunk.pages
+        )
+
+    def _truncate(self, passage: Passage) -> Passage:
+        """Cut a passage to the budget (by characters, re-counting until it fits)"""
+        text = passage.text
+        while text and self.count(text) > self.budget_tokens:
+            text = text[:int(len(text) * self.budget_tokens / self.count(text) * 0.95)]
+        return Passage(text, passage.metadata, passage.start, passage.end, passage.pages)
@@ -0,0 +1,210 @@
+"""
+Conversation Store - Bounded conversation memory used to build prompts
+Keeps recent turns per conversation within a token budget, folding older
+turns into a rolling summary; conversations are evicted LRU/TTL. An
+optional SQLite tier persists conversations across restarts and shares
+them between worker processes.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+try:
+    from .tokens import count_tokens
+except ImportError:
+    from tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Conversation:
+    summary: str = ""
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    tokens: int = 0
+    version: int = 0
+    last_access: float = field(default_factory=time.time)
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        max_conversations: int = 1000,
+        ttl: float = 86400,
+        max_tokens: int = 4000,
+        summary_tokens: int = 500,
+        db_path: Optional[str] = None
+    ):
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._last_purge = 0.0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id TEXT PRIMARY KEY, summary TEXT NOT NULL, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, query TEXT NOT NULL, response TEXT NOT NULL, "
+                "PRIMARY KEY (conversation_id, seq))"
+            )
+            self._db.commit()
+
+    def __contains__(self, conversation_id: str) -> bool:
+        with self._lock:
+            return self._get(conversation_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def append(self, conversation_id: str, query: str, response: str):
+        """Record a turn, folding the oldest turns into the summary when over budget"""
+        with self._lock:
+            conversation = self._get(conversation_id) or Conversation()
+            conversation.turns.append({"query": query, "response": response})
+            conversation.tokens += self._turn_tokens(conversation.turns[-1])
+            folded = 0
+            while conversation.tokens > self.max_tokens and len(conversation.turns) > 1:
+                turn = conversation.turns.pop(0)
+                conversation.tokens -= self._turn_tokens(turn)
+                conversation.summary = self._fold(conversation.summary, turn)
+                folded += 1
+            conversation.version += 1
+            conversation.last_access = time.time()
+            self._conversations[conversation_id] = conversation
+            self._conversations.move_to_end(conversation_id)
+            self._evict()
+            if self._db is not None:
+                self._persist(conversation_id, conversation, folded)
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        with self._lock:
+            return self._get(conversation_id)
+
+    def prompt_context(self, conversation_id: Optional[str], max_tokens: int) -> str:
+        """Summary plus the most recent turns that fit in `max_tokens`"""
+        if not conversation_id:
+            return ""
+        with self._lock:
+            conversation = self._get(conversation_id)
+            if conversation is None:
+                return ""
+            summary = conversation.summary
+            turns = list(conversation.turns)
+
+        lines: List[str] = []
+        budget = max_tokens
+        if summary:
+            summary_text = f"Summary of earlier conversation: {summary}"
+            budget -= count_tokens(summary_text)
+        for turn in reversed(turns):
+            text = f"User: {turn['query']}\nAssistant: {turn['response']}"
+            cost = count_tokens(text)
+            if cost > budget:
+                break
+            lines.insert(0, text)
+            budget -= cost
+        if summary and budget >= 0:
+            lines.insert(0, summary_text)
+        return "\n".join(lines)
+
+    def _get(self, conversation_id: str) -> Optional[Conversation]:
+        conversation = self._conversations.get(conversation_id)
+        if self._db is not None:
+            # Another worker may have appended since we cached it
+            row = self._db.execute(
+                "SELECT summary, version, updated_at FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+            if row is None:
+                conversation = None
+                self._conversations.pop(conversation_id, None)
+            elif conversation is None or conversation.version != row[1]:
+                turns = [
+                    {"query": query, "response": response}
+                    for query, response in self._db.execute(
+                        "SELECT query, response FROM turns WHERE conversation_id = ? ORDER BY seq", (conversation_id,)
+                    )
+                ]
+                conversation = Conversation(
+                    summary=row[0],
+                    turns=turns,
+                    tokens=sum(self._turn_tokens(turn) for turn in turns),
+                    version=row[1],
+                    last_access=row[2]
+                )
+                self._conversations[conversation_id] = conversation
+        if conversation is None:
+            return None
+        if time.time() - conversation.last_access > self.ttl:
+            self._conversations.pop(conversation_id, None)
+            return None
+        self._conversations.move_to_end(conversation_id)
+        return conversation
+
+    def _persist(self, conversation_id: str, conversation: Conversation, folded: int):
+        db = self._db
+        db.execute(
+            "INSERT INTO conversations (id, summary, version, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET summary = excluded.summary, version = excluded.version, "
+            "updated_at = excluded.updated_at",
+            (conversation_id, conversation.summary, conversation.version, conversation.last_access)
+        )
+        if folded:
+            db.execute(
+                "DELETE FROM turns WHERE conversation_id = ? AND seq IN "
+                "(SELECT seq FROM turns WHERE conversation_id = ? ORDER BY seq LIMIT ?)",
+                (conversation_id, conversation_id, folded)
+            )
+        turn = conversation.turns[-1]
+        db.execute(
+            "INSERT INTO turns (conversation_id, seq, query, response) VALUES "
+            "(?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM turns WHERE conversation_id = ?), ?, ?)",
+            (conversation_id, conversation_id, turn["query"], turn["response"])
+        )
+        now = time.time()
+        if now - self._last_purge > 60:
+            self._last_purge = now
+            expired = now - self.ttl
+            db.execute(
+                "DELETE FROM turns WHERE conversation_id IN (SELECT id FROM conversations WHERE updated_at < ?)",
+                (expired,)
+            )
+            db.execute("DELETE FROM conversations WHERE updated_at < ?", (expired,))
+        db.commit()
+
+    def _evict(self):
+        now = time.time()
+        expired = [cid for cid, conv in self._conversations.items() if now - conv.last_access > self.ttl]
+        for cid in expired:
+            del self._conversations[cid]
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+
+    @staticmethod
+    def _turn_tokens(turn: Dict[str, str]) -> int:
+        return count_tokens(turn["query"]) + count_tokens(turn["response"])
+
+    def _fold(self, summary: str, turn: Dict[str, str]) -> str:
+        """Extractive rolling summary: keep the newest question/answer gists within budget"""
+        query = " ".join(turn["query"].split())[:200]
+        answer = " ".join(turn["response"].split())[:300]
+        entries = [entry for entry in summary.split(" | ") if entry] + [f"Q: {query} A: {answer}"]
+        while len(entries) > 1 and count_tokens(" | ".join(entries)) > self.summary_tokens:
+            entries.pop(0)
+        return " | ".join(entries)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"conversations_in_memory": len(self._conversations), "persistent": self._db is not None}
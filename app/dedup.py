@@ -0,0 +1,108 @@
+"""
+Deduplication - Content-hash chunk ids and SimHash near-duplicate detection
+"""
+
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+from typing import Collection, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+_MASK64 = (1 << 64) - 1
+
+
+def chunk_id(text: str, namespace: str = "") -> str:
+    """Deterministic id of a chunk: sha256 of its text, scoped to a namespace (e.g. a document id)"""
+    if namespace:
+        text = f"{namespace}\x00{text}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def document_id(collection: str, filename: str) -> str:
+    """Stable id of a document: re-uploading the same filename into a collection keeps it"""
+    return hashlib.sha256(f"{collection}\x00{filename}".encode("utf-8")).hexdigest()[:16]
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) < shingle_size:
+        shingles = [" ".join(tokens)] if tokens else []
+    else:
+        shingles = [" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class SimHashIndex:
+    """Persistent SimHash fingerprints, banded for sub-linear lookups
+
+    Fingerprints are split into four 16-bit bands; two fingerprints within
+    Hamming distance 3 are guaranteed to share at least one band exactly.
+    """
+
+    BANDS = 4
+
+    def __init__(self, path: str, max_distance: int = 3):
+        if not 0 <= max_distance <= 3:
+            # Beyond 3 bits two near-duplicates may share no band and never be compared
+            raise ValueError(f"Near-duplicate distance must be between 0 and 3, got {max_distance}")
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            "chunk_id TEXT PRIMARY KEY, fingerprint INTEGER NOT NULL, "
+            "b0 INTEGER NOT NULL, b1 INTEGER NOT NULL, b2 INTEGER NOT NULL, b3 INTEGER NOT NULL)"
+        )
+        for band in range(self.BANDS):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS fingerprints_b{band} ON fingerprints (b{band})")
+        self._db.commit()
+
+    @classmethod
+    def _bands(cls, fingerprint: int) -> List[int]:
+        return [(fingerprint >> (16 * band)) & 0xFFFF for band in range(cls.BANDS)]
+
+    @staticmethod
+    def _to_signed(fingerprint: int) -> int:
+        # SQLite integers are signed 64-bit
+        return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+    def find(self, fingerprint: int, exclude: Collection[str] = ()) -> Optional[str]:
+        """Return the id of a stored near-duplicate of the fingerprint, if any, other than `exclude`"""
+        bands = self._bands(fingerprint)
+        where = " OR ".join(f"b{band} = ?" for band in range(self.BANDS))
+        with self._lock:
+            rows = self._db.execute(f"SELECT chunk_id, fingerprint FROM fingerprints WHERE {where}", bands).fetchall()
+        for candidate_id, candidate in rows:
+            if candidate_id in exclude:
+                continue
+            if bin((candidate & _MASK64) ^ fingerprint).count("1") <= self.max_distance:
+                return candidate_id
+        return None
+
+    def add(self, chunk_ids: List[str], fingerprints: List[int]):
+        rows = [(cid, self._to_signed(fp), *self._bands(fp)) for cid, fp in zip(chunk_ids, fingerprints)]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def remove(self, chunk_ids: List[str]):
+        with self._lock:
+            self._db.executemany("DELETE FROM fingerprints WHERE chunk_id = ?", [(cid,) for cid in chunk_ids])
+            self._db.commit()
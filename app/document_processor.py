@@ -1,87 +1,323 @@
 """
 Document Processor - Handles document parsing and chunking
+Chunks are sized in tokens per collection (see chunker.py); PDF pages and
+DOCX/markdown headings are chunk boundaries
 """
 
 import os
+import mmap
+import time
 import logging
-from typing import List
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 from io import BytesIO
 
+try:
+    from .dedup import document_id
+    from .chunker import Chunker, ChunkingSettings, markdown_sections, parse_collection_settings, sections
+except ImportError:
+    from dedup import document_id
+    from chunker import Chunker, ChunkingSettings, markdown_sections, parse_collection_settings, sections
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_COLLECTION = "default"
+
+@dataclass
+class ChunkRecord:
+    """A chunk of text with its citation metadata
+    
+    metadata: source (filename), document_id, collection, start_index and
+    end_index (character offsets in the extracted document text), for PDFs
+    the 1-based page, and for DOCX and markdown text under a heading the
+    section ("Heading > Subheading").
+    """
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+def _stream(content: Union[bytes, BinaryIO]) -> BinaryIO:
+    """A seekable binary stream over bytes or an open file, rewound"""
+    if isinstance(content, (bytes, bytearray)):
+        return BytesIO(content)
+    content.seek(0)
+    return content
+
+def _extract_pdf_pages(source: Union[bytes, str], start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) - runs in a worker process
+
+    `source` is the PDF itself or the path of a file holding it.
+    """
+    from pypdf import PdfReader
+    pdf_reader = PdfReader(source if isinstance(source, str) else BytesIO(source))
+    return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
 class DocumentProcessor:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
+    SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt')
+    
+    def __init__(self, chunk_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None, collection_settings: Optional[Dict[str, ChunkingSettings]] = None):
+        self.default_settings = ChunkingSettings(
+            chunk_tokens=chunk_tokens or int(os.getenv("CHUNK_TOKENS", "256")),
+            overlap_tokens=overlap_tokens if overlap_tokens is not None else int(os.getenv("CHUNK_OVERLAP_TOKENS", "48"))
+        )
+        # Collections with their own chunk sizes, e.g. longer chunks for legal text
+        if collection_settings is None:
+            collection_settings = parse_collection_settings(os.getenv("CHUNKING_COLLECTIONS"), self.default_settings)
+        self.collection_settings = collection_settings
+        self._chunkers: Dict[ChunkingSettings, Chunker] = {}
+        # PDFs with at least this many pages are extracted across a process pool
+        self.pdf_parallel_min_pages = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "100"))
+        self.pdf_workers = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+        self.pdf_pages_per_task = 16
+        # Created on the first large PDF; ingest jobs run on several threads
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    def shutdown(self):
+        """Stop the PDF extraction processes, if any were started"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def chunker(self, collection: str = DEFAULT_COLLECTION) -> Chunker:
+        settings = self.collection_settings.get(collection, self.default_settings)
+        chunker = self._chunkers.get(settings)
+        if chunker is None:
+            chunker = self._chunkers[settings] = Chunker(settings.chunk_tokens, settings.overlap_tokens)
+        return chunker
+    
+    def process_file(self, filename: str, content: Union[bytes, BinaryIO], progress_callback: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """Process uploaded file and return text chunks
+        
+        `progress_callback(pages_parsed, pages_total)` is called as pages are
+        extracted; formats without pages report a single page.
+        """
+        return list(self.iter_chunks(filename, content, progress_callback))
+    
+    def iter_chunks(self, filename: str, content: Union[bytes, BinaryIO], progress_callback: Optional[Callable[[int, int], None]] = None) -> Iterator[str]:
+        """Yield text chunks as the file is parsed (see iter_records)"""
+        for record in self.iter_records(filename, content, progress_callback):
+            yield record.text
     
-    def process_file(self, filename: str, content: bytes) -> List[str]:
-        """Process uploaded file and return text chunks"""
+    def iter_records(
+        self,
+        filename: str,
+        content: Union[bytes, BinaryIO],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        collection: str = DEFAULT_COLLECTION,
+        timings: Optional[Dict[str, float]] = None,
+        source: Optional[str] = None
+    ) -> Iterator[ChunkRecord]:
+        """Yield chunk records as the file is parsed
+        
+        `content` is the file's bytes or a seekable binary file opened on it;
+        parsers read from the file, so an upload never has to be loaded
+        into memory as a whole. PDF pages are chunked as they are extracted, so consumers (e.g.
+        RAGEngine.add_documents) can embed while later pages are parsed and
+        the full document text is never held in memory.
+        If `timings` is given, time spent extracting text (parse_ms) and
+        splitting it (chunk_ms) is recorded there once the file is done;
+        time the consumer spends between chunks is not counted.
+        `source` names the document (and so its id); it defaults to the
+        file's base name.
+        """
         file_ext = os.path.splitext(filename)[1].lower()
+        source = source or os.path.basename(filename)
+        base_metadata = {
+            "source": source,
+            "document_id": document_id(collection, source),
+            "collection": collection
+        }
         
+        # Seconds spent producing chunks, and the part of it spent splitting
+        busy = 0.0
+        split = [0.0]
+        resumed = time.perf_counter()
+        chunker = self.chunker(collection)
         try:
             if file_ext == '.pdf':
-                return self._process_pdf(content)
+                chunks = self._process_pdf(content, progress_callback, split, chunker)
             elif file_ext in ['.docx', '.doc']:
-                return self._process_docx(content)
+                chunks = self._process_docx(content, split, chunker)
             elif file_ext == '.txt':
-                return self._process_txt(content)
+                chunks = self._process_txt(content, split, chunker)
             else:
                 raise ValueError(f"Unsupported file type: {file_ext}")
+            for start, text, page, section in chunks:
+                busy += time.perf_counter() - resumed
+                metadata = dict(base_metadata, start_index=start, end_index=start + len(text))
+                if page is not None:
+                    metadata["page"] = page
+                if section:
+                    metadata["section"] = section
+                yield ChunkRecord(text, metadata)
+                resumed = time.perf_counter()
+            busy += time.perf_counter() - resumed
+            if timings is not None:
+                timings["parse_ms"] = round((busy - split[0]) * 1000, 1)
+                timings["chunk_ms"] = round(split[0] * 1000, 1)
+            if file_ext != '.pdf' and progress_callback:
+                progress_callback(1, 1)
         except Exception as e:
             logger.error(f"Error processing file {filename}: {e}")
             raise
     
-    def _process_pdf(self, content: bytes) -> List[str]:
-        """Process PDF file"""
+    def _process_pdf(self, content: Union[bytes, BinaryIO], progress_callback: Optional[Callable[[int, int], None]] = None, split: Optional[List[float]] = None, chunker: Optional[Chunker] = None) -> Iterator[Tuple[int, str, Optional[int], Optional[str]]]:
+        """Process PDF file, chunking each page as it is extracted
+        
+        Chunks do not cross pages. Yields (start offset, text, page number,
+        None) for each chunk; offsets are into the page texts joined by newlines.
+        """
         try:
             from pypdf import PdfReader
         except ImportError:
             raise ImportError("pypdf not installed. Install: pip install pypdf")
         
         try:
-            pdf_reader = PdfReader(BytesIO(content))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+            pdf_reader = PdfReader(_stream(content))
+            total_pages = len(pdf_reader.pages)
+            if total_pages >= self.pdf_parallel_min_pages and self.pdf_workers > 1:
+                del pdf_reader
+                # Workers open a file on disk themselves instead of receiving its bytes
+                path = getattr(content, "name", None)
+                if not (isinstance(path, str) and os.path.isfile(path)):
+                    path = None
+                    if not isinstance(content, (bytes, bytearray)):
+                        content = _stream(content).read()
+                pages = self._iter_pdf_pages_parallel(path or content, total_pages)
+            else:
+                pages = ((i, page.extract_text() or "") for i, page in enumerate(pdf_reader.pages))
             
-            if not text.strip():
+            found_text = False
+            # Document offset of the current page
+            page_offset = 0
+            for page_index, page_text in pages:
+                for start, chunk in self._split_with_offsets(page_text, split, chunker, page_offset):
+                    found_text = True
+                    yield start, chunk, page_index + 1, None
+                page_offset += len(page_text) + 1
+                if progress_callback:
+                    progress_callback(page_index + 1, total_pages)
+            if not found_text:
                 logger.warning("PDF file appears to be empty or contains no extractable text")
-                return []
-            
-            return self._chunk_text(text)
         except Exception as e:
             logger.error(f"Error reading PDF: {e}")
             raise ValueError(f"Error processing PDF file: {str(e)}")
     
-    def _process_docx(self, content: bytes) -> List[str]:
-        """Process DOCX file"""
+    def _iter_pdf_pages_parallel(self, source: Union[bytes, str], total_pages: int) -> Iterator[Tuple[int, str]]:
+        """Extract pages of a PDF (bytes or file path) across a process pool, yielding them in page order
+        
+        At most two tasks per worker are in flight, so extracted text that the
+        consumer has not reached yet stays bounded.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: forking a process that runs worker threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.pdf_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            pool = self._pool
+        ranges = deque(
+            (start, min(start + self.pdf_pages_per_task, total_pages))
+            for start in range(0, total_pages, self.pdf_pages_per_task)
+        )
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < 2 * self.pdf_workers:
+                start, end = ranges.popleft()
+                in_flight.append((start, pool.submit(_extract_pdf_pages, source, start, end)))
+            start, future = in_flight.popleft()
+            try:
+                texts = future.result()
+            except BrokenProcessPool:
+                # A crashed worker poisons the pool; start a fresh one next time
+                with self._pool_lock:
+                    if self._pool is pool:
+                        self._pool = None
+                pool.shutdown(wait=False)
+                raise
+            for offset, text in enumerate(texts):
+                yield start + offset, text
+    
+    def _process_docx(self, content: Union[bytes, BinaryIO], split: Optional[List[float]] = None, chunker: Optional[Chunker] = None) -> Iterator[Tuple[int, str, Optional[int], Optional[str]]]:
+        """Process DOCX file, chunking each heading's section on its own"""
         try:
             from docx import Document
-            doc = Document(BytesIO(content))
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            return self._chunk_text(text)
         except ImportError:
             raise ImportError("python-docx not installed. Install: pip install python-docx")
+        doc = Document(_stream(content))
+        texts: List[str] = []
+        # (start, end, level, title) of each heading paragraph
+        headings: List[Tuple[int, int, int, str]] = []
+        offset = 0
+        for paragraph in doc.paragraphs:
+            level = self._heading_level(paragraph)
+            if level is not None and paragraph.text.strip():
+                headings.append((offset, offset + len(paragraph.text), level, paragraph.text.strip()))
+            texts.append(paragraph.text)
+            offset += len(paragraph.text) + 1
+        text = "\n".join(texts)
+        for start, end, section in sections(text, headings):
+            for chunk_start, chunk in self._split_with_offsets(text, split, chunker, start=start, end=end):
+                yield chunk_start, chunk, None, section
     
-    def _process_txt(self, content: bytes) -> List[str]:
-        """Process TXT file"""
+    @staticmethod
+    def _heading_level(paragraph) -> Optional[int]:
+        """0 for Title, N for "Heading N", None for body text"""
+        name = getattr(paragraph.style, "name", "") or ""
+        if name == "Title":
+            return 0
+        if name.startswith("Heading"):
+            level = name[len("Heading"):].strip()
+            return int(level) if level.isdigit() else 1
+        return None
+    
+    def _process_txt(self, content: Union[bytes, BinaryIO], split: Optional[List[float]] = None, chunker: Optional[Chunker] = None) -> Iterator[Tuple[int, str, Optional[int], Optional[str]]]:
+        """Process TXT file, chunking each markdown heading's section on its own"""
+        text = self._decode_text(content)
+        for start, end, section in markdown_sections(text):
+            for chunk_start, chunk in self._split_with_offsets(text, split, chunker, start=start, end=end):
+                yield chunk_start, chunk, None, section
+    
+    @staticmethod
+    def _decode_text(content: Union[bytes, BinaryIO]) -> str:
+        """UTF-8 text (latin-1 as a fallback); files are decoded from a memory map,
+        so only the decoded text is held in memory, not the raw bytes as well"""
+        if not isinstance(content, (bytes, bytearray)):
+            try:
+                fileno = content.fileno()
+            except (AttributeError, OSError):
+                content = _stream(content).read()
+            else:
+                if os.fstat(fileno).st_size == 0:
+                    return ""
+                with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+                    try:
+                        return str(mapped, 'utf-8')
+                    except UnicodeDecodeError:
+                        return str(mapped, 'latin-1')
         try:
-            text = content.decode('utf-8')
-            return self._chunk_text(text)
+            return content.decode('utf-8')
         except UnicodeDecodeError:
-            text = content.decode('latin-1')
-            return self._chunk_text(text)
+            return content.decode('latin-1')
     
-    def _chunk_text(self, text: str) -> List[str]:
+    def _chunk_text(self, text: str, collection: str = DEFAULT_COLLECTION) -> List[str]:
         """Chunk text into smaller pieces"""
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len
-        )
+        return [chunk for _, chunk in self._split_with_offsets(text, chunker=self.chunker(collection))]
+    
+    def _split_with_offsets(self, text: str, split: Optional[List[float]] = None, chunker: Optional[Chunker] = None, offset: int = 0, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, str]]:
+        """Chunk text[start:end] into (offset + start index, chunk) pairs
         
-        chunks = text_splitter.split_text(text)
+        Seconds spent are added to split[0] when `split` is given.
+        """
+        started = time.perf_counter()
+        chunks = list((chunker or self.chunker()).split(text, start, end, offset))
+        if split is not None:
+            split[0] += time.perf_counter() - started
         return chunks
-
@@ -0,0 +1,117 @@
+"""
+Document Registry - Which chunks belong to which uploaded document
+Kept in SQLite next to the vector store so documents can be listed,
+replaced and deleted by chunk id without scanning the vector store
+"""
+
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+_COLUMNS = ("document_id", "filename", "collection", "chunk_count", "created_at", "updated_at", "content_hash")
+
+
+class DocumentRegistry:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "document_id TEXT PRIMARY KEY, filename TEXT NOT NULL, collection TEXT NOT NULL, "
+            "chunk_count INTEGER NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_collection ON documents (collection, updated_at)")
+        # sha256 of the source file, when the ingest path knew it (bulk ingestion skips files already indexed)
+        columns = {name for _, name, *_ in self._db.execute("PRAGMA table_info(documents)")}
+        if "content_hash" not in columns:
+            self._db.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_content ON documents (collection, content_hash)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS document_chunks ("
+            "document_id TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+            "PRIMARY KEY (document_id, chunk_id)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM documents WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def list(self, collection: Optional[str] = None, limit: int = 50, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of documents, most recently updated first, and the total count"""
+        where, params = ("WHERE collection = ?", [collection]) if collection is not None else ("", [])
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM documents {where} "
+                "ORDER BY updated_at DESC, document_id LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+            total = self._db.execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()[0]
+        return [dict(zip(_COLUMNS, row)) for row in rows], total
+
+    def chunk_ids(self, document_id: str) -> Set[str]:
+        """Ids of the document's current chunks (empty if it is unknown)"""
+        with self._lock:
+            return {
+                chunk_id for chunk_id, in self._db.execute(
+                    "SELECT chunk_id FROM document_chunks WHERE document_id = ?", (document_id,)
+                )
+            }
+
+    def find_content(self, collection: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """A document in the collection whose source file had this sha256"""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM documents WHERE collection = ? AND content_hash = ? LIMIT 1",
+                (collection, content_hash)
+            ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def replace(self, document_id: str, filename: str, collection: str, chunk_ids: Iterable[str], content_hash: Optional[str] = None) -> Set[str]:
+        """Record the document's current chunks; returns ids of chunks it no longer has"""
+        chunk_ids = set(chunk_ids)
+        now = time.time()
+        with self._lock:
+            previous = {
+                chunk_id for chunk_id, in self._db.execute(
+                    "SELECT chunk_id FROM document_chunks WHERE document_id = ?", (document_id,)
+                )
+            }
+            stale = previous - chunk_ids
+            self._db.executemany(
+                "DELETE FROM document_chunks WHERE document_id = ? AND chunk_id = ?",
+                [(document_id, chunk_id) for chunk_id in stale]
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO document_chunks (document_id, chunk_id) VALUES (?, ?)",
+                [(document_id, chunk_id) for chunk_id in chunk_ids - previous]
+            )
+            self._db.execute(
+                "INSERT INTO documents (document_id, filename, collection, chunk_count, created_at, updated_at, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (document_id) DO UPDATE SET "
+                "filename = excluded.filename, chunk_count = excluded.chunk_count, updated_at = excluded.updated_at, "
+                "content_hash = excluded.content_hash",
+                (document_id, filename, collection, len(chunk_ids), now, now, content_hash)
+            )
+            self._db.commit()
+        return stale
+
+    def delete(self, document_id: str) -> Optional[Set[str]]:
+        """Forget a document; returns its chunk ids, or None if it is unknown"""
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM documents WHERE document_id = ?", (document_id,)).fetchone() is None:
+                return None
+            chunk_ids = {
+                chunk_id for chunk_id, in self._db.execute(
+                    "SELECT chunk_id FROM document_chunks WHERE document_id = ?", (document_id,)
+                )
+            }
+            self._db.execute("DELETE FROM document_chunks WHERE document_id = ?", (document_id,))
+            self._db.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+            self._db.commit()
+        return chunk_ids
@@ -4,7 +4,9 @@ Streamlit Frontend for RAG Chatbot
 
 import streamlit as st
 import requests
+import json
 import os
+import time
 from datetime import datetime
 import uuid
 
@@ -45,6 +47,24 @@ if 'messages' not in st.session_state:
 if 'api_connected' not in st.session_state:
     st.session_state.api_connected = None
 
+def wait_for_job(job_id):
+    """Poll an ingest job until it finishes, showing its progress"""
+    progress = st.progress(0.0, text="Queued...")
+    while True:
+        job = requests.get(f"{API_URL}/api/jobs/{job_id}", timeout=10).json()
+        if job['status'] in ('done', 'failed'):
+            progress.empty()
+            return job
+        eta = f" (about {job['eta_seconds']:.0f}s left)" if job.get('eta_seconds') is not None else ""
+        if job.get('pages_total'):
+            # Pages are embedded as they are parsed, so page progress tracks the job
+            fraction = job['pages_parsed'] / job['pages_total']
+            progress.progress(
+                fraction,
+                text=f"Parsed {job['pages_parsed']}/{job['pages_total']} pages, embedded {job['chunks_embedded']} chunks{eta}"
+            )
+        time.sleep(1)
+
 # Sidebar
 with st.sidebar:
     st.title("🤖 RAG Chatbot")
@@ -94,12 +114,17 @@ with st.sidebar:
                         files=files,
                         timeout=300
                     )
-                    if response.status_code == 200:
+                    if response.status_code in (200, 202):
                         result = response.json()
-                        st.success(result['message'])
-                        # Show chunk count if available
-                        if 'chunks' in result:
-                            st.info(f"Created {result['chunks']} text chunks")
+                        if 'job_id' in result:
+                            result = wait_for_job(result['job_id'])
+                        if result.get('status') == 'failed':
+                            st.error(f"Upload failed: {result.get('error', 'Unknown error')}")
+                        else:
+                            st.success(result['message'])
+                            # Show chunk count if available
+                            if result.get('chunks_total'):
+                                st.info(f"Created {result['chunks_total']} text chunks")
                     else:
                         # Try to get error message from response
                         try:
@@ -119,6 +144,26 @@ with st.sidebar:
     st.markdown("---")
     st.info("💡 Tip: Upload documents first, then ask questions about them!")
 
+def stream_tokens(response, stream_state):
+    """Yield tokens from a server-sent event response, recording sources and stats"""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            event = None
+            continue
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data = json.loads(line[len("data:"):].strip())
+            if event == "token":
+                yield data["content"]
+            elif event == "sources":
+                stream_state["sources"] = data.get("sources")
+            elif event == "done":
+                stream_state["stats"] = data
+            elif event == "error":
+                stream_state["error"] = data.get("message", "Unknown error")
+
 # Main chat interface
 st.title("🤖 RAG Chatbot")
 st.markdown("Ask questions based on your uploaded documents!")
@@ -139,43 +184,49 @@ if prompt := st.chat_input("Type your message..."):
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Get response
+    # Get response (streamed token by token)
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                response = requests.post(
-                    f"{API_URL}/api/chat",
-                    json={
-                        "message": prompt,
-                        "conversation_id": st.session_state.conversation_id,
-                        "use_rag": True
-                    },
-                    timeout=120
-                )
+        try:
+            stream_state = {"sources": None, "error": None, "stats": None}
+            response = requests.post(
+                f"{API_URL}/api/chat/stream",
+                json={
+                    "message": prompt,
+                    "conversation_id": st.session_state.conversation_id,
+                    "use_rag": True
+                },
+                stream=True,
+                timeout=120
+            )
+            
+            if response.status_code == 200:
+                assistant_response = st.write_stream(stream_tokens(response, stream_state))
+                sources = stream_state["sources"]
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    assistant_response = result["response"]
-                    sources = result.get("sources")
-                    
-                    st.markdown(assistant_response)
-                    
-                    if sources:
-                        with st.expander("📚 Sources"):
-                            for source in sources:
-                                st.text(source)
-                    
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": assistant_response,
-                        "sources": sources
-                    })
-                else:
-                    st.error("Error getting response")
-            except requests.exceptions.Timeout:
-                st.error("Request timed out. Please try again.")
-            except requests.exceptions.ConnectionError:
-                st.error("Cannot connect to API. Make sure backend is running.")
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-
+                if stream_state["error"]:
+                    st.error(stream_state["error"])
+                
+                if sources:
+                    with st.expander("📚 Sources"):
+                        for source in sources:
+                            st.text(source)
+                
+                if stream_state["stats"] and stream_state["stats"].get("ttft_ms") is not None:
+                    st.caption(
+                        f"First token in {stream_state['stats']['ttft_ms']:.0f} ms, "
+                        f"complete in {stream_state['stats']['total_ms']:.0f} ms"
+                    )
+                
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": assistant_response if isinstance(assistant_response, str) else "",
+                    "sources": sources
+                })
+            else:
+                st.error("Error getting response")
+        except requests.exceptions.Timeout:
+            st.error("Request timed out. Please try again.")
+        except requests.exceptions.ConnectionError:
+            st.error("Cannot connect to API. Make sure backend is running.")
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
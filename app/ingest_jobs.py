@@ -0,0 +1,414 @@
+"""
+Ingest Jobs - Background document ingestion with a persistent job table
+Uploads are written to disk and queued; a worker pool parses, chunks and
+embeds them while progress is recorded in SQLite so jobs survive restarts.
+With several server workers only the writer process runs jobs; the others
+queue theirs (uploads and document deletes) in the shared table.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, Optional, Union
+
+try:
+    from .bulk_ingest import count_files, file_sha256, ingest_path
+    from .dedup import document_id
+    from .document_processor import DEFAULT_COLLECTION
+    from .metrics import observe_ingest
+except ImportError:
+    from bulk_ingest import count_files, file_sha256, ingest_path
+    from dedup import document_id
+    from document_processor import DEFAULT_COLLECTION
+    from metrics import observe_ingest
+
+logger = logging.getLogger(__name__)
+
+_COPY_BLOCK_BYTES = 1024 * 1024
+
+_COLUMNS = (
+    "id", "filename", "path", "status", "message", "error",
+    "pages_parsed", "pages_total", "chunks_embedded", "chunks_total",
+    "new_chunks", "skipped_chunks", "created_at", "started_at", "embedding_started_at", "finished_at",
+    "collection", "timings", "kind", "details"
+)
+
+
+class JobStore:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, filename TEXT NOT NULL, path TEXT NOT NULL, "
+            "status TEXT NOT NULL, message TEXT, error TEXT, "
+            "pages_parsed INTEGER DEFAULT 0, pages_total INTEGER, "
+            "chunks_embedded INTEGER DEFAULT 0, chunks_total INTEGER, "
+            "new_chunks INTEGER, skipped_chunks INTEGER, "
+            "created_at REAL NOT NULL, started_at REAL, embedding_started_at REAL, finished_at REAL)"
+        )
+        columns = {name for _, name, *_ in self._db.execute("PRAGMA table_info(jobs)")}
+        # details: per-file results and the summary of a bulk job (JSON)
+        for name in ("collection", "timings", "details"):
+            if name not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {name} TEXT")
+        # ingest, delete (filename holds the document id) or bulk (pages count files)
+        if "kind" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'ingest'")
+        self._db.commit()
+
+    def create(self, job_id: str, filename: str, path: str, collection: Optional[str], kind: str = "ingest"):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, filename, path, status, created_at, collection, kind) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, filename, path, time.time(), collection, kind)
+            )
+            self._db.commit()
+
+    def update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def unfinished(self, statuses=("queued", "running")):
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, filename, path, collection, kind FROM jobs WHERE status IN ({','.join('?' * len(statuses))}) "
+                "ORDER BY created_at",
+                statuses
+            ).fetchall()
+        return rows
+
+
+class IngestJobQueue:
+    """Runs ingest and delete jobs from the job table
+
+    Only a `writer` runs jobs; other processes just record them. With
+    `shared=True` (several server workers) the writer also polls the table
+    for jobs the other processes queued.
+    """
+
+    def __init__(self, rag_engine, document_processor, upload_dir: str, workers: int = 2, writer: bool = True, shared: bool = False, poll_interval: float = 0.5):
+        self.rag_engine = rag_engine
+        self.document_processor = document_processor
+        self.upload_dir = upload_dir
+        self.writer = writer
+        self.shared = shared
+        self.poll_interval = poll_interval
+        os.makedirs(upload_dir, exist_ok=True)
+        self.store = JobStore(os.getenv("INGEST_JOBS_DB", os.path.join(upload_dir, "jobs.sqlite")))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        # Jobs handed to the executor and not finished yet, so polling never runs one twice
+        self._dispatched = set()
+        self._dispatch_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def submit(self, filename: str, content: Union[bytes, BinaryIO], collection: str = DEFAULT_COLLECTION) -> str:
+        """Save the upload to disk and queue it; returns the job id
+
+        `content` is bytes or a binary file, which is copied block by block.
+        """
+        job_id = uuid.uuid4().hex
+        path = self._save(job_id, filename, content)
+        self.store.create(job_id, filename, path, collection)
+        self._dispatch(job_id, filename, path, collection)
+        logger.info(f"Queued ingest job {job_id} for {filename}")
+        return job_id
+
+    def submit_bulk(self, name: str, content: Optional[Union[bytes, BinaryIO]] = None, directory: Optional[str] = None, collection: str = DEFAULT_COLLECTION) -> str:
+        """Queue the bulk ingestion of a zip/tar archive (`content`, saved like
+        an upload) or of a directory the writer can read; returns the job id"""
+        job_id = uuid.uuid4().hex
+        path = directory if directory is not None else self._save(job_id, name, content)
+        self.store.create(job_id, name, path, collection, kind="bulk")
+        self._dispatch(job_id, name, path, collection, "bulk")
+        logger.info(f"Queued bulk ingest job {job_id} for {name}")
+        return job_id
+
+    def _save(self, job_id: str, filename: str, content: Union[bytes, BinaryIO]) -> str:
+        """Write an upload into the upload directory; a file is copied block by block"""
+        path = os.path.join(self.upload_dir, f"{job_id}_{os.path.basename(filename)}")
+        with open(path, "wb") as f:
+            if isinstance(content, (bytes, bytearray)):
+                f.write(content)
+            else:
+                content.seek(0)
+                shutil.copyfileobj(content, f, _COPY_BLOCK_BYTES)
+        return path
+
+    def submit_delete(self, document_id: str) -> str:
+        """Queue the deletion of a document for the writer; returns the job id"""
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, document_id, "", None, kind="delete")
+        self._dispatch(job_id, document_id, "", None, "delete")
+        logger.info(f"Queued delete job {job_id} for document {document_id}")
+        return job_id
+
+    def resume(self):
+        """Re-queue jobs that were queued or running when the process stopped"""
+        if not self.writer:
+            return
+        for job_id, filename, path, collection, kind in self.store.unfinished():
+            if kind != "delete" and not os.path.exists(path):
+                self.store.update(job_id, status="failed", error="Upload file missing after restart", finished_at=time.time())
+                continue
+            self.store.update(job_id, status="queued", pages_parsed=0, chunks_embedded=0)
+            self._dispatch(job_id, filename, path, collection, kind)
+            logger.info(f"Resumed {kind} job {job_id} for {filename}")
+        if self.shared:
+            threading.Thread(target=self._poll, name="ingest-poll", daemon=True).start()
+
+    def shutdown(self):
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.document_processor.shutdown()
+
+    def _dispatch(self, job_id: str, filename: str, path: str, collection: Optional[str], kind: str = "ingest"):
+        if not self.writer:
+            # The writer process picks the job up from the table
+            return
+        with self._dispatch_lock:
+            if job_id in self._dispatched:
+                return
+            self._dispatched.add(job_id)
+        if kind == "delete":
+            self._executor.submit(self._run_delete, job_id, filename)
+        elif kind == "bulk":
+            self._executor.submit(self._run_bulk, job_id, filename, path, collection or DEFAULT_COLLECTION)
+        else:
+            self._executor.submit(self._run, job_id, filename, path, collection or DEFAULT_COLLECTION)
+
+    def _poll(self):
+        """Dispatch jobs other server workers queued"""
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                for job_id, filename, path, collection, kind in self.store.unfinished(("queued",)):
+                    self._dispatch(job_id, filename, path, collection, kind)
+            except Exception as e:
+                logger.warning(f"Polling the job table failed: {e}")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status with progress and an ETA for the current phase"""
+        job = self.store.get(job_id)
+        if not job:
+            return None
+        job.pop("path")
+        job["timings"] = json.loads(job["timings"]) if job["timings"] else None
+        job["details"] = json.loads(job["details"]) if job["details"] else None
+        job["eta_seconds"] = self._eta(job)
+        return job
+
+    @staticmethod
+    def _eta(job: Dict[str, Any]) -> Optional[float]:
+        if job["status"] != "running":
+            return None
+        # Parsing and embedding overlap, so page progress paces the whole job
+        if not job["pages_total"] or not job["pages_parsed"] or not job["started_at"]:
+            return None
+        done, total = job["pages_parsed"], job["pages_total"]
+        return round((time.time() - job["started_at"]) / done * (total - done), 1)
+
+    def _progress(self, job_id: str, fields, interval: float = 0.5):
+        """Progress callback that writes to the job table at most every `interval` seconds"""
+        last = [0.0]
+
+        def callback(done: int, total: int):
+            now = time.monotonic()
+            if (total is not None and done >= total) or now - last[0] >= interval:
+                last[0] = now
+                self.store.update(job_id, **fields(done, total))
+        return callback
+
+    def _run(self, job_id: str, filename: str, path: str, collection: str = DEFAULT_COLLECTION):
+        # Uploads accepted during startup wait for the engine to finish loading
+        self.rag_engine.wait_until_initialized()
+        self.store.update(job_id, status="running", started_at=time.time())
+        # Per-stage milliseconds; parsing, chunking and embedding overlap, so they can exceed total_ms
+        timings = {}
+        start = time.perf_counter()
+        counts = None
+        status = "failed"
+        upload = None
+        try:
+            digest = file_sha256(path)
+            # The same content under another name would store every chunk again
+            # (chunk ids are scoped to the document): point to the indexed copy
+            duplicate = self.rag_engine.find_document_by_content(collection, digest)
+            if duplicate is not None and duplicate["document_id"] != document_id(collection, os.path.basename(filename)):
+                timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                status = "duplicate"
+                self.store.update(
+                    job_id,
+                    status="done",
+                    timings=json.dumps(timings),
+                    message=f"Same content as {duplicate['filename']}, which is already in the knowledge base; not indexed again.",
+                    details=json.dumps({"duplicate_of": duplicate["filename"], "document_id": duplicate["document_id"]}),
+                    chunks_total=0,
+                    new_chunks=0,
+                    skipped_chunks=0,
+                    finished_at=time.time()
+                )
+                logger.info(f"Ingest job {job_id}: {filename} duplicates {duplicate['filename']}, skipped")
+                return
+            # Parsed from the file, never read into memory whole; chunks
+            # stream from the parser straight into the embedder
+            upload = open(path, "rb")
+            chunks = self.document_processor.iter_records(
+                filename,
+                upload,
+                progress_callback=self._progress(job_id, lambda done, total: {"pages_parsed": done, "pages_total": total}),
+                collection=collection,
+                timings=timings
+            )
+
+            if not self.rag_engine.is_ready():
+                logger.warning("RAG engine not ready, document chunks prepared but not added to vector DB")
+                chunk_count = sum(1 for _ in chunks)
+                if not chunk_count:
+                    raise ValueError("No text could be extracted from the document")
+                timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                status = "done"
+                self.store.update(
+                    job_id,
+                    status="done",
+                    chunks_total=chunk_count,
+                    timings=json.dumps(timings),
+                    message=f"Document processed into {chunk_count} chunks, but not added to vector DB. Please configure LLM first.",
+                    finished_at=time.time()
+                )
+                return
+
+            counts = self.rag_engine.add_documents(
+                chunks,
+                progress_callback=self._progress(job_id, lambda done, total: {"chunks_embedded": done}),
+                timings=timings,
+                # Lets bulk ingestion recognise this file's content later
+                content_hashes={document_id(collection, os.path.basename(filename)): digest},
+                on_embedding_started=lambda: self.store.update(job_id, embedding_started_at=time.time())
+            )
+            chunk_count = counts["added"] + counts["skipped"]
+            if not chunk_count:
+                raise ValueError("No text could be extracted from the document")
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            status = "done"
+            self.store.update(
+                job_id,
+                status="done",
+                timings=json.dumps(timings),
+                message=(
+                    f"Document processed and added to knowledge base. {chunk_count} chunks created, "
+                    f"{counts['added']} new, {counts['skipped'] - counts['repeated']} already in the knowledge base, "
+                    f"{counts['repeated']} repeated within the document, "
+                    f"{counts['removed']} from a previous version removed."
+                ),
+                chunks_embedded=chunk_count,
+                chunks_total=chunk_count,
+                new_chunks=counts["added"],
+                skipped_chunks=counts["skipped"],
+                finished_at=time.time()
+            )
+            logger.info(f"Ingest job {job_id} finished: {counts['added']} new chunks, timings {timings}")
+        except Exception as e:
+            logger.error(f"Ingest job {job_id} failed: {e}", exc_info=True)
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self.store.update(job_id, status="failed", error=str(e), timings=json.dumps(timings), finished_at=time.time())
+        finally:
+            observe_ingest(timings, counts, status)
+            if upload is not None:
+                upload.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._dispatched.discard(job_id)
+
+    def _run_delete(self, job_id: str, document_id: str):
+        self.rag_engine.wait_until_initialized()
+        self.store.update(job_id, status="running", started_at=time.time())
+        try:
+            removed = self.rag_engine.delete_document(document_id)
+            if removed is None:
+                # chunks_total stays empty: the document was not found
+                self.store.update(job_id, status="done", message="Document not found", finished_at=time.time())
+            else:
+                self.store.update(
+                    job_id,
+                    status="done",
+                    message=f"Document deleted ({removed} chunks removed)",
+                    chunks_total=removed,
+                    finished_at=time.time()
+                )
+        except Exception as e:
+            logger.error(f"Delete job {job_id} failed: {e}", exc_info=True)
+            self.store.update(job_id, status="failed", error=str(e), finished_at=time.time())
+        finally:
+            self._dispatched.discard(job_id)
+
+    def _run_bulk(self, job_id: str, name: str, path: str, collection: str = DEFAULT_COLLECTION):
+        self.rag_engine.wait_until_initialized()
+        # pages_parsed / pages_total count files for bulk jobs
+        total = count_files(path)
+        self.store.update(job_id, status="running", started_at=time.time(), pages_parsed=0, pages_total=total)
+        files = []
+        progress = self._progress(job_id, lambda done, total: {"pages_parsed": done, "details": json.dumps({"files": files})})
+        counts = None
+        status = "failed"
+
+        def on_file(result):
+            files.append(result)
+            progress(len(files), total)
+
+        try:
+            if not self.rag_engine.is_ready():
+                raise ValueError("RAG engine not ready. Please configure LLM first.")
+            report = ingest_path(
+                self.rag_engine, self.document_processor, path, collection, on_file=on_file,
+                on_embedding_started=lambda: self.store.update(job_id, embedding_started_at=time.time())
+            )
+            summary = report["summary"]
+            counts = {"added": summary["new_chunks"], "skipped": summary["skipped_chunks"], "removed": summary["removed_chunks"]}
+            status = "done"
+            self.store.update(
+                job_id,
+                status="done",
+                message=(
+                    f"{summary['files']} files: {summary['indexed']} indexed, {summary['unchanged']} unchanged, "
+                    f"{summary['duplicate']} duplicates, {summary['unsupported']} unsupported, {summary['failed']} failed. "
+                    f"{summary['chunks']} chunks ({summary['new_chunks']} new) at {summary['files_per_s']} files/s."
+                ),
+                pages_parsed=summary["files"],
+                pages_total=summary["files"],
+                chunks_embedded=summary["chunks"],
+                chunks_total=summary["chunks"],
+                new_chunks=summary["new_chunks"],
+                skipped_chunks=summary["skipped_chunks"],
+                timings=json.dumps(summary["timings"]),
+                details=json.dumps(report),
+                finished_at=time.time()
+            )
+            logger.info(f"Bulk ingest job {job_id} finished: {summary}")
+        except Exception as e:
+            logger.error(f"Bulk ingest job {job_id} failed: {e}", exc_info=True)
+            self.store.update(job_id, status="failed", error=str(e), details=json.dumps({"files": files}), finished_at=time.time())
+        finally:
+            observe_ingest(None, counts, status)
+            # Uploaded archives are removed; directories are left alone
+            if os.path.isfile(path) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.upload_dir):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._dispatched.discard(job_id)
@@ -0,0 +1,202 @@
+"""
+Ingest Pipeline - Concurrent, rate-limit-aware batch embedding
+Chunks are grouped into token-sized batches, embedded by a bounded pool of
+workers that back off adaptively on 429s, and handed to a single writer
+thread so vector-store writes overlap with embedding
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    from .tokens import count_tokens
+except ImportError:
+    from tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """429s that are worth retrying (an exhausted quota is not)"""
+    error_str = str(error).lower()
+    if "insufficient_quota" in error_str:
+        return False
+    return type(error).__name__ == "RateLimitError" or "429" in error_str or "rate limit" in error_str
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that halves on rate limiting and recovers one slot per streak of successes"""
+
+    def __init__(self, max_concurrency: int, recover_after: int = 4):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.recover_after = recover_after
+        self._active = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+    def release(self, rate_limited: bool = False):
+        with self._condition:
+            self._active -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.recover_after and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+class EmbeddingPipeline:
+    def __init__(
+        self,
+        embeddings,
+        write: Callable[[List[str], List[str], List[List[float]], List[Optional[dict]]], None],
+        max_batch_tokens: int = 8000,
+        max_batch_size: int = 256,
+        concurrency: int = 4,
+        max_retries: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        self.embeddings = embeddings
+        self.write = write
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limited = 0
+        # Seconds spent in embedding calls (summed across workers) and store writes
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def batches(self, items: Iterable[Sequence]) -> Iterator[List[Sequence]]:
+        """Group (id, text[, metadata]) items into batches bounded by token count and size"""
+        batch, tokens = [], 0
+        for item in items:
+            item_tokens = count_tokens(item[1])
+            if batch and (tokens + item_tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(item)
+            tokens += item_tokens
+        if batch:
+            yield batch
+
+    def run(self, items: Iterable[Sequence], on_written: Optional[Callable[[int], None]] = None, on_started: Optional[Callable[[], None]] = None) -> int:
+        """Embed and write every item; returns the number written
+
+        `items` is consumed lazily on the calling thread. `on_written(count)`
+        is called from the writer thread after each batch is stored, and
+        `on_started()` from the calling thread as the first batch goes to the embedders.
+        """
+        limiter = AdaptiveLimiter(self.concurrency)
+        # Embedded batches waiting for the writer; bounded so a slow store applies backpressure
+        written_queue: "queue.Queue" = queue.Queue(maxsize=2 * self.concurrency)
+        errors: List[BaseException] = []
+        written = [0]
+        stop = threading.Event()
+
+        def writer():
+            while True:
+                batch = written_queue.get()
+                if batch is None:
+                    return
+                if stop.is_set():
+                    continue
+                ids, texts, vectors, metadatas = batch
+                try:
+                    start = time.perf_counter()
+                    self.write(ids, texts, vectors, metadatas)
+                    self.write_seconds += time.perf_counter() - start
+                    written[0] += len(ids)
+                    if on_written:
+                        on_written(len(ids))
+                except BaseException as e:
+                    errors.append(e)
+                    stop.set()
+
+        def embed(batch: List[Sequence]):
+            try:
+                if stop.is_set():
+                    return
+                ids = [item[0] for item in batch]
+                texts = [item[1] for item in batch]
+                metadatas = [item[2] if len(item) > 2 else None for item in batch]
+                vectors = self._embed_with_backoff(texts, limiter)
+                written_queue.put((ids, texts, vectors, metadatas))
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                in_flight.release()
+
+        writer_thread = threading.Thread(target=writer, name="embedding-writer", daemon=True)
+        writer_thread.start()
+        # Bound batches read ahead of the embedders so generators are pulled lazily
+        in_flight = threading.Semaphore(2 * self.concurrency)
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as executor:
+                for batch in self.batches(items):
+                    in_flight.acquire()
+                    if stop.is_set():
+                        in_flight.release()
+                        break
+                    if on_started:
+                        on_started()
+                        on_started = None
+                    executor.submit(embed, batch)
+        finally:
+            written_queue.put(None)
+            writer_thread.join()
+        if errors:
+            raise errors[0]
+        return written[0]
+
+    def _embed_with_backoff(self, texts: List[str], limiter: AdaptiveLimiter) -> List[List[float]]:
+        attempt = 0
+        while True:
+            limiter.acquire()
+            start = time.perf_counter()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                limiter.release(rate_limited=is_rate_limit_error(e))
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                self.rate_limited += 1
+                delay = _retry_after(e) or min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay *= random.uniform(0.8, 1.2)
+                attempt += 1
+                logger.warning(f"Embedding rate limited, retrying in {delay:.1f}s (attempt {attempt}/{self.max_retries}, concurrency {limiter.limit})")
+                time.sleep(delay)
+                continue
+            limiter.release()
+            with self._stats_lock:
+                self.embed_seconds += time.perf_counter() - start
+            return vectors
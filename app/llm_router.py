@@ -0,0 +1,356 @@
+"""
+LLM Router - Failover, circuit breaking and hedging across LLM backends
+Backends are tried in priority order. Each one's latency and errors are
+tracked; a backend that keeps failing has its circuit opened for a cooldown
+so requests skip it. A request whose backend errors or times out fails over
+to the next backend, and a slow one can be hedged with a duplicate request
+once it passes the backend's p95 latency.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .metrics import LLM_CIRCUIT_OPEN, LLM_HEDGES, LLM_REQUESTS, LLM_SECONDS
+except ImportError:
+    from metrics import LLM_CIRCUIT_OPEN, LLM_HEDGES, LLM_REQUESTS, LLM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(Exception):
+    """Every backend failed, or every circuit is open"""
+
+
+def llm_input(llm, prompt: str):
+    """Wrap the prompt in the input format an LLM expects"""
+    # Check if LLM is a ChatOpenAI model (expects messages)
+    llm_type = type(llm).__name__
+    if 'ChatOpenAI' in llm_type or 'OpenAI' in llm_type:
+        # Try newer LangChain API (0.1.x+)
+        try:
+            from langchain_core.messages import SystemMessage, HumanMessage
+        except ImportError:
+            from langchain.schema import SystemMessage, HumanMessage
+        return [
+            SystemMessage(content="You are a helpful assistant."),
+            HumanMessage(content=prompt)
+        ]
+    # For HuggingFace, Ollama, and other models - use invoke with string
+    return prompt
+
+
+async def _aclose(stream):
+    """Close an abandoned stream, ignoring errors from the backend"""
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+class Backend:
+    """One LLM with its recent latencies, error rate and circuit breaker
+
+    The circuit opens after `failure_threshold` consecutive failures. Once
+    `cooldown` seconds have passed a single trial request is let through
+    (half-open): success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, name: str, llm, timeout: float = 60.0, failure_threshold: int = 3, cooldown: float = 30.0, window: int = 200):
+        self.name = name
+        self.llm = llm
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._latencies: deque = deque(maxlen=window)
+        # True for each failed request in the window
+        self._failures: deque = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+        LLM_CIRCUIT_OPEN.set(0, backend=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._probing or time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def acquire(self) -> bool:
+        """Whether a request may be sent now (claims the trial slot of a half-open circuit)"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self, seconds: float):
+        LLM_SECONDS.observe(seconds, backend=self.name)
+        LLM_REQUESTS.inc(backend=self.name, outcome="ok")
+        with self._lock:
+            self._latencies.append(seconds)
+            self._failures.append(False)
+            self._consecutive_failures = 0
+            self._probing = False
+            if self._opened_at is None:
+                return
+            self._opened_at = None
+        logger.info(f"LLM backend {self.name} recovered, circuit closed")
+        LLM_CIRCUIT_OPEN.set(0, backend=self.name)
+
+    def record_failure(self, error: BaseException):
+        LLM_REQUESTS.inc(backend=self.name, outcome="timeout" if isinstance(error, TimeoutError) else "error")
+        with self._lock:
+            self._failures.append(True)
+            self._consecutive_failures += 1
+            if not self._probing and self._consecutive_failures < self.failure_threshold:
+                return
+            self._probing = False
+            self._opened_at = time.monotonic()
+        logger.warning(f"LLM backend {self.name} circuit opened for {self.cooldown:.0f}s after {self._consecutive_failures} consecutive failures: {error}")
+        LLM_CIRCUIT_OPEN.set(1, backend=self.name)
+
+    def record_abandoned(self):
+        """The request was cancelled (a hedge lost, or the client went away)"""
+        LLM_REQUESTS.inc(backend=self.name, outcome="cancelled")
+        with self._lock:
+            self._probing = False
+
+    def percentile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < max(1, min_samples):
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        with self._lock:
+            requests = len(self._failures)
+            errors = sum(self._failures)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "requests": requests,
+            "error_rate": round(errors / requests, 3) if requests else 0.0,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+class LLMRouter:
+    """Route invoke/ainvoke/astream across backends in priority order
+
+    Prompts given as strings are wrapped per backend (chat models get
+    messages). With `hedge` enabled, a request still running after its
+    backend's p95 latency (once `hedge_min_samples` latencies are known) is
+    duplicated to the next available backend - or the same one, if it is
+    the only one - and the first answer wins. Streams fail over only until
+    their first chunk has been yielded.
+    """
+
+    def __init__(self, backends: Sequence[Backend], hedge: bool = False, hedge_min_samples: int = 20, max_workers: int = 32):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = list(backends)
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.max_workers = max_workers
+        self.hedges = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return self.backends[0].llm
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [backend.stats() for backend in self.backends]
+
+    def _next(self, tried: List[Backend]) -> Optional[Backend]:
+        for backend in self.backends:
+            if backend not in tried and backend.acquire():
+                return backend
+        return None
+
+    def _hedge_after(self, backend: Backend) -> Optional[float]:
+        if not self.hedge:
+            return None
+        return backend.percentile(0.95, self.hedge_min_samples)
+
+    def _exhausted(self, errors: List[Tuple[str, BaseException]]) -> LLMUnavailableError:
+        if not errors:
+            return LLMUnavailableError(f"All LLM backends are unavailable (circuit open: {', '.join(b.name for b in self.backends)})")
+        return LLMUnavailableError("All LLM backends failed: " + "; ".join(f"{name}: {error}" for name, error in errors))
+
+    @staticmethod
+    def _input(backend: Backend, input: Any):
+        return llm_input(backend.llm, input) if isinstance(input, str) else input
+
+    def _next_attempt(self, tried: List[Backend], errors, primary: Optional[Backend]) -> Backend:
+        """Next backend for a failover (primary is None) or a hedge"""
+        backend = self._next(tried)
+        if backend is None:
+            if primary is None:
+                raise self._exhausted(errors)
+            # Nothing else is available: hedge on the same backend
+            return primary
+        tried.append(backend)
+        return backend
+
+    def _settle(self, backend: Backend, started: float, error: Optional[BaseException], errors) -> bool:
+        """Record a finished attempt; True if it succeeded"""
+        if error is None:
+            backend.record_success(time.perf_counter() - started)
+            return True
+        backend.record_failure(error)
+        errors.append((backend.name, error))
+        logger.warning(f"LLM backend {backend.name} failed: {error}")
+        return False
+
+    def _hedge_delay(self, attempts: Dict[Any, Tuple[Backend, float]], hedged: bool) -> Optional[float]:
+        if hedged or len(attempts) != 1:
+            return None
+        backend, started = next(iter(attempts.values()))
+        after = self._hedge_after(backend)
+        if after is None:
+            return None
+        return max(0.0, after - (time.perf_counter() - started))
+
+    @staticmethod
+    def _timeout_delay(attempts: Dict[Any, Tuple[Backend, float]]) -> float:
+        now = time.perf_counter()
+        return max(0.0, min(started + backend.timeout - now for backend, started in attempts.values()))
+
+    def invoke(self, input: Any, config=None, **kwargs):
+        """Blocking call; attempts run on the router's thread pool so they can be hedged and timed out"""
+        tried: List[Backend] = []
+        errors: List[Tuple[str, BaseException]] = []
+        attempts: Dict[Any, Tuple[Backend, float]] = {}
+        hedged = False
+        try:
+            while True:
+                if not attempts:
+                    backend = self._next_attempt(tried, errors, None)
+                    attempts[self._submit(backend, input, config, kwargs)] = (backend, time.perf_counter())
+                hedge_delay = self._hedge_delay(attempts, hedged)
+                timeout_delay = self._timeout_delay(attempts)
+                delay = timeout_delay if hedge_delay is None else min(hedge_delay, timeout_delay)
+                done, _ = wait(list(attempts), timeout=delay, return_when=FIRST_COMPLETED)
+                for future in done:
+                    backend, started = attempts.pop(future)
+                    if self._settle(backend, started, future.exception(), errors):
+                        return future.result()
+                if done:
+                    continue
+                self._expire(attempts, errors)
+                if attempts and hedge_delay is not None and hedge_delay <= timeout_delay:
+                    hedged = True
+                    self._start_hedge(attempts, tried, errors, lambda backend: self._submit(backend, input, config, kwargs))
+        finally:
+            # Losing or abandoned attempts cannot be interrupted; their results are dropped
+            for backend, _ in attempts.values():
+                backend.record_abandoned()
+
+    async def ainvoke(self, input: Any, config=None, **kwargs):
+        tried: List[Backend] = []
+        errors: List[Tuple[str, BaseException]] = []
+        attempts: Dict[asyncio.Task, Tuple[Backend, float]] = {}
+        hedged = False
+
+        def start(backend: Backend) -> asyncio.Task:
+            return asyncio.ensure_future(backend.llm.ainvoke(self._input(backend, input), config, **kwargs))
+
+        try:
+            while True:
+                if not attempts:
+                    backend = self._next_attempt(tried, errors, None)
+                    attempts[start(backend)] = (backend, time.perf_counter())
+                hedge_delay = self._hedge_delay(attempts, hedged)
+                timeout_delay = self._timeout_delay(attempts)
+                delay = timeout_delay if hedge_delay is None else min(hedge_delay, timeout_delay)
+                done, _ = await asyncio.wait(list(attempts), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    backend, started = attempts.pop(task)
+                    if self._settle(backend, started, task.exception(), errors):
+                        return task.result()
+                if done:
+                    continue
+                for task in self._expire(attempts, errors):
+                    task.cancel()
+                if attempts and hedge_delay is not None and hedge_delay <= timeout_delay:
+                    hedged = True
+                    self._start_hedge(attempts, tried, errors, start)
+        finally:
+            for task, (backend, _) in attempts.items():
+                task.cancel()
+                backend.record_abandoned()
+
+    def _expire(self, attempts: Dict[Any, Tuple[Backend, float]], errors) -> List[Any]:
+        """Fail attempts past their backend's timeout; returns them"""
+        now = time.perf_counter()
+        expired = [key for key, (backend, started) in attempts.items() if now - started >= backend.timeout]
+        for key in expired:
+            backend, started = attempts.pop(key)
+            self._settle(backend, started, TimeoutError(f"no response within {backend.timeout:g}s"), errors)
+        return expired
+
+    def _start_hedge(self, attempts: Dict[Any, Tuple[Backend, float]], tried: List[Backend], errors, start):
+        primary, _ = next(iter(attempts.values()))
+        backend = self._next_attempt(tried, errors, primary)
+        logger.info(f"Hedging slow LLM request on {primary.name} with {backend.name}")
+        self.hedges += 1
+        LLM_HEDGES.inc(backend=backend.name)
+        attempts[start(backend)] = (backend, time.perf_counter())
+
+    def _submit(self, backend: Backend, input: Any, config, kwargs):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm")
+        return self._executor.submit(backend.llm.invoke, self._input(backend, input), config, **kwargs)
+
+    async def astream(self, input: Any, config=None, **kwargs) -> AsyncIterator[Any]:
+        tried: List[Backend] = []
+        errors: List[Tuple[str, BaseException]] = []
+        while True:
+            backend = self._next_attempt(tried, errors, None)
+            started = time.perf_counter()
+            streamed = False
+            settled = False
+            stream = backend.llm.astream(self._input(backend, input), config, **kwargs).__aiter__()
+            try:
+                # A backend that stalls before its first chunk fails over like ainvoke
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), backend.timeout)
+                except asyncio.TimeoutError:
+                    await _aclose(stream)
+                    raise TimeoutError(f"no response within {backend.timeout:g}s")
+                except StopAsyncIteration:
+                    chunk = None
+                if chunk is not None:
+                    streamed = True
+                    yield chunk
+                    async for chunk in stream:
+                        yield chunk
+                settled = self._settle(backend, started, None, errors)
+                return
+            except Exception as e:
+                settled = True
+                self._settle(backend, started, e, errors)
+                if streamed:
+                    # Part of the answer has been sent; another backend would start over
+                    raise
+            finally:
+                if not settled:
+                    backend.record_abandoned()
@@ -2,21 +2,41 @@
 FastAPI Backend for RAG Chatbot
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, Query, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
 import logging
+import asyncio
+import json
 import os
+import time
 from dotenv import load_dotenv
 
 try:
     from .rag_engine import RAGEngine
-    from .document_processor import DocumentProcessor
+    from .document_processor import DEFAULT_COLLECTION, DocumentProcessor
+    from .ingest_jobs import IngestJobQueue
+    from .dedup import document_id
+    from .metrics import INGEST_STAGE_SECONDS, REGISTRY, SharedMetrics
+    from .llm_router import LLMRouter
+    from .workers import WriterLock, serve, shared_state_path, worker_count
+    from .batch_eval import parse_questions, run_batch
+    from .uploads import MAX_BULK_UPLOAD_BYTES, MAX_UPLOAD_BYTES, UploadSizeLimitMiddleware, too_large_detail
+    from .bulk_ingest import is_archive
 except ImportError:
     from rag_engine import RAGEngine
-    from document_processor import DocumentProcessor
+    from document_processor import DEFAULT_COLLECTION, DocumentProcessor
+    from ingest_jobs import IngestJobQueue
+    from dedup import document_id
+    from metrics import INGEST_STAGE_SECONDS, REGISTRY, SharedMetrics
+    from llm_router import LLMRouter
+    from workers import WriterLock, serve, shared_state_path, worker_count
+    from batch_eval import parse_questions, run_batch
+    from uploads import MAX_BULK_UPLOAD_BYTES, MAX_UPLOAD_BYTES, UploadSizeLimitMiddleware, too_large_detail
+    from bulk_ingest import is_archive
 
 # Load environment variables
 load_dotenv()
@@ -25,10 +45,55 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# With several server workers the one holding this lock writes to the
+# knowledge base; the others serve read-only replicas (see workers.py).
+# The lock and the ingest queue (which opens its job store) are taken at
+# startup, so importing this module has no side effects
+writer_lock = WriterLock(os.path.join(os.getenv("CHROMA_DB_PATH", "./chroma_db"), "writer.lock"))
+is_writer = False
+
+# Initialize components; the engine's models and vector store are loaded in
+# the background at startup so the server answers liveness checks at once
+rag_engine = RAGEngine(initialize=False)
+document_processor = DocumentProcessor()
+ingest_queue: Optional[IngestJobQueue] = None
+# Set at startup when several workers share their metrics through SQLite
+shared_metrics: Optional[SharedMetrics] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global is_writer, ingest_queue, shared_metrics
+    is_writer = writer_lock.acquire()
+    metrics_path = shared_state_path("METRICS_DB_PATH", "metrics.sqlite")
+    if metrics_path:
+        os.makedirs(os.path.dirname(os.path.abspath(metrics_path)), exist_ok=True)
+        shared_metrics = SharedMetrics(REGISTRY, metrics_path, interval=float(os.getenv("METRICS_FLUSH_SECONDS", "5")))
+    rag_engine.read_only = not is_writer
+    ingest_queue = IngestJobQueue(
+        rag_engine,
+        document_processor,
+        upload_dir=os.getenv("UPLOAD_DIR", "./data/uploads"),
+        workers=int(os.getenv("INGEST_WORKERS", "2")),
+        writer=is_writer,
+        shared=worker_count() > 1
+    )
+    startup = asyncio.create_task(asyncio.to_thread(rag_engine.initialize))
+    # Pick up uploads that were still queued or running at the last shutdown;
+    # workers wait for the engine before embedding
+    ingest_queue.resume()
+    yield
+    ingest_queue.shutdown()
+    if shared_metrics is not None:
+        shared_metrics.close()
+    writer_lock.release()
+    if not startup.done():
+        startup.cancel()
+
 app = FastAPI(
     title="RAG Chatbot API",
     description="Retrieval Augmented Generation Chatbot API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -39,39 +104,92 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Initialize components
-rag_engine = RAGEngine()
-document_processor = DocumentProcessor()
+# Oversized uploads are refused before their body is read
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/api/upload-document"], max_bytes=MAX_UPLOAD_BYTES)
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/api/bulk-ingest"], max_bytes=MAX_BULK_UPLOAD_BYTES)
 
 # Request models
 class ChatRequest(BaseModel):
     message: str
     conversation_id: Optional[str] = None
     use_rag: bool = True
+    # Restrict retrieval to a collection and/or specific documents
+    collection: Optional[str] = None
+    document_ids: Optional[List[str]] = None
+    
+    def filters(self) -> Optional[Dict[str, object]]:
+        if not self.collection and not self.document_ids:
+            return None
+        return {"collection": self.collection, "document_ids": self.document_ids or None}
+
+class BatchChatRequest(BaseModel):
+    # JSONL-style objects: {"question", "id", "use_rag", "collection", "document_ids", "expected_sources"}
+    questions: List[Dict]
+    concurrency: Optional[int] = None
 
 class ChatResponse(BaseModel):
     response: str
     sources: Optional[List[str]] = None
     conversation_id: Optional[str] = None
+    cached: bool = False
+    timings: Optional[Dict[str, float]] = None
+    usage: Optional[Dict[str, int]] = None
+
+def _require_initialized():
+    if not rag_engine.initialized:
+        raise HTTPException(status_code=503, detail="The RAG engine is still starting up. Please retry shortly.")
 
 # Routes
 @app.get("/")
 async def root():
     return {"message": "RAG Chatbot API", "status": "running"}
 
+@app.get("/health/live")
+async def liveness():
+    """The process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Engine startup has finished; 503 while models are still loading"""
+    body = {
+        "ready": rag_engine.initialized,
+        "rag_ready": rag_engine.is_ready(),
+        "startup_timings": rag_engine.startup_timings,
+        "initialization_error": rag_engine.initialization_error
+    }
+    return JSONResponse(status_code=200 if rag_engine.initialized else 503, content=body)
+
+def _batcher_stats(component) -> Optional[Dict]:
+    """Micro-batching counters of a local model, if it is batched"""
+    batcher = getattr(component, "batcher", None)
+    return batcher.stats() if batcher is not None else None
+
 @app.get("/health")
 async def health():
     status = {
         "status": "healthy",
+        "initialized": rag_engine.initialized,
+        "startup_timings": rag_engine.startup_timings,
         "rag_ready": rag_engine.is_ready(),
         "llm_configured": rag_engine.llm is not None,
-        "embeddings_configured": rag_engine.embeddings is not None
+        "llm_backends": rag_engine.llm.stats() if isinstance(rag_engine.llm, LLMRouter) else None,
+        "embeddings_configured": rag_engine.embeddings is not None,
+        "embedding_cache": rag_engine.embedding_cache.stats() if rag_engine.embedding_cache else None,
+        "answer_cache": rag_engine.answer_cache.stats() if rag_engine.answer_cache else None,
+        "reranker": rag_engine.reranker.stats() if rag_engine.reranker else None,
+        "local_batching": {
+            name: _batcher_stats(component)
+            for name, component in (("embeddings", rag_engine.embeddings), ("llm", rag_engine.llm))
+            if _batcher_stats(component)
+        } or None,
+        "worker": {"pid": os.getpid(), "role": "writer" if is_writer else "replica", "workers": worker_count()}
     }
     return status
 
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
+    _require_initialized()
     try:
         if not rag_engine.is_ready():
             return ChatResponse(
@@ -79,85 +197,237 @@ async def chat(request: ChatRequest):
                 sources=None
             )
         
-        response, sources = rag_engine.generate_response(
+        result = await rag_engine.agenerate_response(
             request.message,
             conversation_id=request.conversation_id,
-            use_rag=request.use_rag
+            use_rag=request.use_rag,
+            filters=request.filters()
         )
         
         return ChatResponse(
-            response=response,
-            sources=sources,
-            conversation_id=request.conversation_id
+            response=result.response,
+            sources=result.sources,
+            conversation_id=request.conversation_id,
+            cached=result.cached,
+            timings=result.timings,
+            usage=result.usage
         )
     except Exception as e:
         logger.error(f"Error in chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/upload-document")
-async def upload_document(file: UploadFile = File(...)):
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream the answer as server-sent events: sources, token..., done"""
+    _require_initialized()
+    
+    async def event_stream():
+        if not rag_engine.is_ready():
+            yield _sse("error", {"message": "Please configure an LLM (OpenAI or Ollama) for full RAG functionality."})
+            return
+        try:
+            async for event in rag_engine.astream_response(
+                request.message,
+                conversation_id=request.conversation_id,
+                use_rag=request.use_rag,
+                filters=request.filters()
+            ):
+                name = event.pop("event")
+                yield _sse(name, event)
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}")
+            yield _sse("error", {"message": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """Answer many questions; results stream back as NDJSON as they complete, then a summary line"""
+    _require_initialized()
+    if not rag_engine.is_ready():
+        raise HTTPException(status_code=503, detail="Please configure an LLM (OpenAI or Ollama) for full RAG functionality.")
+    max_questions = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "1000"))
+    if not request.questions or len(request.questions) > max_questions:
+        raise HTTPException(status_code=400, detail=f"A batch must have 1-{max_questions} questions")
+    try:
+        questions = parse_questions(request.questions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # A request may ask for fewer concurrent answers, never more than the server allows
+    max_concurrency = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+    concurrency = max(1, min(request.concurrency or max_concurrency, max_concurrency))
+    
+    async def results():
+        async for result in run_batch(rag_engine, questions, concurrency):
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/upload-document", status_code=202)
+async def upload_document(file: UploadFile = File(...), collection: str = Form(DEFAULT_COLLECTION)):
+    """Queue a document for ingestion; poll /api/jobs/{job_id} for progress"""
     try:
         # Validate file
         if not file.filename:
             raise HTTPException(status_code=400, detail="No filename provided")
         
-        # Check file size (limit to 50MB)
-        content = await file.read()
-        if len(content) > 50 * 1024 * 1024:  # 50MB
-            raise HTTPException(status_code=400, detail="File too large. Maximum size is 50MB")
-        
-        if len(content) == 0:
-            raise HTTPException(status_code=400, detail="File is empty")
+        collection = collection.strip()
+        if not collection or len(collection) > 64:
+            raise HTTPException(status_code=400, detail="Collection name must be 1-64 characters")
         
-        logger.info(f"Processing file: {file.filename} ({len(content)} bytes)")
-        
-        # Process document
-        try:
-            chunks = document_processor.process_file(file.filename, content)
-        except Exception as e:
-            logger.error(f"Error processing document: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"Error processing document: {str(e)}")
+        file_ext = os.path.splitext(file.filename)[1].lower()
+        if file_ext not in DocumentProcessor.SUPPORTED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Error processing document: Unsupported file type: {file_ext}")
         
-        if not chunks or len(chunks) == 0:
-            raise HTTPException(status_code=400, detail="No text could be extracted from the document")
+        # The multipart parser has spooled the file to disk; it is never read into memory whole
+        start = time.perf_counter()
+        if file.size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=400, detail=too_large_detail())
         
-        logger.info(f"Document processed into {len(chunks)} chunks")
+        if file.size == 0:
+            raise HTTPException(status_code=400, detail="File is empty")
         
-        # Add to vector store
-        if rag_engine.is_ready():
-            try:
-                rag_engine.add_documents(chunks)
-                return {
-                    "status": "success",
-                    "message": f"Document processed and added to knowledge base. {len(chunks)} chunks created.",
-                    "chunks": len(chunks)
-                }
-            except Exception as e:
-                logger.error(f"Error adding to vector store: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Error adding to vector store: {str(e)}")
-        else:
-            logger.warning("RAG engine not ready, document chunks prepared but not added to vector DB")
-            return {
-                "status": "warning",
-                "message": f"Document processed into {len(chunks)} chunks, but not added to vector DB. Please configure LLM first.",
-                "chunks": len(chunks)
-            }
+        logger.info(f"Queueing file: {file.filename} ({file.size} bytes)")
+        job_id = await asyncio.to_thread(ingest_queue.submit, file.filename, file.file, collection)
+        INGEST_STAGE_SECONDS.observe(time.perf_counter() - start, stage="upload")
+        return {
+            "status": "queued",
+            "message": f"Document queued for processing. Track progress at /api/jobs/{job_id}.",
+            "job_id": job_id,
+            "collection": collection,
+            "document_id": document_id(collection, os.path.basename(file.filename))
+        }
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error uploading document: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
 
+@app.post("/api/bulk-ingest", status_code=202)
+async def bulk_ingest(
+    file: Optional[UploadFile] = File(None),
+    directory: Optional[str] = Form(None),
+    collection: str = Form(DEFAULT_COLLECTION)
+):
+    """Queue a zip/tar archive, or a directory under BULK_INGEST_ROOT on the
+    server, for bulk ingestion; poll /api/jobs/{job_id} for per-file results"""
+    collection = collection.strip()
+    if not collection or len(collection) > 64:
+        raise HTTPException(status_code=400, detail="Collection name must be 1-64 characters")
+    if (file is None) == (directory is None):
+        raise HTTPException(status_code=400, detail="Send either an archive file or a directory")
+    
+    if directory is not None:
+        root = os.getenv("BULK_INGEST_ROOT")
+        if not root:
+            raise HTTPException(status_code=400, detail="Directory ingestion is disabled; set BULK_INGEST_ROOT")
+        root = os.path.realpath(root)
+        path = os.path.realpath(os.path.join(root, directory))
+        if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+            raise HTTPException(status_code=400, detail=f"No directory {directory} under BULK_INGEST_ROOT")
+        job_id = await asyncio.to_thread(ingest_queue.submit_bulk, directory, directory=path, collection=collection)
+        name = directory
+    else:
+        if not file.filename or not is_archive(file.filename):
+            raise HTTPException(status_code=400, detail="Bulk uploads must be .zip or .tar(.gz) archives")
+        if file.size > MAX_BULK_UPLOAD_BYTES:
+            raise HTTPException(status_code=400, detail=too_large_detail(MAX_BULK_UPLOAD_BYTES))
+        job_id = await asyncio.to_thread(ingest_queue.submit_bulk, file.filename, file.file, collection=collection)
+        name = file.filename
+    logger.info(f"Queued bulk ingest of {name} into {collection}")
+    return {
+        "status": "queued",
+        "message": f"Bulk ingestion queued. Track progress at /api/jobs/{job_id}.",
+        "job_id": job_id,
+        "collection": collection
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for the chat and ingest pipelines, of every worker when there are several"""
+    body = await asyncio.to_thread(shared_metrics.render) if shared_metrics is not None else REGISTRY.render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/documents")
+async def list_documents(
+    collection: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    """Ingested documents, most recently updated first"""
+    documents, total = await asyncio.to_thread(rag_engine.list_documents, collection, limit, offset)
+    return {"documents": documents, "total": total, "limit": limit, "offset": offset}
+
+@app.get("/api/documents/{document_id}")
+async def get_document(document_id: str):
+    document = await asyncio.to_thread(rag_engine.get_document, document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+@app.delete("/api/documents/{document_id}")
+async def delete_document(document_id: str):
+    """Remove a document and all of its chunks from the knowledge base"""
+    _require_initialized()
+    if not is_writer:
+        return await _delete_via_writer(document_id)
+    try:
+        removed = await asyncio.to_thread(rag_engine.delete_document, document_id)
+    except Exception as e:
+        logger.error(f"Error deleting document {document_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"status": "deleted", "document_id": document_id, "chunks_removed": removed}
+
+async def _delete_via_writer(document_id: str, timeout: float = 60):
+    """Queue the delete for the writer worker and wait for it to finish"""
+    job_id = ingest_queue.submit_delete(document_id)
+    deadline = time.monotonic() + timeout
+    job = ingest_queue.get(job_id)
+    while job["status"] in ("queued", "running"):
+        if time.monotonic() > deadline:
+            return JSONResponse(
+                status_code=202,
+                content={"status": "queued", "document_id": document_id, "job_id": job_id}
+            )
+        await asyncio.sleep(0.1)
+        job = ingest_queue.get(job_id)
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {job['error']}")
+    if job["chunks_total"] is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"status": "deleted", "document_id": document_id, "chunks_removed": job["chunks_total"]}
+
 @app.get("/api/knowledge-base/status")
 async def get_knowledge_base_status():
     return {
         "ready": rag_engine.is_ready(),
         "vector_store_ready": rag_engine.vector_store is not None,
-        "documents_count": len(rag_engine.vector_store.get()['ids']) if rag_engine.vector_store else 0
+        "documents_count": rag_engine.chunk_count(),
+        "vector_store": rag_engine.vector_store_stats()
     }
 
 if __name__ == "__main__":
-    import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    if worker_count() > 1:
+        # Workers import the app themselves; this process only supervises them
+        serve(port=port)
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=port)
 
@@ -0,0 +1,309 @@
+"""
+Metrics - Prometheus histograms and counters for the chat and ingest pipelines
+Kept in-process and rendered in the Prometheus text exposition format by
+GET /metrics, so no client library is needed. With several server workers
+each one's samples are shared through SQLite (SharedMetrics) so a scrape of
+any worker covers all of them
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, List[Tuple[str, str]], float]]:
+        raise NotImplementedError
+
+    def render(self, samples: Optional[Iterable[Tuple[str, Sequence[Tuple[str, str]], float]]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples() if samples is None else samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts with a final +Inf bucket, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1][0] += value
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + [("le", _format_value(bound))], cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    @property
+    def metrics(self) -> List[_Metric]:
+        return list(self._metrics)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class SharedMetrics:
+    """A registry's samples from every server worker, combined when any one is scraped
+
+    Each worker writes a snapshot of its own samples to a shared SQLite file
+    every `interval` seconds and before it renders, so a scrape is at most
+    `interval` seconds behind the other workers. Counters and histograms
+    are summed across workers, including ones that have exited so totals do
+    not drop; gauges take the highest value among workers that wrote a
+    snapshot in the last few intervals.
+    """
+
+    def __init__(self, registry: Registry, path: str, interval: float = 5.0):
+        self.registry = registry
+        self.interval = interval
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # value has no type so integer counts stay integers
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS samples ("
+            "pid INTEGER NOT NULL, metric TEXT NOT NULL, name TEXT NOT NULL, labels TEXT NOT NULL, "
+            "value, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS samples_pid ON samples (pid)")
+        self._db.commit()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def flush(self):
+        """Replace this worker's snapshot"""
+        now = time.time()
+        rows = [
+            (self.pid, metric.name, name, json.dumps(labels), value, now)
+            for metric in self.registry.metrics
+            for name, labels, value in metric.samples()
+        ]
+        with self._lock:
+            # A new worker that reuses an exited one's pid starts its counts over
+            self._db.execute("DELETE FROM samples WHERE pid = ?", (self.pid,))
+            self._db.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def render(self) -> str:
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT metric, name, labels, value, updated_at FROM samples ORDER BY pid, rowid"
+            ).fetchall()
+        gauges = {metric.name for metric in self.registry.metrics if metric.kind == "gauge"}
+        fresh = time.time() - 3 * self.interval
+        # metric -> (sample name, labels) -> value, in the order the first worker reported them
+        merged: Dict[str, Dict[Tuple[str, str], float]] = {}
+        for metric, name, labels, value, updated_at in rows:
+            series = merged.setdefault(metric, {})
+            key = (name, labels)
+            if metric in gauges:
+                if updated_at >= fresh:
+                    series[key] = max(series.get(key, value), value)
+            else:
+                series[key] = series.get(key, 0) + value
+        lines: List[str] = []
+        for metric in self.registry.metrics:
+            samples = merged.get(metric.name, {})
+            lines.extend(metric.render((name, json.loads(labels), value) for (name, labels), value in samples.items()))
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.flush()
+        finally:
+            self._db.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Writing shared metrics failed: {e}")
+
+
+REGISTRY = Registry()
+
+CHAT_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_chat_stage_seconds",
+    "Time spent per chat pipeline stage (embed, retrieve, rerank, context, prompt, llm, ttft, total)",
+    labelnames=("stage",)
+))
+CHAT_TOKENS = REGISTRY.register(Histogram(
+    "rag_chat_tokens",
+    "Prompt and completion tokens per chat request",
+    labelnames=("kind",),
+    buckets=TOKEN_BUCKETS
+))
+CHAT_REQUESTS = REGISTRY.register(Counter(
+    "rag_chat_requests_total",
+    "Chat requests by outcome (ok, cached, error)",
+    labelnames=("outcome",)
+))
+LLM_SECONDS = REGISTRY.register(Histogram(
+    "rag_llm_backend_seconds",
+    "Latency of successful LLM calls per routed backend",
+    labelnames=("backend",)
+))
+LLM_REQUESTS = REGISTRY.register(Counter(
+    "rag_llm_backend_requests_total",
+    "Routed LLM calls by backend and outcome (ok, error, timeout, cancelled)",
+    labelnames=("backend", "outcome")
+))
+LLM_HEDGES = REGISTRY.register(Counter(
+    "rag_llm_hedged_requests_total",
+    "Hedged duplicate LLM calls by the backend they were sent to",
+    labelnames=("backend",)
+))
+LLM_CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    "rag_llm_circuit_open",
+    "1 while a routed LLM backend's circuit breaker is open",
+    labelnames=("backend",)
+))
+INGEST_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_ingest_stage_seconds",
+    "Time spent per ingest stage (upload, parse, chunk, embed, write, total)",
+    labelnames=("stage",)
+))
+INGEST_CHUNKS = REGISTRY.register(Counter(
+    "rag_ingest_chunks_total",
+    "Chunks seen by ingest jobs by outcome (added, skipped, removed)",
+    labelnames=("outcome",)
+))
+INGEST_JOBS = REGISTRY.register(Counter(
+    "rag_ingest_jobs_total",
+    "Finished ingest jobs by status (done, failed)",
+    labelnames=("status",)
+))
+
+
+def _observe_stages(histogram: Histogram, timings: Dict[str, float]):
+    # Timings are reported in milliseconds ("embed_ms"); Prometheus wants seconds
+    for name, value in timings.items():
+        if name.endswith("_ms") and value is not None:
+            histogram.observe(value / 1000, stage=name[:-3])
+
+
+def observe_chat(timings: Optional[Dict[str, float]], usage: Optional[Dict[str, int]], outcome: str):
+    _observe_stages(CHAT_STAGE_SECONDS, timings or {})
+    for name, value in (usage or {}).items():
+        CHAT_TOKENS.observe(value, kind=name.replace("_tokens", ""))
+    CHAT_REQUESTS.inc(outcome=outcome)
+
+
+def observe_ingest(timings: Optional[Dict[str, float]], counts: Optional[Dict[str, int]], status: str):
+    _observe_stages(INGEST_STAGE_SECONDS, timings or {})
+    for outcome, count in (counts or {}).items():
+        INGEST_CHUNKS.inc(count, outcome=outcome)
+    INGEST_JOBS.inc(status=status)
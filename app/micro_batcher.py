@@ -0,0 +1,219 @@
+"""
+Micro Batcher - Dynamic request batching in front of local models
+Concurrent single-item calls are collected for up to a few milliseconds (or
+until a batch is full) and run as one batched forward pass on a dedicated
+thread, so a CPU model serves many waiting callers at close to the cost of
+one call instead of running one forward pass per caller
+"""
+
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM, BaseLLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Batch `submit(item)` calls into `fn(items) -> results` calls
+
+    A batch takes every item already waiting, then keeps collecting for up
+    to `max_wait_ms` or until it has `max_batch_size` items. The window is
+    only waited out while calls are concurrent (the previous batch had more
+    than one item), so a lone caller is not delayed, and it closes early
+    once the batch is as large as the previous one. `fn` only ever runs on
+    the batcher's thread, so the model behind it needs no locking.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], Sequence[Any]], max_batch_size: int = 16, max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self._last_batch_size = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def map(self, items: Sequence[Any]) -> List[Any]:
+        """Results for several items, batched with other callers' items"""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    async def asubmit(self, item: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(item))
+
+    async def amap(self, items: Sequence[Any]) -> List[Any]:
+        return list(await asyncio.gather(*(asyncio.wrap_future(self.submit(item)) for item in items)))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0
+        }
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + (self.max_wait if self._last_batch_size > 1 else 0.0)
+        while len(batch) < self.max_batch_size:
+            try:
+                # Whatever is already queued joins at once; then wait out the window
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                # Stop early once as many callers as last time have joined
+                if remaining <= 0 or len(batch) >= self._last_batch_size:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if entry is None:
+                # Closing: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            self._last_batch_size = len(batch)
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = list(self.fn([item for item, _ in batch]))
+                if len(results) != len(batch):
+                    raise ValueError(f"Batched call returned {len(results)} results for {len(batch)} items")
+            except BaseException as e:
+                logger.warning(f"Batched call of {len(batch)} items failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+class BatchedEmbeddings(Embeddings):
+    """Local embeddings whose calls from concurrent requests share forward passes"""
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embeddings = embeddings
+        self.batcher = MicroBatcher(embeddings.embed_documents, max_batch_size, max_wait_ms, name="embedding-batcher")
+
+    def __getattr__(self, name):
+        # Expose the wrapped model's attributes (model_name, client, ...) unchanged
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.batcher.map(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit(text).result()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.batcher.amap(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.batcher.asubmit(text)
+
+
+class BatchedLLM(LLM):
+    """Local LLM whose prompts from concurrent requests are generated as one batch
+
+    Prompts are passed together to the wrapped LLM's `generate`, which a
+    HuggingFacePipeline runs as batched forward passes. Calls with stop
+    words or other options also run on the batcher's thread, each on its
+    own; streams hold the model while they run, so it never runs twice at once.
+    """
+
+    llm: Any
+    max_batch_size: int = 8
+    max_wait_ms: float = 5.0
+    _batcher: Optional[MicroBatcher] = PrivateAttr(default=None)
+    _model_lock: Optional[threading.Lock] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        self._model_lock = threading.Lock()
+        self._batcher = MicroBatcher(self._generate_batch, self.max_batch_size, self.max_wait_ms, name="llm-batcher")
+
+    @property
+    def _llm_type(self) -> str:
+        return f"batched-{self.llm._llm_type}"
+
+    @property
+    def pipeline(self):
+        # Lets the context builder find the local model's tokenizer
+        return getattr(self.llm, "pipeline", None)
+
+    @property
+    def batcher(self) -> MicroBatcher:
+        return self._batcher
+
+    def _generate_batch(self, requests: List[Tuple[str, Optional[List[str]], Dict[str, Any]]]) -> List[Any]:
+        """Answers for (prompt, stop, options) requests; a request's own error is returned as its answer
+
+        Plain prompts share one `generate` call; the others run one by one.
+        """
+        results: List[Any] = [None] * len(requests)
+        plain = [i for i, (_, stop, kwargs) in enumerate(requests) if not stop and not kwargs]
+        with self._model_lock:
+            if plain:
+                generations = self.llm.generate([requests[i][0] for i in plain]).generations
+                for i, generation in zip(plain, generations):
+                    results[i] = generation[0].text
+            for i, (prompt, stop, kwargs) in enumerate(requests):
+                if stop or kwargs:
+                    try:
+                        results[i] = self.llm.invoke(prompt, stop=stop, **kwargs)
+                    except Exception as e:
+                        results[i] = e
+        return results
+
+    @staticmethod
+    def _answer(result: Any) -> str:
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return self._answer(self._batcher.submit((prompt, stop, kwargs)).result())
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return self._answer(await self._batcher.asubmit((prompt, stop, kwargs)))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        if type(self.llm)._stream is BaseLLM._stream:
+            # The wrapped LLM cannot stream: answer in one chunk
+            yield GenerationChunk(text=self._call(prompt, stop, run_manager, **kwargs))
+            return
+        # Batches wait while the stream has the model
+        with self._model_lock:
+            yield from self.llm._stream(prompt, stop=stop, run_manager=run_manager, **kwargs)
@@ -4,23 +4,151 @@ Handles embeddings, vector search, and LLM interaction
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import List, Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
 from dotenv import load_dotenv
 
+try:
+    from .dedup import SimHashIndex, chunk_id, simhash
+    from .ingest_pipeline import EmbeddingPipeline
+    from .conversation_store import ConversationStore
+    from .bm25_index import BM25Index, reciprocal_rank_fusion
+    from .document_registry import DocumentRegistry
+    from .metrics import observe_chat
+    from .tokens import count_tokens
+    from .context_builder import ContextBuilder, model_context_limit, token_counter
+    from .llm_router import Backend, LLMRouter, llm_input
+    from .micro_batcher import BatchedEmbeddings, BatchedLLM
+    from .workers import shared_state_path, worker_count
+except ImportError:
+    from dedup import SimHashIndex, chunk_id, simhash
+    from ingest_pipeline import EmbeddingPipeline
+    from conversation_store import ConversationStore
+    from bm25_index import BM25Index, reciprocal_rank_fusion
+    from document_registry import DocumentRegistry
+    from metrics import observe_chat
+    from tokens import count_tokens
+    from context_builder import ContextBuilder, model_context_limit, token_counter
+    from llm_router import Backend, LLMRouter, llm_input
+    from micro_batcher import BatchedEmbeddings, BatchedLLM
+    from workers import shared_state_path, worker_count
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class ChatResult:
+    response: str
+    sources: Optional[List[str]] = None
+    cached: bool = False
+    error: bool = False
+    timings: Optional[Dict[str, float]] = None
+    usage: Optional[Dict[str, int]] = None
+    
+    def __iter__(self):
+        # Unpacks as (response, sources) like the original tuple return
+        return iter((self.response, self.sources))
+
 class RAGEngine:
-    def __init__(self):
-        self.embeddings = None
-        self.llm = None
-        self.vector_store = None
-        self.conversation_memory = {}
+    def __init__(self, embeddings=None, llm=None, vector_store=None, reranker=None, initialize: bool = True, read_only: bool = False):
+        # Components can be injected (e.g. local fakes for benchmarks);
+        # anything not provided is initialized from the environment.
+        # With initialize=False the caller runs initialize() later (e.g. in
+        # the background at server startup).
+        # With read_only=True (server workers other than the writer) the
+        # stores are opened as replicas and ingest and deletes are refused.
+        self.read_only = read_only
+        self.embeddings = embeddings
+        self.llm = llm
+        self.vector_store = vector_store
+        self.reranker = reranker
+        # chroma, or memmap for the built-in NumPy index (see vector_index.py)
+        self.vector_store_backend = os.getenv("VECTOR_STORE", "chroma").lower()
+        # Created by initialize(), so constructing an engine touches no files
+        self.conversation_memory = None
+        self.history_prompt_tokens = int(os.getenv("CONVERSATION_PROMPT_TOKENS", "1000"))
+        self.answer_cache = None
+        self.near_duplicates = None
+        self.documents = None
+        # vector, bm25 or hybrid (vector and BM25 results fused by reciprocal rank)
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+        # Ranked chunks offered to the context builder, which packs what fits the token budget
+        self.retrieval_k = int(os.getenv("RETRIEVAL_K", "8"))
+        self.context_builder = None
+        self.retrieval_candidates = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+        self.keyword_index = None
+        self.rerank_candidates = int(os.getenv("RERANK_CANDIDATES", "30"))
+        self.max_concurrent_requests = int(os.getenv("MAX_CONCURRENT_REQUESTS", "16"))
+        self.embedding_concurrency = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+        self.embedding_batch_tokens = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8000"))
+        self._request_semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self.embedding_cache = None
+        self.startup_timings: Dict[str, float] = {}
+        self.initialization_error: Optional[str] = None
+        self._initialized = threading.Event()
+        if initialize:
+            self.initialize()
+    
+    def initialize(self):
+        """Initialize embeddings, LLM and vector store concurrently
+        
+        The LLM and embeddings initializers (which may download and load
+        local models) run in parallel with opening the Chroma client; the
+        vector store is bound to the embeddings once both are done.
+        Per-component wall times are recorded in `startup_timings`.
+        """
+        if self._initialized.is_set():
+            return
+        start = time.perf_counter()
+        
+        def timed(name, fn, *args):
+            stage_start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.startup_timings[name] = round(time.perf_counter() - stage_start, 3)
+        
+        try:
+            self.conversation_memory = self._create_conversation_store()
+            with ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-init") as pool:
+                embeddings_done = pool.submit(timed, "embeddings", self._initialize_embeddings_with_cache) if self.embeddings is None else None
+                llm_done = pool.submit(timed, "llm", self._initialize_llm) if self.llm is None else None
+                client_done = pool.submit(timed, "vector_store_client", self._open_chroma_client) if self.vector_store is None and self.vector_store_backend == "chroma" else None
+                reranker_done = pool.submit(timed, "reranker", self._initialize_reranker) if self.reranker is None else None
+                for future in (embeddings_done, llm_done, reranker_done):
+                    if future:
+                        future.result()
+                if self.vector_store is None:
+                    timed("vector_store", self._initialize_vector_store, client_done.result() if client_done else None)
+            timed("keyword_index", self._initialize_keyword_index)
+            self._initialize_context_builder()
+            self._initialize_document_registry()
+            self._initialize_answer_cache()
+            self._initialize_near_duplicate_index()
+        except Exception as e:
+            self.initialization_error = str(e)
+            logger.error(f"Error initializing RAG engine: {e}")
+        finally:
+            self.startup_timings["total"] = round(time.perf_counter() - start, 3)
+            self._initialized.set()
+            logger.info(f"RAG engine initialized in {self.startup_timings['total']:.2f}s: {self.startup_timings}")
+    
+    @property
+    def initialized(self) -> bool:
+        return self._initialized.is_set()
+    
+    def wait_until_initialized(self, timeout: Optional[float] = None) -> bool:
+        return self._initialized.wait(timeout)
+    
+    def _initialize_embeddings_with_cache(self):
         self._initialize_embeddings()
-        self._initialize_llm()
-        self._initialize_vector_store()
+        self._initialize_embedding_cache()
     
     def _initialize_embeddings(self):
         """Initialize embeddings model"""
@@ -49,116 +177,165 @@ class RAGEngine:
                 model_name="sentence-transformers/all-MiniLM-L6-v2"
             )
             logger.info("Using HuggingFace embeddings")
+            batch_size = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+            if batch_size > 1:
+                # Concurrent queries share forward passes of the local model
+                self.embeddings = BatchedEmbeddings(self.embeddings, batch_size, float(os.getenv("LOCAL_BATCH_WAIT_MS", "5")))
         except Exception as e:
             logger.error(f"Error initializing embeddings: {e}")
     
+    def _initialize_embedding_cache(self):
+        """Wrap the embeddings model in a content-addressed cache"""
+        if not self.embeddings or os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() != "true":
+            return
+        try:
+            from .embedding_cache import CachedEmbeddings
+        except ImportError:
+            from embedding_cache import CachedEmbeddings
+        try:
+            persist_directory = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+            os.makedirs(persist_directory, exist_ok=True)
+            cache_path = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(persist_directory, "embedding_cache.sqlite"))
+            self.embedding_cache = CachedEmbeddings(
+                self.embeddings,
+                path=cache_path,
+                memory_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+            )
+            self.embeddings = self.embedding_cache
+            logger.info(f"Embedding cache enabled: {cache_path}")
+        except Exception as e:
+            logger.warning(f"Embedding cache disabled: {e}")
+    
+    @staticmethod
+    def _create_conversation_store():
+        """Bounded conversation memory, persisted to SQLite when CONVERSATION_DB_PATH is set or several workers share it"""
+        db_path = shared_state_path("CONVERSATION_DB_PATH", "conversations.sqlite")
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        return ConversationStore(
+            max_conversations=int(os.getenv("CONVERSATION_MAX", "1000")),
+            ttl=float(os.getenv("CONVERSATION_TTL", "86400")),
+            max_tokens=int(os.getenv("CONVERSATION_MAX_TOKENS", "4000")),
+            db_path=db_path
+        )
+    
+    def _initialize_answer_cache(self):
+        """Enable the semantic answer cache (opt-in)"""
+        if os.getenv("ANSWER_CACHE_ENABLED", "false").lower() != "true":
+            return
+        try:
+            from .answer_cache import SemanticAnswerCache
+        except ImportError:
+            from answer_cache import SemanticAnswerCache
+        db_path = shared_state_path("ANSWER_CACHE_PATH", "answer_cache.sqlite")
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.answer_cache = SemanticAnswerCache(
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+            max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+            db_path=db_path
+        )
+        logger.info(f"Semantic answer cache enabled{f' (shared: {db_path})' if db_path else ''}")
+    
+    def _initialize_near_duplicate_index(self):
+        """Enable SimHash near-duplicate detection at ingest (opt-in)"""
+        if self.read_only or os.getenv("NEAR_DUPLICATE_DETECTION", "false").lower() != "true":
+            return
+        try:
+            persist_directory = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+            os.makedirs(persist_directory, exist_ok=True)
+            self.near_duplicates = SimHashIndex(
+                os.path.join(persist_directory, "near_duplicates.sqlite"),
+                max_distance=int(os.getenv("NEAR_DUPLICATE_DISTANCE", "3"))
+            )
+            logger.info("Near-duplicate detection enabled")
+        except Exception as e:
+            logger.warning(f"Near-duplicate detection disabled: {e}")
+    
+    def _initialize_keyword_index(self):
+        """Load the BM25 index, backfilling it from the vector store if it is behind"""
+        if self.retrieval_mode == "vector" or self.vector_store is None:
+            return
+        try:
+            persist_directory = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+            os.makedirs(persist_directory, exist_ok=True)
+            self.keyword_index = BM25Index(os.path.join(persist_directory, "bm25.sqlite"), read_only=self.read_only)
+            collection = getattr(self.vector_store, '_collection', None)
+            if not self.read_only and collection is not None and collection.count() > len(self.keyword_index):
+                # Chunks ingested before the index existed (or while RETRIEVAL_MODE=vector)
+                offset, page_size = 0, 5000
+                while True:
+                    page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+                    if not page['ids']:
+                        break
+                    self.keyword_index.add(page['ids'], page['documents'], page['metadatas'])
+                    offset += page_size
+                logger.info(f"Backfilled BM25 index to {len(self.keyword_index)} chunks")
+            logger.info(f"Retrieval mode: {self.retrieval_mode}")
+        except Exception as e:
+            self.keyword_index = None
+            logger.warning(f"BM25 index disabled, using vector search only: {e}")
+    
+    def _initialize_document_registry(self):
+        """Open the document -> chunk id table used to replace and delete documents"""
+        try:
+            persist_directory = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+            os.makedirs(persist_directory, exist_ok=True)
+            self.documents = DocumentRegistry(os.path.join(persist_directory, "documents.sqlite"))
+        except Exception as e:
+            logger.warning(f"Document registry disabled, documents cannot be listed or deleted: {e}")
+    
+    def _initialize_context_builder(self):
+        """Budget retrieved context in the LLM's own tokens"""
+        # A router counts with its first backend's tokenizer
+        llm = self.llm.primary if isinstance(self.llm, LLMRouter) else self.llm
+        budget = os.getenv("CONTEXT_TOKEN_BUDGET")
+        if budget:
+            budget = int(budget)
+        else:
+            # Leave room for the question, history and answer in small local models
+            limit = model_context_limit(llm)
+            budget = min(800, limit // 2) if limit else 800
+        self.context_builder = ContextBuilder(budget_tokens=budget, count=token_counter(llm))
+        logger.info(f"Context budget: {budget} tokens")
+    
+    def _initialize_reranker(self):
+        """Load the cross-encoder rerank stage (opt-in)"""
+        if os.getenv("RERANK_ENABLED", "false").lower() != "true":
+            return
+        try:
+            from .reranker import Reranker, load_cross_encoder
+        except ImportError:
+            from reranker import Reranker, load_cross_encoder
+        try:
+            self.reranker = Reranker(
+                load_cross_encoder(os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")),
+                batch_size=int(os.getenv("RERANK_BATCH_SIZE", "16")),
+                budget_ms=float(os.getenv("RERANK_BUDGET_MS", "250"))
+            )
+        except Exception as e:
+            logger.warning(f"Reranking disabled: {e}")
+    
     def _initialize_llm(self):
-        """Initialize LLM (OpenAI, HuggingFace, or Ollama)"""
+        """Initialize LLM (OpenAI, HuggingFace, or Ollama)
+        
+        With LLM_BACKENDS set (e.g. "openai,ollama") every listed provider is
+        created and calls are routed across them with failover, circuit
+        breakers and optional hedging (see llm_router.py). Otherwise the first
+        provider that initializes is used.
+        """
         try:
-            # Try OpenAI first (if API key is provided)
-            try:
-                from langchain_openai import ChatOpenAI
-                api_key = os.getenv("OPENAI_API_KEY")
-                model_name = os.getenv("MODEL_NAME", "gpt-3.5-turbo")
-                if api_key and api_key.strip() and not api_key.startswith("your_"):
-                    # Try newer API first (model parameter)
-                    try:
-                        self.llm = ChatOpenAI(
-                            model=model_name,
-                            api_key=api_key,
-                            temperature=0.7,
-                            timeout=90,
-                            max_retries=2
-                        )
-                    except TypeError:
-                        # Fallback to older API (model_name and openai_api_key)
-                        self.llm = ChatOpenAI(
-                            model_name=model_name,
-                            openai_api_key=api_key,
-                            temperature=0.7,
-                            timeout=90,
-                            max_retries=2
-                        )
-                    logger.info(f"Using OpenAI ChatOpenAI: {model_name}")
-                    return
-                else:
-                    logger.info("OpenAI API key not provided or invalid, using free LLM")
-            except ImportError:
-                logger.info("langchain-openai not available, using free LLM")
-            except Exception as e:
-                logger.warning(f"OpenAI initialization failed: {e}, using free LLM")
-            
-            # Try HuggingFace Inference API (free tier available)
-            try:
-                from langchain_community.llms import HuggingFacePipeline, HuggingFaceEndpoint
-                
-                # Try HuggingFace Inference API first (free tier)
-                hf_token = os.getenv("HUGGINGFACE_API_TOKEN")
-                if hf_token:
-                    try:
-                        # Use a free model from HuggingFace
-                        model_id = os.getenv("HUGGINGFACE_MODEL", "google/flan-t5-base")
-                        self.llm = HuggingFaceEndpoint(
-                            repo_id=model_id,
-                            huggingfacehub_api_token=hf_token,
-                            temperature=0.7,
-                            max_length=512
-                        )
-                        logger.info(f"Using HuggingFace Inference API: {model_id}")
-                        return
-                    except Exception as e:
-                        logger.warning(f"HuggingFace Inference API failed: {e}")
-                
-                # Fallback to local HuggingFace pipeline (completely free, no API needed)
-                try:
-                    from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
-                    import torch
-                    
-                    # Use a smaller, faster model for local inference
-                    model_name = os.getenv("LOCAL_MODEL", "microsoft/DialoGPT-small")
-                    logger.info(f"Loading local HuggingFace model: {model_name} (this may take a moment...)")
-                    
-                    # Load model (this will download on first run)
-                    tokenizer = AutoTokenizer.from_pretrained(model_name)
-                    model = AutoModelForCausalLM.from_pretrained(model_name)
-                    
-                    pipe = pipeline(
-                        "text-generation",
-                        model=model,
-                        tokenizer=tokenizer,
-                        max_length=512,
-                        temperature=0.7,
-                        device_map="auto" if torch.cuda.is_available() else None
-                    )
-                    
-                    self.llm = HuggingFacePipeline(pipeline=pipe)
-                    logger.info(f"Using local HuggingFace model: {model_name}")
-                    return
-                except ImportError:
-                    logger.info("transformers not installed, trying Ollama...")
-                except Exception as e:
-                    logger.warning(f"Local HuggingFace model failed: {e}, trying Ollama...")
-            except ImportError:
-                logger.info("HuggingFace not available, trying Ollama...")
+            names = [name.strip().lower() for name in os.getenv("LLM_BACKENDS", "").split(",") if name.strip()]
+            if names:
+                self.llm = self._create_llm_router(names)
+                return
             
-            # Fallback to Ollama (requires local installation)
-            try:
-                try:
-                    from langchain_ollama import OllamaLLM
-                    ollama_model = os.getenv("OLLAMA_MODEL", "llama2")
-                    self.llm = OllamaLLM(model=ollama_model)
-                    logger.info(f"Using Ollama (local) via langchain-ollama: {ollama_model}")
-                    return
-                except ImportError:
-                    from langchain_community.llms import Ollama
-                    ollama_model = os.getenv("OLLAMA_MODEL", "llama2")
-                    self.llm = Ollama(model=ollama_model)
-                    logger.info(f"Using Ollama (local) via langchain-community: {ollama_model}")
+            for name in ("openai", "huggingface", "local", "ollama"):
+                llm = self._create_llm(name)
+                if llm is not None:
+                    self.llm = llm
                     return
-            except ImportError:
-                logger.warning("Ollama not available. Install: pip install langchain-community ollama")
-            except Exception as e:
-                logger.warning(f"Ollama initialization failed: {e}")
             
             # If all else fails, use a simple text completion fallback
             logger.warning("No LLM could be initialized. Please install one of: transformers, ollama, or provide OpenAI API key")
@@ -166,20 +343,206 @@ class RAGEngine:
         except Exception as e:
             logger.error(f"Error initializing LLM: {e}")
     
-    def _initialize_vector_store(self):
-        """Initialize Chroma vector store"""
+    def _create_llm_router(self, names: List[str]):
+        timeout = float(os.getenv("LLM_TIMEOUT", "60"))
+        failure_threshold = int(os.getenv("LLM_FAILURE_THRESHOLD", "3"))
+        cooldown = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+        backends = []
+        for name in names:
+            # The router fails over to the next backend instead of retrying
+            llm = self._create_llm(name, max_retries=0)
+            if llm is not None:
+                backends.append(Backend(name, llm, timeout=timeout, failure_threshold=failure_threshold, cooldown=cooldown))
+        if not backends:
+            logger.warning(f"None of the LLM backends {names} could be initialized")
+            return None
+        logger.info(f"Routing LLM calls across: {', '.join(backend.name for backend in backends)}")
+        return LLMRouter(backends, hedge=os.getenv("LLM_HEDGE", "false").lower() == "true")
+    
+    def _create_llm(self, name: str, max_retries: int = 2):
+        """Create one LLM provider: openai, huggingface (Inference API), local or ollama"""
+        factories = {
+            "openai": lambda: self._create_openai_llm(max_retries),
+            "huggingface": self._create_huggingface_endpoint_llm,
+            "local": self._create_local_llm,
+            "ollama": self._create_ollama_llm
+        }
+        if name not in factories:
+            logger.warning(f"Unknown LLM backend {name!r} (expected one of: {', '.join(factories)})")
+            return None
+        return factories[name]()
+    
+    @staticmethod
+    def _create_openai_llm(max_retries: int = 2):
         try:
-            import chromadb
-            # Try newest import path first (langchain-chroma)
+            from langchain_openai import ChatOpenAI
+            api_key = os.getenv("OPENAI_API_KEY")
+            model_name = os.getenv("MODEL_NAME", "gpt-3.5-turbo")
+            if not api_key or not api_key.strip() or api_key.startswith("your_"):
+                logger.info("OpenAI API key not provided or invalid, using free LLM")
+                return None
+            # Try newer API first (model parameter)
             try:
-                from langchain_chroma import Chroma
+                llm = ChatOpenAI(
+                    model=model_name,
+                    api_key=api_key,
+                    temperature=0.7,
+                    timeout=90,
+                    max_retries=max_retries
+                )
+            except TypeError:
+                # Fallback to older API (model_name and openai_api_key)
+                llm = ChatOpenAI(
+                    model_name=model_name,
+                    openai_api_key=api_key,
+                    temperature=0.7,
+                    timeout=90,
+                    max_retries=max_retries
+                )
+            logger.info(f"Using OpenAI ChatOpenAI: {model_name}")
+            return llm
+        except ImportError:
+            logger.info("langchain-openai not available, using free LLM")
+        except Exception as e:
+            logger.warning(f"OpenAI initialization failed: {e}, using free LLM")
+        return None
+    
+    @staticmethod
+    def _create_huggingface_endpoint_llm():
+        # HuggingFace Inference API (free tier available)
+        hf_token = os.getenv("HUGGINGFACE_API_TOKEN")
+        if not hf_token:
+            return None
+        try:
+            from langchain_community.llms import HuggingFaceEndpoint
+            # Use a free model from HuggingFace
+            model_id = os.getenv("HUGGINGFACE_MODEL", "google/flan-t5-base")
+            llm = HuggingFaceEndpoint(
+                repo_id=model_id,
+                huggingfacehub_api_token=hf_token,
+                temperature=0.7,
+                max_length=512
+            )
+            logger.info(f"Using HuggingFace Inference API: {model_id}")
+            return llm
+        except ImportError:
+            logger.info("HuggingFace not available, trying a local model...")
+        except Exception as e:
+            logger.warning(f"HuggingFace Inference API failed: {e}")
+        return None
+    
+    @staticmethod
+    def _create_local_llm():
+        # Local HuggingFace pipeline (completely free, no API needed)
+        batch_size = int(os.getenv("LOCAL_BATCH_SIZE", "8"))
+        try:
+            from langchain_community.llms import HuggingFacePipeline
+            from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
+            import torch
+            
+            # Use a smaller, faster model for local inference
+            model_name = os.getenv("LOCAL_MODEL", "microsoft/DialoGPT-small")
+            logger.info(f"Loading local HuggingFace model: {model_name} (this may take a moment...)")
+            
+            # Load model (this will download on first run)
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModelForCausalLM.from_pretrained(model_name)
+            # Batched generation pads prompts on the left, where a causal model ignores it
+            tokenizer.padding_side = "left"
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            
+            pipe = pipeline(
+                "text-generation",
+                model=model,
+                tokenizer=tokenizer,
+                max_length=512,
+                temperature=0.7,
+                device_map="auto" if torch.cuda.is_available() else None
+            )
+            
+            llm = HuggingFacePipeline(pipeline=pipe, batch_size=batch_size)
+            logger.info(f"Using local HuggingFace model: {model_name}")
+            if batch_size > 1:
+                # Prompts of concurrent chats are generated in one batch
+                llm = BatchedLLM(llm=llm, max_batch_size=batch_size, max_wait_ms=float(os.getenv("LOCAL_BATCH_WAIT_MS", "5")))
+            return llm
+        except ImportError:
+            logger.info("transformers not installed, trying Ollama...")
+        except Exception as e:
+            logger.warning(f"Local HuggingFace model failed: {e}, trying Ollama...")
+        return None
+    
+    @staticmethod
+    def _create_ollama_llm():
+        # Ollama (requires local installation)
+        ollama_model = os.getenv("OLLAMA_MODEL", "llama2")
+        try:
+            try:
+                from langchain_ollama import OllamaLLM
+                llm = OllamaLLM(model=ollama_model)
+                logger.info(f"Using Ollama (local) via langchain-ollama: {ollama_model}")
+                return llm
             except ImportError:
-                # Try newer import path (langchain-community)
-                try:
-                    from langchain_community.vectorstores import Chroma
-                except ImportError:
-                    # Fallback to older import path
-                    from langchain.vectorstores import Chroma
+                from langchain_community.llms import Ollama
+                llm = Ollama(model=ollama_model)
+                logger.info(f"Using Ollama (local) via langchain-community: {ollama_model}")
+                return llm
+        except ImportError:
+            logger.warning("Ollama not available. Install: pip install langchain-community ollama")
+        except Exception as e:
+            logger.warning(f"Ollama initialization failed: {e}")
+        return None
+    
+    @staticmethod
+    def _chroma_class():
+        # Try newest import path first (langchain-chroma)
+        try:
+            from langchain_chroma import Chroma
+        except ImportError:
+            # Try newer import path (langchain-community)
+            try:
+                from langchain_community.vectorstores import Chroma
+            except ImportError:
+                # Fallback to older import path
+                from langchain.vectorstores import Chroma
+        return Chroma
+    
+    def _open_chroma_client(self):
+        """Import chromadb and open the client (independent of embeddings)
+        
+        With CHROMA_SERVER_HOST set, connects to a Chroma server that every
+        server worker shares; otherwise opens the persistent client in-process.
+        """
+        try:
+            import chromadb
+            self._chroma_class()
+            host = os.getenv("CHROMA_SERVER_HOST")
+            if host:
+                port = int(os.getenv("CHROMA_SERVER_PORT", "8001"))
+                logger.info(f"Connecting to Chroma server at {host}:{port}")
+                return chromadb.HttpClient(host=host, port=port)
+            if worker_count() > 1:
+                logger.warning(
+                    "Several workers are opening the Chroma database in-process; set CHROMA_SERVER_HOST "
+                    "(or start the server with `python -m app.main`) or use VECTOR_STORE=memmap"
+                )
+            persist_directory = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+            os.makedirs(persist_directory, exist_ok=True)
+            return chromadb.PersistentClient(path=persist_directory)
+        except ImportError:
+            logger.warning("ChromaDB not available. Install: pip install chromadb")
+        except Exception as e:
+            logger.error(f"Error opening Chroma client: {e}")
+        return None
+    
+    def _initialize_vector_store(self, client=None):
+        """Initialize the configured vector store backend"""
+        if self.vector_store_backend == "memmap":
+            self._initialize_memmap_store()
+            return
+        try:
+            Chroma = self._chroma_class()
             
             # Initialize Chroma
             persist_directory = os.getenv("CHROMA_DB_PATH", "./chroma_db")
@@ -187,6 +550,7 @@ class RAGEngine:
             
             if self.embeddings:
                 self.vector_store = Chroma(
+                    client=client,
                     persist_directory=persist_directory,
                     embedding_function=self.embeddings
                 )
@@ -196,100 +560,429 @@ class RAGEngine:
         except Exception as e:
             logger.error(f"Error initializing vector store: {e}")
     
+    def _initialize_memmap_store(self):
+        """Initialize the built-in memory-mapped NumPy vector index"""
+        try:
+            from .vector_index import MemmapVectorStore
+        except ImportError:
+            from vector_index import MemmapVectorStore
+        if not self.embeddings:
+            return
+        try:
+            persist_directory = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+            self.vector_store = MemmapVectorStore(
+                os.getenv("VECTOR_INDEX_PATH", os.path.join(persist_directory, "vector_index")),
+                self.embeddings,
+                dtype=os.getenv("VECTOR_INDEX_DTYPE", "float32"),
+                ivf_lists=int(os.getenv("VECTOR_INDEX_IVF_LISTS", "0")),
+                nprobe=int(os.getenv("VECTOR_INDEX_NPROBE", "8")),
+                read_only=self.read_only
+            )
+            logger.info(f"Memory-mapped vector index initialized: {self.vector_store.stats()}")
+        except Exception as e:
+            logger.error(f"Error initializing vector index: {e}")
+    
     def is_ready(self) -> bool:
         """Check if RAG engine is ready"""
         return self.llm is not None and self.embeddings is not None and self.vector_store is not None
     
-    def add_documents(self, chunks: List[str], batch_size: int = 50):
-        """Add documents to vector store"""
-        if not self.vector_store:
+    def add_documents(self, chunks: Iterable[Union[str, Any]], batch_size: int = 50, progress_callback: Optional[Callable[[int, Optional[int]], None]] = None, timings: Optional[Dict[str, float]] = None, content_hashes: Optional[Dict[str, str]] = None, on_document: Optional[Callable[[str], None]] = None, on_embedding_started: Optional[Callable[[], None]] = None) -> Dict[str, int]:
+        """Add documents to vector store, skipping chunks that are already stored
+        
+        `chunks` are plain strings or ChunkRecords (text plus citation
+        metadata). Each chunk gets a deterministic content-hash id, scoped to
+        its document for records, so re-uploading a document embeds only the
+        chunks whose text changed; chunks the new version no longer has are
+        deleted. `chunks` may be a generator (e.g. DocumentProcessor.iter_records);
+        new chunks are embedded concurrently in token-sized batches while
+        earlier batches are written to the store.
+        Returns counts of added, skipped and removed chunks; `repeated` counts
+        the skipped chunks that duplicate an earlier chunk of the same call
+        rather than an indexed one.
+        Each document is registered (and its stale chunks deleted) as soon as
+        its last chunk is stored, so the chunks of one document should be
+        consecutive; `on_document(document_id)` is then called, possibly from
+        the writer thread. If ingestion fails partway, registered documents
+        stay; chunks stored for the others are deleted again, so their
+        previously indexed versions stay as they were.
+        `progress_callback(chunks_done, chunks_total)` is called as batches are
+        stored; the total is None when `chunks` has no length.
+        If `timings` is given, time spent in embedding calls (embed_ms, summed
+        across workers) and store writes (write_ms) is recorded there.
+        `content_hashes` maps document ids to the sha256 of their source
+        files, recorded in the document registry with the document; it may be
+        filled as `chunks` are produced, before each document's first chunk.
+        `on_embedding_started()` is called once, as the first batch of new
+        chunks is sent to the embedder.
+        """
+        if self.vector_store is None:
             logger.warning("Vector store not initialized")
-            return
+            return {"added": 0, "skipped": 0, "repeated": 0, "removed": 0}
+        self._check_writable()
+        
+        total = len(chunks) if hasattr(chunks, '__len__') else None
+        counts = {"consumed": 0, "skipped": 0, "repeated": 0, "added": 0, "removed": 0}
+        # document_id -> (filename, collection, chunk ids in this version)
+        documents: Dict[str, Tuple[str, str, set]] = {}
+        dropped = set()
+        # document_id -> chunk ids of its indexed version, which a new version
+        # replaces, so they never make its chunks near-duplicates
+        previous: Dict[str, set] = {}
+        # A document is registered once its last chunk has been read (it is
+        # complete) and none of its new chunks are still waiting to be stored
+        unstored: Dict[str, set] = {}
+        complete = set()
+        # document_id -> chunk ids it was registered with
+        registered: Dict[str, set] = {}
+        # Ids stored by this call; those of unregistered documents are deleted again if it fails
+        written = set()
+        state_lock = threading.Lock()
+        
+        def register(document_id: str):
+            # Called from this thread and the pipeline's writer thread
+            with state_lock:
+                filename, collection, ids = documents[document_id]
+                ids = ids - dropped
+                if document_id not in complete or unstored.get(document_id) or registered.get(document_id) == ids:
+                    return
+                registered[document_id] = ids
+                if self.documents is not None:
+                    stale = self.documents.replace(
+                        document_id, filename, collection, ids, (content_hashes or {}).get(document_id)
+                    )
+                    counts["removed"] += self._delete_chunks(stale)
+            if on_document:
+                on_document(document_id)
+        
+        def finish(document_id: Optional[str]):
+            if document_id is not None:
+                with state_lock:
+                    complete.add(document_id)
+                register(document_id)
+        
+        def new_chunks():
+            # Runs on this thread, pulled lazily by the pipeline
+            seen = set()
+            pending_fingerprints = {}
+            batch = {}
+            current = None
+            
+            def flush():
+                if not batch:
+                    return
+                for item in self._filter_new(batch, counts, pending_fingerprints, dropped, previous):
+                    document_id = (item[2] or {}).get("document_id")
+                    if document_id:
+                        with state_lock:
+                            unstored.setdefault(document_id, set()).add(item[0])
+                    yield item
+                batch.clear()
+            
+            for chunk in chunks:
+                counts["consumed"] += 1
+                if isinstance(chunk, str):
+                    text, metadata = chunk, None
+                else:
+                    text, metadata = chunk.text, chunk.metadata
+                cid = chunk_id(text, (metadata or {}).get("document_id", ""))
+                document_id = (metadata or {}).get("document_id") or None
+                if document_id != current:
+                    # The previous document's chunks are all read
+                    yield from flush()
+                    finish(current)
+                    current = document_id
+                    with state_lock:
+                        # Its chunks may arrive again after another document's
+                        complete.discard(document_id)
+                if document_id:
+                    if self.near_duplicates and document_id not in previous:
+                        previous[document_id] = (
+                            self.documents.chunk_ids(document_id) if self.documents is not None else set()
+                        )
+                    documents.setdefault(
+                        document_id, (metadata.get("source", ""), metadata.get("collection", ""), set())
+                    )[2].add(cid)
+                # Drop exact duplicates within the upload itself
+                if cid in seen:
+                    counts["skipped"] += 1
+                    counts["repeated"] += 1
+                    continue
+                seen.add(cid)
+                batch[cid] = (text, metadata)
+                if len(batch) >= batch_size:
+                    yield from flush()
+            yield from flush()
+            finish(current)
+        
+        def write(ids, texts, vectors, metadatas=None):
+            self._write_embeddings(ids, texts, vectors, metadatas)
+            stored = set()
+            with state_lock:
+                written.update(ids)
+                for cid, metadata in zip(ids, metadatas or [None] * len(ids)):
+                    document_id = (metadata or {}).get("document_id")
+                    if document_id:
+                        unstored[document_id].discard(cid)
+                        stored.add(document_id)
+            for document_id in stored:
+                register(document_id)
+        
+        def on_written(count: int):
+            counts["added"] += count
+            if progress_callback:
+                progress_callback(counts["added"] + counts["skipped"], total)
         
         try:
-            # Process in batches
-            for i in range(0, len(chunks), batch_size):
-                batch = chunks[i:i + batch_size]
-                self.vector_store.add_texts(batch)
-                logger.info(f"Added batch {i//batch_size + 1} ({len(batch)} chunks)")
+            pipeline = EmbeddingPipeline(
+                self.embeddings,
+                write,
+                max_batch_tokens=self.embedding_batch_tokens,
+                concurrency=self.embedding_concurrency
+            )
+            start = time.perf_counter()
+            pipeline.run(new_chunks(), on_written=on_written, on_started=on_embedding_started)
+            if timings is not None:
+                timings["embed_ms"] = round(pipeline.embed_seconds * 1000, 1)
+                timings["write_ms"] = round(pipeline.write_seconds * 1000, 1)
+            for document_id in documents:
+                finish(document_id)
+            elapsed = time.perf_counter() - start
+            if progress_callback:
+                progress_callback(counts["consumed"], total)
             
-            logger.info(f"Successfully added {len(chunks)} chunks to vector store")
+            logger.info(
+                f"Successfully added {counts['added']} chunks to vector store ({counts['skipped']} duplicates skipped, "
+                f"{counts['repeated']} of them repeated within the upload, "
+                f"{counts['removed']} stale chunks removed) in {elapsed:.1f}s, {pipeline.rate_limited} rate-limited retries"
+            )
         except Exception as e:
             logger.error(f"Error adding documents: {e}")
+            with state_lock:
+                orphaned = written.difference(*registered.values())
+            if orphaned:
+                try:
+                    logger.info(f"Removed {self._delete_chunks(orphaned)} chunks stored before the error")
+                except Exception as cleanup_error:
+                    logger.error(f"Error removing chunks stored before the error: {cleanup_error}")
             raise
+        finally:
+            if counts["added"] or counts["removed"]:
+                self._knowledge_base_changed()
+        return {"added": counts["added"], "skipped": counts["skipped"], "repeated": counts["repeated"], "removed": counts["removed"]}
+    
+    def _filter_new(self, batch: Dict[str, Tuple[str, Optional[dict]]], counts: Dict[str, int], pending_fingerprints: Dict[str, int], dropped: set, previous: Optional[Dict[str, set]] = None) -> List[Tuple[str, str, Optional[dict]]]:
+        """(id, text, metadata) of the chunks in a batch that are not already indexed
+        
+        Ids of near-duplicates that will not be stored are added to `dropped`.
+        A chunk is never a near-duplicate of its own document's `previous`
+        chunks: those are about to be replaced.
+        """
+        existing = self._existing_ids(list(batch))
+        new_ids = [cid for cid in batch if cid not in existing]
+        if self.near_duplicates and new_ids:
+            own = {
+                cid: (previous or {}).get((batch[cid][1] or {}).get("document_id"), ())
+                for cid in new_ids
+            }
+            kept = self._drop_near_duplicates(new_ids, {cid: batch[cid][0] for cid in new_ids}, pending_fingerprints, own, counts)
+            dropped.update(set(new_ids) - set(kept))
+            new_ids = kept
+        counts["skipped"] += len(batch) - len(new_ids)
+        return [(cid, *batch[cid]) for cid in new_ids]
+    
+    def _write_embeddings(self, ids: List[str], texts: List[str], vectors: List[List[float]], metadatas: Optional[List[Optional[dict]]] = None):
+        """Store precomputed embeddings"""
+        # The id travels in the metadata too: LangChain's Chroma does not return ids from searches
+        metadatas = [dict(metadata or {}, chunk_id=cid) for cid, metadata in zip(ids, metadatas or [None] * len(ids))]
+        if hasattr(self.vector_store, '_collection'):
+            # Chroma: write vectors directly instead of re-embedding in add_texts
+            self.vector_store._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        elif hasattr(self.vector_store, 'add_embeddings'):
+            self.vector_store.add_embeddings(text_embeddings=list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        else:
+            self.vector_store.add_texts(texts, metadatas=metadatas, ids=ids)
+        if self.near_duplicates:
+            self.near_duplicates.add(ids, [simhash(text) for text in texts])
+        if self.keyword_index is not None:
+            self.keyword_index.add(ids, texts, metadatas)
+    
+    def _delete_chunks(self, ids: Iterable[str], page_size: int = 5000) -> int:
+        """Remove chunks by id from the vector store and the side indexes"""
+        ids = list(ids)
+        for start in range(0, len(ids), page_size):
+            page = ids[start:start + page_size]
+            self.vector_store.delete(ids=page)
+            if self.keyword_index is not None:
+                self.keyword_index.remove(page)
+            if self.near_duplicates:
+                self.near_duplicates.remove(page)
+        return len(ids)
+    
+    def list_documents(self, collection: Optional[str] = None, limit: int = 50, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of ingested documents and the total count"""
+        if self.documents is None:
+            return [], 0
+        return self.documents.list(collection=collection, limit=limit, offset=offset)
+    
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        return self.documents.get(document_id) if self.documents is not None else None
+    
+    def find_document_by_content(self, collection: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """An indexed document of the collection whose source file had this sha256"""
+        return self.documents.find_content(collection, content_hash) if self.documents is not None else None
+    
+    def delete_document(self, document_id: str) -> Optional[int]:
+        """Delete a document's chunks; returns how many, or None if the document is unknown"""
+        if self.documents is None or self.vector_store is None:
+            return None
+        self._check_writable()
+        ids = self.documents.delete(document_id)
+        if ids is None:
+            return None
+        removed = self._delete_chunks(ids)
+        self._knowledge_base_changed()
+        logger.info(f"Deleted document {document_id} ({removed} chunks)")
+        return removed
+    
+    def _existing_ids(self, ids: List[str]) -> set:
+        """Ids among `ids` that are already in the vector store"""
+        if not ids:
+            return set()
+        if hasattr(self.vector_store, '_collection'):
+            # Chroma: fetch ids only, no documents or embeddings
+            return set(self.vector_store.get(ids=ids, include=[])['ids'])
+        if hasattr(self.vector_store, 'existing_ids'):
+            return self.vector_store.existing_ids(ids)
+        return {doc.id for doc in self.vector_store.get_by_ids(ids)}
+    
+    def chunk_count(self) -> int:
+        """Number of stored chunks, without reading them"""
+        if self.vector_store is None:
+            return 0
+        if hasattr(self.vector_store, '_collection'):
+            return self.vector_store._collection.count()
+        if hasattr(self.vector_store, 'count'):
+            return self.vector_store.count()
+        if isinstance(getattr(self.vector_store, 'store', None), dict):
+            # langchain_core InMemoryVectorStore
+            return len(self.vector_store.store)
+        return len(self.vector_store.get()['ids'])
+    
+    def vector_store_stats(self) -> Optional[Dict[str, Any]]:
+        if self.vector_store is None:
+            return None
+        if hasattr(self.vector_store, 'stats'):
+            return self.vector_store.stats()
+        return {"backend": self.vector_store_backend, "count": self.chunk_count()}
+    
+    def _drop_near_duplicates(self, ids: List[str], texts: Dict[str, str], pending: Dict[str, int], exclude: Optional[Dict[str, Iterable[str]]] = None, counts: Optional[Dict[str, int]] = None) -> List[str]:
+        """Filter out chunks whose SimHash is close to an indexed or pending chunk
+        
+        `exclude` maps a chunk id to indexed chunk ids it may not match.
+        Chunks close only to a pending chunk are counted in `counts["repeated"]`.
+        """
+        kept = []
+        for cid in ids:
+            fingerprint = simhash(texts[cid])
+            if self.near_duplicates.find(fingerprint, (exclude or {}).get(cid, ())):
+                continue
+            if any(bin(fingerprint ^ other).count("1") <= self.near_duplicates.max_distance for other in pending.values()):
+                if counts is not None:
+                    counts["repeated"] += 1
+                continue
+            pending[cid] = fingerprint
+            kept.append(cid)
+        return kept
+    
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("This worker serves a read-only replica; ingest and deletes run in the writer process")
     
-    def generate_response(self, query: str, conversation_id: Optional[str] = None, use_rag: bool = True) -> Tuple[str, Optional[List[str]]]:
-        """Generate response using RAG"""
+    def _knowledge_base_changed(self):
+        """Invalidate cached answers (bumping the cache generation) so they are not reused"""
+        if self.answer_cache:
+            self.answer_cache.invalidate()
+    
+    def generate_response(self, query: str, conversation_id: Optional[str] = None, use_rag: bool = True, filters: Optional[Dict[str, Any]] = None) -> ChatResult:
+        """Generate response using RAG, answering from the answer cache when possible
+        
+        `filters` restricts retrieval: {"collection": name, "document_ids": [...]}.
+        The result carries per-stage timings in milliseconds and token usage.
+        """
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        if not self._answer_cache_applies(conversation_id):
+            return self._finish(self._generate_response(query, conversation_id, use_rag, filters, timings), timings, start)
+        
+        scope = self._cache_scope(use_rag, filters)
+        try:
+            # Read before the lookup: an answer built on chunks that change meanwhile is not stored
+            generation = self.answer_cache.current_generation()
+            query_vector = self._embed_query(query, timings)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup skipped: {e}")
+            return self._finish(self._generate_response(query, conversation_id, use_rag, filters, timings), timings, start)
+        
+        cached = self.answer_cache.lookup(query_vector, scope)
+        if cached:
+            self._remember(conversation_id, query, cached[0])
+            return self._finish(ChatResult(cached[0], cached[1], cached=True), timings, start)
+        
+        # The cache lookup's query vector is reused for retrieval
+        result = self._generate_response(query, conversation_id, use_rag, filters, timings, query_vector)
+        if not result.error:
+            self.answer_cache.store(query_vector, scope, result.response, result.sources, generation)
+        return self._finish(result, timings, start)
+    
+    async def agenerate_response(self, query: str, conversation_id: Optional[str] = None, use_rag: bool = True, filters: Optional[Dict[str, Any]] = None) -> ChatResult:
+        """Generate response using RAG without blocking the event loop"""
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        if not self._answer_cache_applies(conversation_id):
+            return self._finish(await self._agenerate_response(query, conversation_id, use_rag, filters, timings), timings, start)
+        
+        scope = self._cache_scope(use_rag, filters)
+        try:
+            generation = self.answer_cache.current_generation()
+            query_vector = await self._aembed_query(query, timings)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup skipped: {e}")
+            return self._finish(await self._agenerate_response(query, conversation_id, use_rag, filters, timings), timings, start)
+        
+        cached = self.answer_cache.lookup(query_vector, scope)
+        if cached:
+            self._remember(conversation_id, query, cached[0])
+            return self._finish(ChatResult(cached[0], cached[1], cached=True), timings, start)
+        
+        result = await self._agenerate_response(query, conversation_id, use_rag, filters, timings, query_vector)
+        if not result.error:
+            self.answer_cache.store(query_vector, scope, result.response, result.sources, generation)
+        return self._finish(result, timings, start)
+    
+    def _generate_response(self, query: str, conversation_id: Optional[str], use_rag: bool, filters: Optional[Dict[str, Any]] = None, timings: Optional[Dict[str, float]] = None, query_vector: Optional[List[float]] = None) -> ChatResult:
         if not self.llm:
-            return (
-                "Please configure an LLM (OpenAI or Ollama) for full RAG functionality. "
-                "Please restart the backend server after installing langchain-openai.",
-                None
-            )
+            return self._llm_not_configured_response()
         
         try:
-            # Retrieve relevant chunks
-            relevant_chunks = []
-            sources = []
-            
-            if use_rag and self.vector_store:
-                try:
-                    docs = self.vector_store.similarity_search(query, k=3)
-                    relevant_chunks = [doc.page_content for doc in docs]
-                    sources = [doc.metadata.get('source', 'Unknown') for doc in docs]
-                except Exception as e:
-                    logger.warning(f"Vector search failed: {e}")
-            
-            # Build prompt
-            if relevant_chunks:
-                context = "\n\n".join(relevant_chunks)
-                prompt = f"""Based on the following context, answer the question. If the answer is not in the context, say so.
-
-Context:
-{context}
-
-Question: {query}
-
-Answer:"""
-            else:
-                prompt = f"Answer the following question: {query}"
+            relevant_chunks, sources = self._retrieve(query, use_rag, timings, filters, query_vector)
+            start = time.perf_counter()
+            prompt = self._build_prompt(query, relevant_chunks, self._history(conversation_id))
+            self._record(timings, "prompt_ms", start)
             
             # Generate response
+            start = time.perf_counter()
+            response = None
             try:
-                # Check if LLM is a ChatOpenAI model (expects messages)
-                llm_type = type(self.llm).__name__
-                if 'ChatOpenAI' in llm_type or 'OpenAI' in llm_type:
-                    # Try newer LangChain API (0.1.x+)
-                    try:
-                        from langchain_core.messages import SystemMessage, HumanMessage
-                    except ImportError:
-                        from langchain.schema import SystemMessage, HumanMessage
-                    messages = [
-                        SystemMessage(content="You are a helpful assistant."),
-                        HumanMessage(content=prompt)
-                    ]
-                    response = self.llm.invoke(messages)
-                    if hasattr(response, 'content'):
-                        response_text = response.content
-                    else:
-                        response_text = str(response)
-                else:
-                    # For HuggingFace, Ollama, and other models - use invoke with string
-                    response = self.llm.invoke(prompt)
-                    if hasattr(response, 'content'):
-                        response_text = response.content
-                    else:
-                        response_text = str(response)
+                response = self.llm.invoke(self._llm_input(prompt))
+                response_text = self._response_text(response)
             except Exception as e:
-                error_str = str(e)
-                # Check for quota/rate limit errors
-                if '429' in error_str or 'quota' in error_str.lower() or 'insufficient_quota' in error_str.lower():
+                if self._is_quota_error(e):
                     logger.error(f"OpenAI API quota exceeded: {e}")
-                    return (
-                        "I'm sorry, but the OpenAI API quota has been exceeded. Please check your OpenAI account billing and quota settings. "
-                        "You can visit https://platform.openai.com/account/billing to check your usage and billing information.",
-                        sources if sources else None
-                    )
+                    return self._quota_exceeded_response(sources)
+                if isinstance(self.llm, LLMRouter):
+                    # The router already tried every backend with its own input format
+                    logger.error(f"LLM request failed: {e}")
+                    return self._generation_failed_response(e, sources)
                 
                 logger.warning(f"Newer API failed, trying fallback: {e}")
                 # Fallback to older API
@@ -299,7 +992,7 @@ Answer:"""
                     try:
                         from langchain_core.messages import HumanMessage
                         response = self.llm.invoke([HumanMessage(content=prompt)])
-                        response_text = response.content if hasattr(response, 'content') else str(response)
+                        response_text = self._response_text(response)
                     except:
                         # Try using predict method if available
                         if hasattr(self.llm, 'predict'):
@@ -307,26 +1000,529 @@ Answer:"""
                         else:
                             # Last resort: try invoke with string
                             response = self.llm.invoke(prompt)
-                            response_text = response.content if hasattr(response, 'content') else str(response)
+                            response_text = self._response_text(response)
                 except Exception as fallback_error:
                     logger.error(f"All fallback methods failed: {fallback_error}")
-                    return (
-                        f"Error generating response: {str(fallback_error)}. Please check your OpenAI API key and quota.",
-                        sources if sources else None
-                    )
-            
-            # Store in conversation memory
-            if conversation_id:
-                if conversation_id not in self.conversation_memory:
-                    self.conversation_memory[conversation_id] = []
-                self.conversation_memory[conversation_id].append({
-                    "query": query,
-                    "response": response_text
-                })
+                    return self._generation_failed_response(fallback_error, sources)
+            self._record(timings, "llm_ms", start)
             
-            return response_text, sources if sources else None
+            self._remember(conversation_id, query, response_text)
+            return ChatResult(response_text, sources if sources else None, usage=self._usage(prompt, response, response_text))
             
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return f"Error generating response: {str(e)}", None
+            return ChatResult(f"Error generating response: {str(e)}", None, error=True)
+    
+    async def _agenerate_response(self, query: str, conversation_id: Optional[str], use_rag: bool, filters: Optional[Dict[str, Any]] = None, timings: Optional[Dict[str, float]] = None, query_vector: Optional[List[float]] = None) -> ChatResult:
+        if not self.llm:
+            return self._llm_not_configured_response()
+        
+        # Bound the number of in-flight pipelines so a burst of chats cannot
+        # exhaust the thread pool or the provider's rate limit
+        async with self._request_semaphore:
+            try:
+                relevant_chunks, sources = await self._aretrieve(query, use_rag, timings, filters, query_vector)
+                return await self._acomplete(query, relevant_chunks, sources, conversation_id, timings)
+            except Exception as e:
+                logger.error(f"Error generating response: {e}")
+                return ChatResult(f"Error generating response: {str(e)}", None, error=True)
+    
+    async def _acomplete(self, query: str, relevant_chunks: List[str], sources: List[str], conversation_id: Optional[str] = None, timings: Optional[Dict[str, float]] = None) -> ChatResult:
+        """Build the prompt from retrieved passages and generate the answer"""
+        start = time.perf_counter()
+        prompt = self._build_prompt(query, relevant_chunks, self._history(conversation_id))
+        self._record(timings, "prompt_ms", start)
+        
+        start = time.perf_counter()
+        try:
+            response = await self.llm.ainvoke(self._llm_input(prompt))
+        except Exception as e:
+            if self._is_quota_error(e):
+                logger.error(f"OpenAI API quota exceeded: {e}")
+                return self._quota_exceeded_response(sources)
+            if isinstance(self.llm, LLMRouter):
+                # The router already tried every backend with its own input format
+                logger.error(f"LLM request failed: {e}")
+                return self._generation_failed_response(e, sources)
+            
+            logger.warning(f"Newer API failed, trying fallback: {e}")
+            try:
+                try:
+                    from langchain_core.messages import HumanMessage
+                    response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+                except Exception:
+                    response = await self.llm.ainvoke(prompt)
+            except Exception as fallback_error:
+                logger.error(f"All fallback methods failed: {fallback_error}")
+                return self._generation_failed_response(fallback_error, sources)
+        response_text = self._response_text(response)
+        self._record(timings, "llm_ms", start)
+        
+        self._remember(conversation_id, query, response_text)
+        return ChatResult(response_text, sources if sources else None, usage=self._usage(prompt, response, response_text))
+    
+    async def abatch_generate(self, questions: List[Dict[str, Any]], concurrency: int = 8) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Answer many questions at once, yielding (position, result) as each completes
+        
+        Each question is {"question", "use_rag", "filters"}. All queries
+        are embedded in one call and searched together per filter; answers are
+        generated concurrently, at most `concurrency` at a time. The answer
+        cache and conversation memory are bypassed. Each result carries the
+        answer, sources, the retrieved chunks' metadata, timings and usage;
+        embed_ms and the vector part of retrieve_ms are the question's share
+        of the batched calls, and queue_ms is the wait for a generation slot.
+        """
+        if not self.llm:
+            for i in range(len(questions)):
+                yield i, {"response": self._llm_not_configured_response().response, "error": True}
+            return
+        timings = [{} for _ in questions]
+        candidates = [[] for _ in questions]
+        rag = [i for i, question in enumerate(questions) if question.get("use_rag", True) and self.vector_store is not None]
+        if rag:
+            await self._abatch_retrieve(questions, rag, timings, candidates)
+        
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def answer(i: int) -> Tuple[int, Dict[str, Any]]:
+            question = questions[i]
+            start = time.perf_counter()
+            try:
+                if candidates[i] and self.reranker and len(candidates[i]) > self.retrieval_k:
+                    candidates[i], timings[i]["rerank_ms"] = await self.reranker.arerank(question["question"], candidates[i], self.retrieval_k)
+                relevant_chunks, sources = self._build_context(candidates[i], timings[i]) if candidates[i] else ([], [])
+                queued = time.perf_counter()
+                async with semaphore, self._request_semaphore:
+                    self._record(timings[i], "queue_ms", queued)
+                    result = await self._acomplete(question["question"], relevant_chunks, sources, timings=timings[i])
+            except Exception as e:
+                logger.error(f"Error answering batch question {i}: {e}")
+                result = ChatResult(f"Error generating response: {str(e)}", None, error=True)
+            # The question's own work: its share of retrieval plus everything after it except the queue
+            own_ms = (time.perf_counter() - start) * 1000 - timings[i].get("queue_ms", 0.0)
+            timings[i]["total_ms"] = round(timings[i].get("embed_ms", 0.0) + timings[i].get("retrieve_ms", 0.0) + own_ms, 1)
+            observe_chat(timings[i], result.usage, "error" if result.error else "ok")
+            return i, {
+                "response": result.response,
+                "sources": result.sources,
+                "retrieved": [
+                    {name: doc.metadata.get(name) for name in ("source", "document_id", "page")}
+                    for doc in candidates[i][:self.retrieval_k]
+                ],
+                "error": result.error,
+                "timings": timings[i],
+                "usage": result.usage
+            }
+        
+        for done in asyncio.as_completed([answer(i) for i in range(len(questions))]):
+            yield await done
+    
+    async def _abatch_retrieve(self, questions: List[Dict[str, Any]], indexes: List[int], timings: List[Dict[str, float]], candidates: List[List[Any]]):
+        """Fill `candidates` for the questions at `indexes` with batched embedding and search"""
+        depth = self._candidate_depth()
+        vectors = {}
+        if self._uses_vector_search():
+            start = time.perf_counter()
+            try:
+                embedded = await self.embeddings.aembed_documents([questions[i]["question"] for i in indexes])
+                vectors = dict(zip(indexes, embedded))
+            except Exception as e:
+                logger.warning(f"Batch query embedding failed: {e}")
+            share = round((time.perf_counter() - start) * 1000 / len(indexes), 1)
+            for i in indexes:
+                timings[i]["embed_ms"] = share
+        
+        # One multi-query search per distinct filter
+        groups: Dict[str, List[int]] = {}
+        for i in vectors:
+            groups.setdefault(repr(self._where(questions[i].get("filters"))), []).append(i)
+        docs: Dict[int, List[Any]] = {}
+        for group in groups.values():
+            start = time.perf_counter()
+            try:
+                found = await asyncio.to_thread(self._search_many, [vectors[i] for i in group], depth, questions[group[0]].get("filters"))
+                docs.update(zip(group, found))
+            except Exception as e:
+                logger.warning(f"Vector search failed: {e}")
+            share = round((time.perf_counter() - start) * 1000 / len(group), 1)
+            for i in group:
+                timings[i]["retrieve_ms"] = share
+        
+        def keyword_search(i: int):
+            start = time.perf_counter()
+            hits = self.keyword_index.search(questions[i]["question"], depth, **self._keyword_filter(questions[i].get("filters")))
+            timings[i]["retrieve_ms"] = round(timings[i].get("retrieve_ms", 0.0) + (time.perf_counter() - start) * 1000, 1)
+            return hits
+        
+        keyword_hits = await asyncio.to_thread(lambda: {i: keyword_search(i) for i in indexes}) if self.keyword_index else {}
+        for i in indexes:
+            candidates[i] = self._fuse(docs.get(i, []), keyword_hits.get(i, []))
+    
+    def _search_many(self, vectors: List[List[float]], k: int, filters: Optional[Dict[str, Any]] = None) -> List[List[Any]]:
+        """Vector search for several queries with the same filter"""
+        if hasattr(self.vector_store, 'similarity_search_by_vectors'):
+            return self.vector_store.similarity_search_by_vectors(vectors, k=k, **self._vector_filter(filters))
+        if hasattr(self.vector_store, '_collection'):
+            # Chroma answers several query embeddings in one call
+            try:
+                from langchain_core.documents import Document
+            except ImportError:
+                from langchain.schema import Document
+            result = self.vector_store._collection.query(
+                query_embeddings=vectors, n_results=k, where=self._where(filters), include=["documents", "metadatas"]
+            )
+            return [
+                [Document(id=cid, page_content=text, metadata=metadata or {}) for cid, text, metadata in zip(ids, texts, metadatas)]
+                for ids, texts, metadatas in zip(result["ids"], result["documents"], result["metadatas"])
+            ]
+        return [self.vector_store.similarity_search_by_vector(vector, k=k, **self._vector_filter(filters)) for vector in vectors]
+    
+    async def astream_response(self, query: str, conversation_id: Optional[str] = None, use_rag: bool = True, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a RAG response as events: sources first, then tokens, then done"""
+        if not self.llm:
+            yield {"event": "error", "message": self._llm_not_configured_response().response}
+            return
+        
+        async with self._request_semaphore:
+            start = time.perf_counter()
+            timings: Dict[str, float] = {}
+            scope = self._cache_scope(use_rag, filters)
+            query_vector = None
+            generation = None
+            if self._answer_cache_applies(conversation_id):
+                try:
+                    generation = self.answer_cache.current_generation()
+                    query_vector = await self._aembed_query(query, timings)
+                    cached = self.answer_cache.lookup(query_vector, scope)
+                except Exception as e:
+                    logger.warning(f"Answer cache lookup skipped: {e}")
+                    cached = None
+                if cached:
+                    self._remember(conversation_id, query, cached[0])
+                    self._record(timings, "total_ms", start)
+                    observe_chat(timings, None, "cached")
+                    yield {"event": "sources", "sources": cached[1]}
+                    yield {"event": "token", "content": cached[0]}
+                    yield {"event": "done", "ttft_ms": timings["total_ms"], "total_ms": timings["total_ms"], "cached": True, "timings": timings}
+                    return
+            
+            relevant_chunks, sources = await self._aretrieve(query, use_rag, timings, filters, query_vector)
+            yield {"event": "sources", "sources": sources if sources else None}
+            
+            prompt_start = time.perf_counter()
+            prompt = self._build_prompt(query, relevant_chunks, self._history(conversation_id))
+            self._record(timings, "prompt_ms", prompt_start)
+            parts = []
+            usage_chunk = None
+            llm_start = time.perf_counter()
+            try:
+                async for chunk in self.llm.astream(self._llm_input(prompt)):
+                    if getattr(chunk, 'usage_metadata', None):
+                        # Providers that report usage send it with the last chunk
+                        usage_chunk = chunk
+                    token = self._response_text(chunk)
+                    if not token:
+                        continue
+                    if "ttft_ms" not in timings:
+                        self._record(timings, "ttft_ms", start)
+                    parts.append(token)
+                    yield {"event": "token", "content": token}
+            except Exception as e:
+                if self._is_quota_error(e):
+                    logger.error(f"OpenAI API quota exceeded: {e}")
+                    message = self._quota_exceeded_response(sources).response
+                else:
+                    logger.error(f"Error streaming response: {e}")
+                    message = self._generation_failed_response(e, sources).response
+                self._record(timings, "total_ms", start)
+                observe_chat(timings, None, "error")
+                yield {"event": "error", "message": message}
+                return
+            
+            self._record(timings, "llm_ms", llm_start)
+            self._record(timings, "total_ms", start)
+            response_text = "".join(parts)
+            usage = self._usage(prompt, usage_chunk, response_text)
+            self._remember(conversation_id, query, response_text)
+            if query_vector is not None:
+                self.answer_cache.store(query_vector, scope, response_text, sources if sources else None, generation)
+            observe_chat(timings, usage, "ok")
+            ttft_ms = timings.get("ttft_ms")
+            logger.info(f"Streamed response: ttft={ttft_ms}ms total={timings['total_ms']}ms tokens={len(parts)}")
+            yield {
+                "event": "done", "ttft_ms": ttft_ms, "total_ms": timings["total_ms"], "cached": False,
+                "timings": timings, "usage": usage
+            }
+    
+    def _finish(self, result: ChatResult, timings: Dict[str, float], start: float) -> ChatResult:
+        """Attach the request's timings and export them with its token usage"""
+        self._record(timings, "total_ms", start)
+        result.timings = timings
+        observe_chat(timings, result.usage, "error" if result.error else "cached" if result.cached else "ok")
+        return result
+    
+    @staticmethod
+    def _usage(prompt: str, response, response_text: str) -> Dict[str, int]:
+        """Prompt and completion tokens, as reported by the provider when it does"""
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            return {"prompt_tokens": usage.get("input_tokens", 0), "completion_tokens": usage.get("output_tokens", 0)}
+        return {"prompt_tokens": count_tokens(prompt), "completion_tokens": count_tokens(response_text)}
+    
+    def _embed_query(self, query: str, timings: Optional[Dict[str, float]] = None) -> List[float]:
+        start = time.perf_counter()
+        vector = self.embeddings.embed_query(query)
+        self._record(timings, "embed_ms", start)
+        return vector
+    
+    async def _aembed_query(self, query: str, timings: Optional[Dict[str, float]] = None) -> List[float]:
+        start = time.perf_counter()
+        vector = await self.embeddings.aembed_query(query)
+        self._record(timings, "embed_ms", start)
+        return vector
+    
+    def _retrieve(self, query: str, use_rag: bool, timings: Optional[Dict[str, float]] = None, filters: Optional[Dict[str, Any]] = None, query_vector: Optional[List[float]] = None) -> Tuple[List[str], List[str]]:
+        """Retrieve relevant chunks and their sources
+        
+        Stage times in milliseconds (embed, retrieve, rerank) are recorded in
+        `timings` if given. A precomputed `query_vector` skips the embed
+        stage. Filters are applied inside both indexes, not to their results.
+        """
+        if not use_rag or self.vector_store is None:
+            return [], []
+        docs = []
+        start = time.perf_counter()
+        if self._uses_vector_search():
+            try:
+                if query_vector is None:
+                    query_vector = self._embed_query(query, timings)
+                    start = time.perf_counter()
+                docs = self.vector_store.similarity_search_by_vector(query_vector, k=self._candidate_depth(), **self._vector_filter(filters))
+            except Exception as e:
+                logger.warning(f"Vector search failed: {e}")
+        keyword_hits = self.keyword_index.search(query, self._candidate_depth(), **self._keyword_filter(filters)) if self.keyword_index else []
+        candidates = self._fuse(docs, keyword_hits)
+        self._record(timings, "retrieve_ms", start)
+        if self.reranker and len(candidates) > self.retrieval_k:
+            candidates, rerank_ms = self.reranker.rerank(query, candidates, self.retrieval_k)
+            if timings is not None:
+                timings["rerank_ms"] = rerank_ms
+        return self._build_context(candidates, timings)
+    
+    async def _aretrieve(self, query: str, use_rag: bool, timings: Optional[Dict[str, float]] = None, filters: Optional[Dict[str, Any]] = None, query_vector: Optional[List[float]] = None) -> Tuple[List[str], List[str]]:
+        """Retrieve relevant chunks without blocking the event loop"""
+        if not use_rag or self.vector_store is None:
+            return [], []
+        depth = self._candidate_depth()
+        vector_filter = self._vector_filter(filters)
+        if self._uses_vector_search() and query_vector is None:
+            try:
+                query_vector = await self._aembed_query(query, timings)
+            except Exception as e:
+                logger.warning(f"Query embedding failed: {e}")
+        
+        async def vector_search():
+            if not self._uses_vector_search() or query_vector is None:
+                return []
+            try:
+                return await self.vector_store.asimilarity_search_by_vector(query_vector, k=depth, **vector_filter)
+            except Exception as e:
+                logger.warning(f"Vector search failed: {e}")
+                return []
+        
+        async def keyword_search():
+            if not self.keyword_index:
+                return []
+            return await asyncio.to_thread(self.keyword_index.search, query, depth, **self._keyword_filter(filters))
+        
+        start = time.perf_counter()
+        docs, keyword_hits = await asyncio.gather(vector_search(), keyword_search())
+        candidates = self._fuse(docs, keyword_hits)
+        self._record(timings, "retrieve_ms", start)
+        if self.reranker and len(candidates) > self.retrieval_k:
+            candidates, rerank_ms = await self.reranker.arerank(query, candidates, self.retrieval_k)
+            if timings is not None:
+                timings["rerank_ms"] = rerank_ms
+        return self._build_context(candidates, timings)
+    
+    @staticmethod
+    def _record(timings: Optional[Dict[str, float]], name: str, start: float):
+        if timings is not None:
+            timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    
+    @staticmethod
+    def _where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Chroma-style metadata filter for the vector store"""
+        clauses = []
+        if filters and filters.get("collection"):
+            clauses.append({"collection": filters["collection"]})
+        if filters and filters.get("document_ids") is not None:
+            clauses.append({"document_id": {"$in": list(filters["document_ids"])}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    
+    def _vector_filter(self, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        where = self._where(filters)
+        if where is None:
+            return {}
+        if hasattr(self.vector_store, '_collection') or hasattr(self.vector_store, 'existing_ids'):
+            # Chroma and the memmap index evaluate the filter inside the index
+            return {"filter": where}
+        try:
+            from .vector_index import metadata_matches
+        except ImportError:
+            from vector_index import metadata_matches
+        # Other LangChain stores (e.g. InMemoryVectorStore) take a predicate
+        return {"filter": lambda doc: metadata_matches(doc.metadata, where)}
+    
+    @staticmethod
+    def _keyword_filter(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not filters:
+            return {}
+        return {"collection": filters.get("collection") or None, "document_ids": filters.get("document_ids")}
+    
+    def _cache_scope(self, use_rag: bool, filters: Optional[Dict[str, Any]]) -> Tuple:
+        where = self._where(filters)
+        return (use_rag, repr(where) if where else None)
+    
+    def _uses_vector_search(self) -> bool:
+        return self.retrieval_mode != "bm25" or not self.keyword_index
+    
+    def _candidate_depth(self) -> int:
+        """Results wanted from each retriever: fusion and reranking need more than the final k"""
+        depth = self.retrieval_candidates if self.keyword_index else self.retrieval_k
+        if self.reranker:
+            depth = max(depth, self.rerank_candidates)
+        return depth
+    
+    def _fuse(self, docs: List[Any], keyword_hits: List[Tuple[str, float]]) -> List[Any]:
+        """Combine vector and BM25 rankings with reciprocal-rank fusion
+        
+        Returns the final k documents, or the rerank candidates when a
+        reranker is configured.
+        """
+        limit = self.rerank_candidates if self.reranker else self.retrieval_k
+        if not self.keyword_index:
+            return docs[:limit]
+        try:
+            from langchain_core.documents import Document
+        except ImportError:
+            from langchain.schema import Document
+        
+        by_id = {}
+        vector_ranking = []
+        for doc in docs:
+            # Stored ids are content hashes, so they can be recomputed from the text
+            cid = getattr(doc, 'id', None) or doc.metadata.get('chunk_id') or chunk_id(doc.page_content)
+            by_id.setdefault(cid, doc)
+            vector_ranking.append(cid)
+        rankings = [vector_ranking, [cid for cid, _ in keyword_hits]]
+        
+        fused = []
+        for cid, _ in reciprocal_rank_fusion(rankings):
+            doc = by_id.get(cid)
+            if doc is None:
+                stored = self.keyword_index.get(cid)
+                if stored is None:
+                    continue
+                doc = Document(page_content=stored[0], metadata=stored[1] or {})
+            fused.append(doc)
+            if len(fused) >= limit:
+                break
+        return fused
+    
+    def _build_context(self, candidates: List[Any], timings: Optional[Dict[str, float]] = None) -> Tuple[List[str], List[str]]:
+        """Passages for the prompt and their sources, packed into the context budget"""
+        start = time.perf_counter()
+        if self.context_builder is None:
+            return self._split_docs(candidates[:self.retrieval_k])
+        context = self.context_builder.build(candidates[:self.retrieval_k])
+        self._record(timings, "context_ms", start)
+        return context
+    
+    @staticmethod
+    def _split_docs(docs) -> Tuple[List[str], List[str]]:
+        relevant_chunks = [doc.page_content for doc in docs]
+        sources = []
+        for doc in docs:
+            source = doc.metadata.get('source', 'Unknown')
+            if doc.metadata.get('page') is not None:
+                source = f"{source}, page {doc.metadata['page']}"
+            sources.append(source)
+        return relevant_chunks, sources
+    
+    @staticmethod
+    def _build_prompt(query: str, relevant_chunks: List[str], history: str = "") -> str:
+        """Build the LLM prompt from the query, retrieved context and conversation history"""
+        history_block = f"Conversation so far:\n{history}\n\n" if history else ""
+        if relevant_chunks:
+            context = "\n\n".join(relevant_chunks)
+            return f"""Based on the following context, answer the question. If the answer is not in the context, say so.
 
+Context:
+{context}
+
+{history_block}Question: {query}
+
+Answer:"""
+        if history_block:
+            return f"{history_block}Answer the following question: {query}"
+        return f"Answer the following question: {query}"
+    
+    def _history(self, conversation_id: Optional[str]) -> str:
+        return self.conversation_memory.prompt_context(conversation_id, self.history_prompt_tokens)
+    
+    def _answer_cache_applies(self, conversation_id: Optional[str]) -> bool:
+        # Follow-up questions depend on the conversation, so only fresh ones are cached
+        if not self.answer_cache or not self.llm:
+            return False
+        return not conversation_id or conversation_id not in self.conversation_memory
+    
+    def _llm_input(self, prompt: str):
+        """Wrap the prompt in the input format the configured LLM expects"""
+        # The router wraps string prompts per backend itself
+        return llm_input(self.llm, prompt)
+    
+    @staticmethod
+    def _response_text(response) -> str:
+        if hasattr(response, 'content'):
+            return response.content
+        return str(response)
+    
+    @staticmethod
+    def _is_quota_error(error: Exception) -> bool:
+        # Check for quota/rate limit errors
+        error_str = str(error)
+        return '429' in error_str or 'quota' in error_str.lower() or 'insufficient_quota' in error_str.lower()
+    
+    @staticmethod
+    def _llm_not_configured_response() -> ChatResult:
+        return ChatResult(
+            "Please configure an LLM (OpenAI or Ollama) for full RAG functionality. "
+            "Please restart the backend server after installing langchain-openai.",
+            None,
+            error=True
+        )
+    
+    @staticmethod
+    def _quota_exceeded_response(sources: List[str]) -> ChatResult:
+        return ChatResult(
+            "I'm sorry, but the OpenAI API quota has been exceeded. Please check your OpenAI account billing and quota settings. "
+            "You can visit https://platform.openai.com/account/billing to check your usage and billing information.",
+            sources if sources else None,
+            error=True
+        )
+    
+    @staticmethod
+    def _generation_failed_response(error: Exception, sources: List[str]) -> ChatResult:
+        return ChatResult(
+            f"Error generating response: {str(error)}. Please check your OpenAI API key and quota.",
+            sources if sources else None,
+            error=True
+        )
+    
+    def _remember(self, conversation_id: Optional[str], query: str, response_text: str):
+        """Store in conversation memory"""
+        if conversation_id:
+            self.conversation_memory.append(conversation_id, query, response_text)
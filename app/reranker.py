@@ -0,0 +1,115 @@
+"""
+Reranker - Cross-encoder rescoring of retrieved candidates on CPU
+Candidates are scored in batches against a hard per-query latency budget;
+when the budget runs out the caller keeps the retrieval order instead
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RerankBudgetExceeded(Exception):
+    pass
+
+
+def load_cross_encoder(model_name: str):
+    """Load a sentence-transformers CrossEncoder, preferring quantized ONNX inference"""
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError:
+        raise ImportError("sentence-transformers not installed. Install: pip install sentence-transformers")
+
+    if os.getenv("RERANK_ONNX", "true").lower() == "true":
+        onnx_file = os.getenv("RERANK_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+        try:
+            model = CrossEncoder(model_name, backend="onnx", model_kwargs={"file_name": onnx_file})
+            logger.info(f"Using ONNX cross-encoder: {model_name} ({onnx_file})")
+            return model
+        except Exception as e:
+            # Older sentence-transformers (no backend argument), onnxruntime/optimum missing, or no ONNX export
+            logger.warning(f"ONNX cross-encoder unavailable, using PyTorch: {e}")
+    model = CrossEncoder(model_name)
+    logger.info(f"Using cross-encoder: {model_name}")
+    return model
+
+
+class Reranker:
+    """Rescore (query, candidate) pairs with a cross-encoder and keep the best k
+
+    `model` needs `predict(pairs, batch_size=...)` returning one relevance
+    score per pair (sentence_transformers.CrossEncoder does). Scoring runs on
+    a dedicated thread pool; `rerank` waits at most `budget_ms` (including
+    time queued behind other queries) and the worker abandons remaining
+    batches once the deadline has passed.
+    """
+
+    def __init__(self, model, batch_size: int = 16, budget_ms: float = 250, workers: int = 1):
+        self.model = model
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+        self._lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = 0
+
+    def _score(self, query: str, texts: List[str], deadline: float) -> List[float]:
+        scores: List[float] = []
+        for start in range(0, len(texts), self.batch_size):
+            if time.monotonic() >= deadline:
+                raise RerankBudgetExceeded()
+            batch = texts[start:start + self.batch_size]
+            scores.extend(float(score) for score in self.model.predict([(query, text) for text in batch], batch_size=len(batch)))
+        return scores
+
+    def _ordered(self, items: Sequence[Any], scores: Optional[List[float]], k: int) -> List[Any]:
+        with self._lock:
+            if scores is None:
+                self.fallbacks += 1
+                return list(items[:k])
+            self.reranked += 1
+        order = sorted(range(len(items)), key=lambda i: scores[i], reverse=True)
+        return [items[i] for i in order[:k]]
+
+    def rerank(self, query: str, items: Sequence[Any], k: int, text: Callable[[Any], str] = lambda item: item.page_content) -> Tuple[List[Any], float]:
+        """Top-k items by cross-encoder score, or the first k if the budget runs out
+
+        Returns the items and the time spent in milliseconds.
+        """
+        start = time.monotonic()
+        deadline = start + self.budget_ms / 1000
+        future = self._executor.submit(self._score, query, [text(item) for item in items], deadline)
+        try:
+            scores = future.result(timeout=self.budget_ms / 1000)
+        except (FutureTimeoutError, RerankBudgetExceeded):
+            future.cancel()
+            scores = None
+        except Exception as e:
+            logger.warning(f"Reranking failed, keeping retrieval order: {e}")
+            scores = None
+        return self._ordered(items, scores, k), round((time.monotonic() - start) * 1000, 1)
+
+    async def arerank(self, query: str, items: Sequence[Any], k: int, text: Callable[[Any], str] = lambda item: item.page_content) -> Tuple[List[Any], float]:
+        """Async rerank; the event loop is never blocked by scoring"""
+        start = time.monotonic()
+        deadline = start + self.budget_ms / 1000
+        future = self._executor.submit(self._score, query, [text(item) for item in items], deadline)
+        try:
+            scores = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.budget_ms / 1000)
+        except (asyncio.TimeoutError, RerankBudgetExceeded):
+            future.cancel()
+            scores = None
+        except Exception as e:
+            logger.warning(f"Reranking failed, keeping retrieval order: {e}")
+            scores = None
+        return self._ordered(items, scores, k), round((time.monotonic() - start) * 1000, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"reranked": self.reranked, "fallbacks": self.fallbacks, "budget_ms": self.budget_ms}
@@ -0,0 +1,19 @@
+"""
+Tokens - Token counting shared by ingest batching and prompt budgets
+"""
+
+_token_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken's cl100k_base, or ~4 characters per token without it"""
+    global _token_encoder
+    if _token_encoder is None:
+        try:
+            import tiktoken
+            _token_encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoder = False
+    if _token_encoder:
+        return len(_token_encoder.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
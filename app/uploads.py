@@ -0,0 +1,72 @@
+"""
+Uploads - Bounded-memory handling of document uploads
+Upload request bodies are size-checked as they arrive, so an oversized file
+is rejected before it is read or spooled; accepted uploads are copied to the
+upload directory in fixed-size blocks and parsed from the file
+"""
+
+import os
+import json
+import logging
+from typing import Iterable
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+MAX_BULK_UPLOAD_BYTES = int(float(os.getenv("MAX_BULK_UPLOAD_MB", "1024")) * 1024 * 1024)
+# Multipart boundaries, part headers and form fields on top of the file itself
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+def too_large_detail(max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    return f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB"
+
+
+class UploadSizeLimitMiddleware:
+    """Reject POSTs to `paths` whose body exceeds `max_bytes` (plus multipart overhead)
+
+    A declared Content-Length over the limit is answered at once without
+    reading the body; chunked bodies are counted as they stream in and
+    the request fails as soon as the count passes the limit.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        limit = self.max_bytes + _MULTIPART_OVERHEAD
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            logger.info(f"Rejected {scope['path']} upload of {int(length)} bytes before reading it")
+            await self._reject(send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the body parser; FastAPI turns it into the response
+                    raise HTTPException(status_code=400, detail=too_large_detail(self.max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": too_large_detail(self.max_bytes)}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 400,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), (b"connection", b"close")]
+        })
+        await send({"type": "http.response.body", "body": body})
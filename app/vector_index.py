@@ -0,0 +1,621 @@
+"""
+Vector Index - Embedded vector store on a memory-mapped NumPy matrix
+Embeddings live in a memory-mapped float32/float16/int8 matrix and chunk
+text and metadata in SQLite. Search is vectorized brute force, optionally
+restricted to the nearest IVF partitions for large corpora. Implements the
+LangChain VectorStore interface, so it is a drop-in alternative to Chroma.
+"""
+
+import os
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from langchain_core.documents import Document
+    from langchain_core.vectorstores import VectorStore
+except ImportError:
+    from langchain.schema import Document
+    from langchain.vectorstores.base import VectorStore
+
+logger = logging.getLogger(__name__)
+
+_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+_SEARCH_BLOCK_ROWS = 4096
+# Metadata fields stored in indexed columns, so filters on them never scan the table
+_INDEXED_FIELDS = ("document_id", "collection")
+
+
+def metadata_matches(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Evaluate a Chroma-style filter ({field: value}, {field: {"$in": [...]}}, {"$and": [...]})"""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and "$in" in condition:
+            if metadata.get(key) not in condition["$in"]:
+                return False
+        elif isinstance(condition, dict) and "$eq" in condition:
+            if metadata.get(key) != condition["$eq"]:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _where_sql(where: Dict[str, Any], params: List[Any]) -> str:
+    clauses = []
+    for key, condition in where.items():
+        if key == "$and":
+            clauses.extend(f"({_where_sql(clause, params)})" for clause in condition)
+            continue
+        if not key.isidentifier():
+            raise ValueError(f"Unsupported filter field: {key}")
+        column = key if key in _INDEXED_FIELDS else f"json_extract(metadata, '$.{key}')"
+        if isinstance(condition, dict) and "$in" in condition:
+            values = list(condition["$in"])
+            if not values:
+                clauses.append("0")
+                continue
+            clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        else:
+            clauses.append(f"{column} = ?")
+            params.append(condition["$eq"] if isinstance(condition, dict) else condition)
+    return " AND ".join(clauses) or "1"
+
+
+class MemmapVectorStore(VectorStore):
+    """Cosine-similarity vector store persisted under `path`
+
+    Rows are append-only: a chunk's vector is written to the next free row
+    and deleting it only tombstones the row. `dtype` (float32, float16 or
+    int8 with a per-row scale) is fixed when the index is created.
+    With `ivf_lists > 0`, a k-means coarse quantizer is trained once the
+    store holds enough vectors and queries scan only the `nprobe` closest
+    partitions. Searches accept a Chroma-style metadata `filter`; document_id
+    and collection are indexed columns.
+    With `read_only=True` the store is a replica for other server workers:
+    it never writes, and picks up rows the writer process has committed
+    before each search.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding,
+        dtype: str = "float32",
+        ivf_lists: int = 0,
+        nprobe: int = 8,
+        read_only: bool = False
+    ):
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype} (expected one of {', '.join(_DTYPES)})")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._embedding = embedding
+        self.ivf_lists = ivf_lists
+        self.nprobe = nprobe
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(path, "chunks.sqlite"), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL, metadata TEXT)"
+        )
+        columns = {name for _, name, *_ in self._db.execute("PRAGMA table_info(chunks)")}
+        for name in _INDEXED_FIELDS:
+            if name not in columns:
+                self._db.execute(f"ALTER TABLE chunks ADD COLUMN {name} TEXT")
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS chunks_{name} ON chunks ({name})")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        # An existing index keeps the dtype it was created with
+        self.dtype = meta.get("dtype", dtype)
+        if self.dtype != dtype:
+            logger.warning(f"Vector index at {path} was created as {self.dtype}; ignoring requested {dtype}")
+        self.dim: Optional[int] = int(meta["dim"]) if "dim" in meta else None
+        self._capacity = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+
+        rows = [row for (row,) in self._db.execute("SELECT row FROM chunks")]
+        self._size = max(rows) + 1 if rows else 0
+        self._count = len(rows)
+        self._alive = np.zeros(max(self._size, 1024), dtype=bool)
+        self._alive[rows] = True
+        if self.dim is not None:
+            self._open(max(self._size, 1024))
+
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_count = int(meta.get("ivf_trained_count", 0))
+        self._members: List[List[int]] = []
+        self._member_arrays: Dict[int, np.ndarray] = {}
+        centroids_path = os.path.join(path, "centroids.npy")
+        if os.path.exists(centroids_path) and self._assignments is not None:
+            self._centroids = np.load(centroids_path)
+            self._rebuild_members()
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    # -- storage --
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _memmap(self, name: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+        """Open (creating or growing) a memory-mapped array file"""
+        path = self._file(name)
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self.read_only:
+            return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+        with open(path, "ab") as f:
+            if f.tell() < nbytes:
+                f.truncate(nbytes)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _file_capacity(self) -> int:
+        """Rows the writer has allocated in every array file"""
+        files = [(f"vectors.{self.dtype}", self.dim * np.dtype(_DTYPES[self.dtype]).itemsize), ("assignments.int32", 4)]
+        if self.dtype == "int8":
+            files.append(("scales.float32", 4))
+        return min(
+            os.path.getsize(self._file(name)) // row_bytes if os.path.exists(self._file(name)) else 0
+            for name, row_bytes in files
+        )
+
+    def _open(self, capacity: int):
+        if self.read_only:
+            # The writer grows the files; map what it has allocated
+            capacity = self._file_capacity()
+            if capacity == 0:
+                return
+        self._capacity = capacity
+        self._matrix = self._memmap(f"vectors.{self.dtype}", _DTYPES[self.dtype], (capacity, self.dim))
+        if self.dtype == "int8":
+            self._scales = self._memmap("scales.float32", np.float32, (capacity,))
+        self._assignments = self._memmap("assignments.int32", np.int32, (capacity,))
+
+    def _reserve(self, rows: int):
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, 2 * self._capacity, 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._open(capacity)
+        if len(self._alive) < capacity:
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(_DTYPES[self.dtype]), None
+
+    def _decode(self, rows, matrix: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None) -> np.ndarray:
+        matrix = self._matrix if matrix is None else matrix
+        block = np.asarray(matrix[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            block *= (self._scales if scales is None else scales)[rows][:, None]
+        return block
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    # -- writes --
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(list(zip(texts, self._embedding.embed_documents(texts))), metadatas=metadatas, ids=ids)
+
+    def add_embeddings(self, text_embeddings: Iterable[Tuple[str, List[float]]], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Store precomputed embeddings; ids that already exist are replaced"""
+        self._check_writable()
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        if ids is None:
+            ids = [uuid.uuid4().hex for _ in text_embeddings]
+        metadatas = metadatas or [None] * len(text_embeddings)
+        vectors = self._normalize([vector for _, vector in text_embeddings])
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dtype', ?)", (self.dtype,))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({self.dim})")
+            self.delete([cid for cid in ids if cid is not None], _commit=False)
+
+            start = self._size
+            self._reserve(start + len(ids))
+            rows = slice(start, start + len(ids))
+            encoded, scales = self._encode(vectors)
+            self._matrix[rows] = encoded
+            if scales is not None:
+                self._scales[rows] = scales
+            if self._centroids is not None:
+                lists = self._nearest_lists(vectors, 1)[:, 0]
+                self._assignments[rows] = lists
+                for offset, list_id in enumerate(lists):
+                    self._members[list_id].append(start + offset)
+                    self._member_arrays.pop(int(list_id), None)
+            self._matrix.flush()
+            self._db.executemany(
+                "INSERT INTO chunks (row, id, text, metadata, document_id, collection) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        start + offset, cid, text, json.dumps(metadata) if metadata else None,
+                        (metadata or {}).get("document_id"), (metadata or {}).get("collection")
+                    )
+                    for offset, (cid, (text, _), metadata) in enumerate(zip(ids, text_embeddings, metadatas))
+                ]
+            )
+            self._db.commit()
+            self._alive[rows] = True
+            self._size = start + len(ids)
+            self._count += len(ids)
+            self._maybe_train()
+        return list(ids)
+
+    def delete(self, ids: Optional[List[str]] = None, _commit: bool = True, **kwargs: Any) -> Optional[bool]:
+        self._check_writable()
+        if not ids:
+            return False
+        with self._lock:
+            rows = []
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows.extend(
+                    row for (row,) in self._db.execute(
+                        f"SELECT row FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                    )
+                )
+            if rows:
+                self._db.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+                self._alive[rows] = False
+                self._count -= len(rows)
+            if _commit:
+                self._db.commit()
+        return bool(rows)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Vector index at {self.path} is open read-only; writes go through the writer process")
+
+    # -- reads --
+
+    def refresh(self):
+        """Pick up rows the writer process added or deleted since the last call (read-only replicas)"""
+        if not self.read_only:
+            return
+        with self._lock:
+            # Changes only when another connection has committed
+            version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return
+            self._data_version = version
+            self._db.execute("BEGIN")
+            try:
+                meta = dict(self._db.execute("SELECT key, value FROM meta"))
+                added = [row for (row,) in self._db.execute("SELECT row FROM chunks WHERE row >= ?", (self._size,))]
+                count = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+                reload = self._count + len(added) != count
+                if reload:
+                    # Rows were deleted too: rebuild the live set
+                    added = [row for (row,) in self._db.execute("SELECT row FROM chunks")]
+            finally:
+                self._db.execute("COMMIT")
+            if self.dim is None and "dim" in meta:
+                self.dim = int(meta["dim"])
+                self.dtype = meta.get("dtype", self.dtype)
+            size = max(added) + 1 if added else (0 if reload else self._size)
+            if reload:
+                self._alive = np.zeros(max(size, 1024), dtype=bool)
+            elif len(self._alive) < size:
+                alive = np.zeros(max(size, 2 * len(self._alive)), dtype=bool)
+                alive[:len(self._alive)] = self._alive
+                self._alive = alive
+            self._alive[added] = True
+            self._size = size
+            self._count = count
+            if self.dim is not None and self._size > self._capacity:
+                self._open(self._size)
+
+            trained = int(meta.get("ivf_trained_count", 0))
+            if trained != self._trained_count and os.path.exists(self._file("centroids.npy")):
+                self._trained_count = trained
+                self._centroids = np.load(self._file("centroids.npy"))
+                self._rebuild_members()
+            elif self._centroids is not None and added:
+                if reload:
+                    self._rebuild_members()
+                else:
+                    for row, list_id in zip(added, self._assignments[added]):
+                        self._members[list_id].append(row)
+                        self._member_arrays.pop(int(list_id), None)
+
+    def __len__(self) -> int:
+        self.refresh()
+        return self._count
+
+    def count(self) -> int:
+        self.refresh()
+        return self._count
+
+    def stats(self) -> Dict[str, Any]:
+        """Index statistics without touching the rows"""
+        self.refresh()
+        itemsize = np.dtype(_DTYPES[self.dtype]).itemsize
+        return {
+            "backend": "memmap",
+            "count": self._count,
+            "rows": self._size,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "vector_bytes": self._size * (self.dim or 0) * itemsize,
+            "ivf_lists": len(self._members) if self._centroids is not None else 0
+        }
+
+    def existing_ids(self, ids: Sequence[str]) -> set:
+        found = set()
+        for start in range(0, len(ids), 500):
+            batch = list(ids[start:start + 500])
+            with self._lock:
+                found.update(
+                    cid for (cid,) in self._db.execute(
+                        f"SELECT id FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                    )
+                )
+        return found
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        docs = []
+        for start in range(0, len(ids), 500):
+            batch = list(ids[start:start + 500])
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+            docs.extend(
+                Document(id=cid, page_content=text, metadata=json.loads(metadata) if metadata else {})
+                for cid, text, metadata in rows
+            )
+        return docs
+
+    def _documents(self, rows: List[int]) -> Dict[int, Document]:
+        with self._lock:
+            result = self._db.execute(
+                f"SELECT row, id, text, metadata FROM chunks WHERE row IN ({','.join('?' * len(rows))})", rows
+            ).fetchall()
+        return {
+            row: Document(id=cid, page_content=text, metadata=json.loads(metadata) if metadata else {})
+            for row, cid, text, metadata in result
+        }
+
+    def _filter_rows(self, where: Dict[str, Any]) -> np.ndarray:
+        """Rows matching a metadata filter, resolved in SQLite"""
+        params: List[Any] = []
+        sql = f"SELECT row FROM chunks WHERE {_where_sql(where, params)}"
+        with self._lock:
+            return np.fromiter((row for (row,) in self._db.execute(sql, params)), dtype=np.int64)
+
+    def _search(self, query: np.ndarray, k: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """Top-k (row, cosine similarity) for a normalized query vector
+
+        A `where` filter is resolved to rows first and only those rows are
+        scored (exactly, bypassing IVF), so narrow searches are cheap.
+        """
+        self.refresh()
+        filtered = self._filter_rows(where) if where else None
+        with self._lock:
+            # Growing the index swaps in new memmaps; keep using the ones seen here
+            size, alive, matrix, scales = self._size, self._alive, self._matrix, self._scales
+            if not self._count:
+                return []
+            if filtered is not None:
+                candidates = filtered
+            elif self._centroids is not None:
+                lists = self._nearest_lists(query[None, :], self.nprobe)[0]
+                candidates = np.concatenate([self._member_array(int(list_id)) for list_id in lists])
+            else:
+                candidates = None
+
+        if candidates is not None:
+            candidates = candidates[candidates < size]
+            candidates = candidates[alive[candidates]]
+            if not len(candidates):
+                return []
+            scores = np.empty(len(candidates), dtype=np.float32)
+            for start in range(0, len(candidates), _SEARCH_BLOCK_ROWS):
+                block = candidates[start:start + _SEARCH_BLOCK_ROWS]
+                scores[start:start + len(block)] = self._decode(block, matrix, scales) @ query
+            rows = candidates
+        else:
+            if self.dtype == "float32":
+                scores = np.asarray(matrix[:size] @ query)
+            else:
+                scores = np.empty(size, dtype=np.float32)
+                for start in range(0, size, _SEARCH_BLOCK_ROWS):
+                    end = min(start + _SEARCH_BLOCK_ROWS, size)
+                    scores[start:end] = self._decode(slice(start, end), matrix, scales) @ query
+            scores = np.where(alive[:size], scores, -np.inf)
+            rows = None
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return [(int(rows[i] if rows is not None else i), float(scores[i])) for i in top]
+
+    def _search_many(self, queries: np.ndarray, k: int, where: Optional[Dict[str, Any]] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k (row, cosine similarity) for each row of `queries`
+
+        Exact and filtered searches read each block of the index once and
+        score it against all queries in one matrix product, keeping a running
+        top-k per query. IVF probes different lists per query, so those
+        searches run one at a time.
+        """
+        self.refresh()
+        if self._centroids is not None and not where:
+            return [self._search(query, k) for query in queries]
+        filtered = self._filter_rows(where) if where else None
+        with self._lock:
+            size, alive, matrix, scales = self._size, self._alive, self._matrix, self._scales
+            if not self._count:
+                return [[] for _ in queries]
+        if filtered is not None:
+            filtered = filtered[filtered < size]
+            filtered = filtered[alive[filtered]]
+        total = len(filtered) if filtered is not None else size
+        if not total:
+            return [[] for _ in queries]
+
+        k = min(k, total)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, _SEARCH_BLOCK_ROWS):
+            end = min(start + _SEARCH_BLOCK_ROWS, total)
+            if filtered is not None:
+                rows = filtered[start:end]
+                scores = queries @ self._decode(rows, matrix, scales).T
+            else:
+                rows = np.arange(start, end)
+                scores = queries @ self._decode(slice(start, end), matrix, scales).T
+                scores[:, ~alive[start:end]] = -np.inf
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(rows, (len(queries), len(rows)))], axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                rows = np.take_along_axis(rows, top, axis=1)
+            best_scores, best_rows = scores, rows
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([(int(rows[i]), float(scores[i])) for i in order if np.isfinite(scores[i])])
+        return results
+
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[List[Document]]:
+        """Top-k documents for each of several query vectors, in one pass over the index"""
+        if not len(embeddings):
+            return []
+        hits = self._search_many(self._normalize(embeddings), k, filter)
+        rows = sorted({row for query_hits in hits for row, _ in query_hits})
+        documents = {}
+        # SQLite caps host parameters per statement; fetch in slices
+        for start in range(0, len(rows), 500):
+            documents.update(self._documents(rows[start:start + 500]))
+        return [[documents[row] for row, _ in query_hits if row in documents] for query_hits in hits]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        hits = self._search(self._normalize(embedding)[0], k, filter)
+        if not hits:
+            return []
+        documents = self._documents([row for row, _ in hits])
+        return [(documents[row], score) for row, score in hits if row in documents]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding, metadatas: Optional[List[dict]] = None, *, ids: Optional[List[str]] = None, path: str = "./vector_index", **kwargs: Any) -> "MemmapVectorStore":
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # -- IVF --
+
+    def _nearest_lists(self, vectors: np.ndarray, n: int) -> np.ndarray:
+        scores = vectors @ self._centroids.T
+        n = min(n, scores.shape[1])
+        return np.argpartition(-scores, n - 1, axis=1)[:, :n]
+
+    def _member_array(self, list_id: int) -> np.ndarray:
+        array = self._member_arrays.get(list_id)
+        if array is None:
+            array = self._member_arrays[list_id] = np.array(self._members[list_id], dtype=np.int64)
+        return array
+
+    def _rebuild_members(self):
+        assignments = np.asarray(self._assignments[:self._size])
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+        self._members = [order[bounds[i]:bounds[i + 1]].tolist() for i in range(len(self._centroids))]
+        self._member_arrays = {}
+
+    def _maybe_train(self):
+        # Train once there are ~40 vectors per list; retrain when the store has grown 4x
+        if not self.ivf_lists or self._count < 40 * self.ivf_lists:
+            return
+        if self._centroids is not None and self._count < 4 * self._trained_count:
+            return
+        self.build_ivf()
+
+    @staticmethod
+    def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # Blockwise, so the score matrix stays small with thousands of lists
+        return np.concatenate([
+            np.argmax(vectors[start:start + _SEARCH_BLOCK_ROWS] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), _SEARCH_BLOCK_ROWS)
+        ])
+
+    def build_ivf(self, iterations: int = 10, seed: int = 0):
+        """Train the IVF coarse quantizer (spherical k-means) and assign every row"""
+        self._check_writable()
+        with self._lock:
+            lists = self.ivf_lists
+            live = np.flatnonzero(self._alive[:self._size])
+            if len(live) < lists:
+                return
+            rng = np.random.default_rng(seed)
+            sample = self._decode(np.sort(rng.choice(live, size=min(len(live), 256 * lists), replace=False)))
+            centroids = sample[rng.choice(len(sample), size=lists, replace=False)]
+            for _ in range(iterations):
+                labels = self._nearest_centroid(sample, centroids)
+                counts = np.bincount(labels, minlength=lists)
+                filled = np.flatnonzero(counts)
+                starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+                # Empty lists keep their previous centroid
+                sums = centroids.copy()
+                sums[filled] = np.add.reduceat(sample[np.argsort(labels, kind="stable")], starts, axis=0)
+                centroids = self._normalize(sums)
+            self._centroids = centroids
+            for start in range(0, self._size, _SEARCH_BLOCK_ROWS):
+                end = min(start + _SEARCH_BLOCK_ROWS, self._size)
+                self._assignments[start:end] = self._nearest_centroid(self._decode(slice(start, end)), centroids)
+            self._assignments.flush()
+            np.save(self._file("centroids.npy"), centroids)
+            self._trained_count = self._count
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ivf_trained_count', ?)", (str(self._count),))
+            self._db.commit()
+            self._rebuild_members()
+            logger.info(f"Trained IVF index with {lists} lists on {len(sample)} of {self._count} vectors")
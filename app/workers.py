@@ -0,0 +1,124 @@
+"""
+Workers - Multi-process serving with a single writer
+Uvicorn starts WEB_CONCURRENCY worker processes. One of them holds the
+writer lock and runs ingestion and deletes; the others serve chats from the
+shared vector store (a Chroma server, or the memmap index opened read-only)
+and queue their writes in the shared job table. Conversations, the answer
+cache and the embedding cache live in SQLite files that every worker opens.
+"""
+
+import os
+import sys
+import time
+import shutil
+import socket
+import logging
+import subprocess
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def worker_count() -> int:
+    """Server worker processes, as uvicorn reads them from WEB_CONCURRENCY"""
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def shared_state_path(env: str, filename: str) -> Optional[str]:
+    """Path of a shared SQLite store: `env` if set, else a file next to the vector store with several workers"""
+    path = os.getenv(env)
+    if path or worker_count() == 1:
+        return path
+    return os.path.join(os.getenv("CHROMA_DB_PATH", "./chroma_db"), filename)
+
+
+class WriterLock:
+    """Exclusive lock held for the life of the writer process
+
+    The kernel drops the lock when its holder exits, so a restarted worker
+    can take over. Without fcntl (Windows) every process is a writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        """Take the lock if no other process holds it"""
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            if worker_count() > 1:
+                logger.warning("File locks are unavailable on this platform; every worker will write")
+            self._file = True
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        handle = open(self.path, "a+")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._file = handle
+        return True
+
+    def release(self):
+        if self._file not in (None, True):
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        self._file = None
+
+
+def start_chroma_server(path: str, host: str = "127.0.0.1", port: int = 8001, timeout: float = 30) -> subprocess.Popen:
+    """Run `chroma run` on the persist directory and wait until it accepts connections"""
+    process = subprocess.Popen(
+        [shutil.which("chroma") or os.path.join(os.path.dirname(sys.executable), "chroma"), "run", "--path", path, "--host", host, "--port", str(port)],
+        stdout=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Chroma server exited with code {process.returncode}")
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            logger.info(f"Chroma server for {path} listening on {host}:{port}")
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Chroma server did not start within {timeout:.0f}s")
+
+
+def serve(host: str = "0.0.0.0", port: int = 8000, workers: Optional[int] = None):
+    """Run the API, with a shared Chroma server when several workers use the chroma backend"""
+    import uvicorn
+    workers = workers or worker_count()
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    chroma = None
+    if workers > 1 and os.getenv("VECTOR_STORE", "chroma").lower() == "chroma" and not os.getenv("CHROMA_SERVER_HOST"):
+        # A persistent Chroma client is not safe to open from several processes
+        persist_directory = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+        os.makedirs(persist_directory, exist_ok=True)
+        chroma_port = int(os.getenv("CHROMA_SERVER_PORT", "8001"))
+        chroma = start_chroma_server(persist_directory, port=chroma_port)
+        os.environ["CHROMA_SERVER_HOST"] = "127.0.0.1"
+        os.environ["CHROMA_SERVER_PORT"] = str(chroma_port)
+    try:
+        uvicorn.run("app.main:app", host=host, port=port, workers=workers)
+    finally:
+        if chroma is not None:
+            chroma.terminate()
+            chroma.wait()
@@ -0,0 +1,108 @@
+"""
+Batch question-answering benchmark - one /api/chat call per question vs /api/chat/batch
+
+Ingests a synthetic corpus into the memmap index, then answers the same
+questions twice at the same LLM concurrency: once as separate chats (each
+embeds its query and searches on its own, as hundreds of /api/chat
+round-trips do) and once through the batch path (one embedding call, one
+multi-query search per filter). Embedding calls cost `--embed-latency`
+seconds each, like a remote embeddings API; the LLM answers after
+`--latency` seconds. Reports wall time, embedding calls and the batch's
+retrieval hit rate.
+
+Usage: python -m benchmarks.bench_batch_chat [--questions 300] [--documents 200] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from app.batch_eval import parse_questions, run_batch
+from app.document_processor import DocumentProcessor
+from app.rag_engine import RAGEngine
+from benchmarks.corpus import make_paragraphs
+from benchmarks.fakes import FakeEmbeddings, FakeLLM
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    """FakeEmbeddings that count calls to the model"""
+
+    calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+async def per_question(engine: RAGEngine, questions, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def chat(question):
+        async with semaphore:
+            return await engine.agenerate_response(question["question"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(question) for question in questions))
+    return time.perf_counter() - start
+
+
+async def batched(engine: RAGEngine, questions, concurrency: int):
+    start = time.perf_counter()
+    summary = None
+    async for result in run_batch(engine, questions, concurrency):
+        summary = result.get("summary", summary)
+    return time.perf_counter() - start, summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=30, help="paragraphs per document")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.05, help="LLM latency")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(VECTOR_STORE="memmap", CHROMA_DB_PATH=tmp, ANSWER_CACHE_ENABLED="false")
+        embeddings = CountingEmbeddings()
+        engine = RAGEngine(embeddings=embeddings, llm=FakeLLM(latency=args.latency))
+        processor = DocumentProcessor()
+        documents = [make_paragraphs(args.paragraphs, seed=i) for i in range(args.documents)]
+        for i, paragraphs in enumerate(documents):
+            engine.add_documents(processor.iter_records(f"doc{i}.txt", "\n\n".join(paragraphs).encode()))
+        print(f"corpus      {args.documents} documents, {engine.chunk_count()} chunks")
+
+        # Each question quotes a passage of one paragraph and expects its document
+        rng = random.Random(1)
+        items = []
+        for i in range(args.questions):
+            document = rng.randrange(args.documents)
+            words = rng.choice(documents[document]).rstrip(".").split()
+            start = rng.randrange(len(words) - 24)
+            items.append({"id": i, "question": " ".join(words[start:start + 24]), "expected_sources": [f"doc{document}.txt"]})
+        questions = parse_questions(items)
+
+        # Embeddings are cheap to compute here; only the per-call latency is simulated
+        embeddings.latency = args.embed_latency
+        embeddings.calls = 0
+        elapsed = asyncio.run(per_question(engine, questions, args.concurrency))
+        print(f"per-question {elapsed:6.2f}s  {len(questions) / elapsed:7.1f} q/s  {embeddings.calls} embedding calls")
+
+        embeddings.calls = 0
+        elapsed, summary = asyncio.run(batched(engine, questions, args.concurrency))
+        retrieval = summary["retrieval"]
+        print(f"batch        {elapsed:6.2f}s  {len(questions) / elapsed:7.1f} q/s  {embeddings.calls} embedding calls  "
+              f"hit rate {retrieval['hit_rate']:.2f}  MRR {retrieval['mrr']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
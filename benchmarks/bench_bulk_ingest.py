@@ -0,0 +1,75 @@
+"""
+Bulk ingestion benchmark - one file at a time vs app.bulk_ingest
+
+Writes a directory of synthetic PDF, DOCX and TXT files and indexes it into
+fresh memmap indexes twice: file by file through the single-upload path
+(parse, chunk, then embed and store, before the next file starts), and with
+bulk_ingest.ingest_path, which parses across a process pool while earlier
+files are embedded. Embedding calls cost `--embed-latency` seconds, like a
+remote embeddings API. A second bulk run over the same directory shows the
+cost of skipping files whose content is already indexed.
+
+Usage: python -m benchmarks.bench_bulk_ingest [--files 60] [--workers 4] [--embed-latency 0.05]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from app.bulk_ingest import ingest_path
+from app.document_processor import DocumentProcessor
+from app.rag_engine import RAGEngine
+from benchmarks.corpus import make_documents
+from benchmarks.fakes import FakeEmbeddings, FakeLLM
+
+
+def fresh_engine(tmp: str, name: str, latency: float) -> RAGEngine:
+    os.environ["CHROMA_DB_PATH"] = os.path.join(tmp, name)
+    return RAGEngine(embeddings=FakeEmbeddings(latency=latency), llm=FakeLLM(latency=0))
+
+
+def one_by_one(engine: RAGEngine, directory: str) -> float:
+    processor = DocumentProcessor()
+    start = time.perf_counter()
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename), "rb") as f:
+            engine.add_documents(processor.iter_records(filename, f))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=60, help="files, split evenly across PDF, DOCX and TXT")
+    parser.add_argument("--size", type=int, default=5, help="pages (PDF) or sections (DOCX, TXT) per file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(VECTOR_STORE="memmap", ANSWER_CACHE_ENABLED="false")
+        directory = os.path.join(tmp, "corpus")
+        os.makedirs(directory)
+        total_bytes = 0
+        for file_type in ("pdf", "docx", "txt"):
+            for filename, content in make_documents(args.files // 3, file_type, size=args.size):
+                with open(os.path.join(directory, filename), "wb") as f:
+                    f.write(content)
+                total_bytes += len(content)
+        print(f"corpus       {len(os.listdir(directory))} files, {total_bytes / 1e6:.1f}MB")
+
+        engine = fresh_engine(tmp, "sequential", args.embed_latency)
+        elapsed = one_by_one(engine, directory)
+        print(f"one by one   {elapsed:6.2f}s  {engine.chunk_count() / elapsed:7.1f} chunks/s")
+
+        engine = fresh_engine(tmp, "bulk", args.embed_latency)
+        summary = ingest_path(engine, DocumentProcessor(), directory, workers=args.workers)["summary"]
+        print(f"bulk x{args.workers:<5} {summary['seconds']:6.2f}s  {summary['chunks_per_s']:7.1f} chunks/s  "
+              f"{summary['files_per_s']:6.1f} files/s  {summary['mb_per_s']:.2f} MB/s")
+
+        summary = ingest_path(engine, DocumentProcessor(), directory, workers=args.workers)["summary"]
+        print(f"rerun        {summary['seconds']:6.2f}s  {summary['unchanged']} files unchanged, skipped by content hash")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Chunking throughput benchmark - RecursiveCharacterTextSplitter vs the native chunker
+
+Builds a large TXT document of pseudo-English paragraphs (sentences,
+wrapped lines, blank-line paragraph breaks, markdown headings) and chunks it
+with:
+
+  langchain   a RecursiveCharacterTextSplitter built per call with
+              1000-character chunks, 200 overlap and start indices (the
+              previous DocumentProcessor behaviour)
+  native      Chunker with 256-token chunks and 48 overlap, counting with
+              count_tokens (tiktoken cl100k_base, or ~4 characters per token
+              when its encoding cannot be loaded)
+  native/len  Chunker measuring characters (1000 / 200), for a like-for-like
+              comparison with the character splitter
+
+and the whole TXT ingest path (DocumentProcessor.iter_records) with each.
+Reports MB/s of input text, chunk counts and mean chunk size.
+
+Usage: python -m benchmarks.bench_chunking [--megabytes 20] [--repeat 3]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from app.chunker import Chunker, markdown_sections
+from app.document_processor import DocumentProcessor
+from app import tokens
+from app.tokens import count_tokens
+from benchmarks.corpus import WORDS
+
+
+def make_document(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, size, paragraph = [], 0, 0
+    while size < megabytes * 1_000_000:
+        if paragraph % 40 == 0:
+            heading = f"{'#' * rng.randint(1, 3)} Section {paragraph // 40}\n\n"
+            parts.append(heading)
+            size += len(heading)
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(6, 24))]
+            # Hard-wrapped lines, as in exported text
+            if rng.random() < 0.3:
+                words[rng.randrange(len(words))] += "\n"
+            sentences.append(" ".join(words).capitalize() + ".")
+        text = " ".join(sentences) + "\n\n"
+        parts.append(text)
+        size += len(text)
+        paragraph += 1
+    return "".join(parts)
+
+
+def langchain_split(text: str):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len, add_start_index=True)
+    return [(doc.metadata["start_index"], doc.page_content) for doc in splitter.create_documents([text])]
+
+
+def native_split(chunker: Chunker):
+    def split(text: str):
+        return [chunk for start, end, _ in markdown_sections(text) for chunk in chunker.split(text, start, end)]
+    return split
+
+
+class LangChainProcessor(DocumentProcessor):
+    """DocumentProcessor with the previous splitter, for the ingest path comparison"""
+
+    def _process_txt(self, content, split=None, chunker=None):
+        text = content.decode("utf-8")
+        start = time.perf_counter()
+        chunks = langchain_split(text)
+        if split is not None:
+            split[0] += time.perf_counter() - start
+        return [(offset, chunk, None, None) for offset, chunk in chunks]
+
+
+def timed(fn, arg, repeat: int):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(arg)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = make_document(args.megabytes)
+    content = text.encode("utf-8")
+    megabytes = len(content) / 1_000_000
+    count_tokens("")
+    counter = "tiktoken cl100k_base" if tokens._token_encoder else "~4 characters per token (tiktoken unavailable)"
+    print(f"document    {megabytes:.1f} MB, {text.count(chr(10) * 2)} paragraphs; token counter: {counter}\n")
+
+    splitters = [
+        ("langchain", langchain_split),
+        ("native", native_split(Chunker(256, 48))),
+        ("native/len", native_split(Chunker(1000, 200, count=len))),
+    ]
+    print(f"{'splitter':12} {'MB/s':>7} {'chunks':>8} {'mean chars':>11} {'mean tokens':>12}")
+    for name, split in splitters:
+        seconds, chunks = timed(split, text, args.repeat)
+        texts = [chunk for _, chunk in chunks]
+        sample = texts[::max(1, len(texts) // 2000)]
+        print(
+            f"{name:12} {megabytes / seconds:7.1f} {len(texts):8d} {statistics.mean(map(len, texts)):11.0f} "
+            f"{statistics.mean(map(count_tokens, sample)):12.0f}"
+        )
+
+    print(f"\n{'ingest path':12} {'MB/s':>7}")
+    for name, processor in (("langchain", LangChainProcessor()), ("native", DocumentProcessor(256, 48))):
+        seconds, _ = timed(lambda data: sum(1 for _ in processor.iter_records("bench.txt", data)), content, args.repeat)
+        print(f"{name:12} {megabytes / seconds:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Concurrent chat benchmark - N simultaneous chats against a fake LLM
+
+Compares the blocking `generate_response` path with `agenerate_response`.
+With the async path N concurrent chats should finish in roughly the time
+of a single LLM call instead of N times that.
+
+Usage: python -m benchmarks.bench_concurrent_chat [--concurrency 16] [--latency 0.5]
+"""
+
+import argparse
+import asyncio
+import time
+
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from app.rag_engine import RAGEngine
+from benchmarks.fakes import FakeEmbeddings, FakeLLM
+
+
+def build_engine(latency: float) -> RAGEngine:
+    embeddings = FakeEmbeddings()
+    vector_store = InMemoryVectorStore(embedding=embeddings)
+    vector_store.add_texts([f"Document {i} talks about topic {i % 7}." for i in range(200)])
+    return RAGEngine(embeddings=embeddings, llm=FakeLLM(latency=latency), vector_store=vector_store)
+
+
+async def run_blocking(engine: RAGEngine, concurrency: int) -> float:
+    # Mirrors the old endpoint: a sync call inside an async handler
+    async def handler(i):
+        return engine.generate_response(f"What about topic {i}?")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def run_async(engine: RAGEngine, concurrency: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(engine.agenerate_response(f"What about topic {i}?") for i in range(concurrency)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency in seconds")
+    args = parser.parse_args()
+
+    engine = build_engine(args.latency)
+    single = asyncio.run(run_async(engine, 1))
+    blocking = asyncio.run(run_blocking(engine, args.concurrency))
+    concurrent = asyncio.run(run_async(engine, args.concurrency))
+
+    print(f"{'single call:':<28}{single:.2f}s")
+    print(f"{f'{args.concurrency} chats, blocking path:':<28}{blocking:.2f}s ({blocking / single:.1f}x single)")
+    print(f"{f'{args.concurrency} chats, async path:':<28}{concurrent:.2f}s ({concurrent / single:.1f}x single)")
+    print(f"concurrency limit: {engine.max_concurrent_requests}")
+
+
+if __name__ == "__main__":
+    main()
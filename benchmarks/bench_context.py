@@ -0,0 +1,120 @@
+"""
+Context packing benchmark - fixed top-3 concatenation vs token-budgeted packing
+
+Documents are sequences of pseudo-English paragraphs, chunked by
+DocumentProcessor (256 tokens, 48 overlap) and ingested into an
+in-memory RAGEngine with hybrid retrieval; a share of documents is also
+uploaded a second time as a lightly edited copy, as happens with revised
+files. Each query is eight words from one paragraph. Per strategy:
+
+  tokens     prompt context tokens (tiktoken cl100k_base)
+  distinct   distinct word trigrams in the context - overlap between chunks
+             and near-duplicate copies spend tokens without adding any
+  per token  distinct trigrams per context token
+  target     share of the queried paragraph's trigrams in the context (when
+             an edited copy outranks the original, the original is dropped
+             as a near-duplicate and the copy's edits count as misses)
+
+Strategies: "top3" joins the first three retrieved chunks (the previous
+behaviour); "packed" fills a token budget from the top eight, stitching
+overlapping chunks of a document and dropping near-duplicates, once at
+the default 800-token budget and once at top3's average cost.
+
+Usage: python -m benchmarks.bench_context [--documents 200] [--queries 300]
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import tempfile
+
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from app.context_builder import ContextBuilder
+from app.document_processor import DocumentProcessor
+from app.rag_engine import RAGEngine
+from app.tokens import count_tokens
+from benchmarks.bench_retrieval import make_vocabulary
+from benchmarks.fakes import FakeEmbeddings, FakeLLM
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def trigrams(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def make_documents(count: int, paragraphs: int, copies: float, seed: int = 0):
+    """(filename, paragraphs) pairs; a share of documents gets an edited copy"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(3000, rng)
+    documents = []
+    for i in range(count):
+        body = [
+            " ".join(rng.choice(vocabulary) for _ in range(rng.randint(40, 90))).capitalize() + "."
+            for _ in range(paragraphs)
+        ]
+        documents.append((f"doc{i}.txt", body))
+        if rng.random() < copies:
+            edited = [
+                " ".join(word if rng.random() > 0.02 else rng.choice(vocabulary) for word in paragraph.split())
+                for paragraph in body
+            ]
+            documents.append((f"doc{i}-revised.txt", edited))
+    return documents
+
+
+def evaluate(engine: RAGEngine, queries, builder, k: int):
+    engine.context_builder, engine.retrieval_k = builder, k
+    tokens, distinct, target = [], [], []
+    for query, paragraph in queries:
+        chunks, _ = engine._retrieve(query, True)
+        context = "\n\n".join(chunks)
+        context_trigrams = trigrams(context)
+        expected = trigrams(paragraph)
+        tokens.append(count_tokens(context))
+        distinct.append(len(context_trigrams))
+        target.append(len(expected & context_trigrams) / len(expected))
+    return statistics.mean(tokens), statistics.mean(distinct), statistics.mean(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=12, help="paragraphs per document")
+    parser.add_argument("--copies", type=float, default=0.3, help="share of documents with an edited copy")
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    os.environ["CHROMA_DB_PATH"] = tempfile.mkdtemp()
+    embeddings = FakeEmbeddings()
+    engine = RAGEngine(embeddings=embeddings, llm=FakeLLM(latency=0), vector_store=InMemoryVectorStore(embeddings))
+    processor = DocumentProcessor()
+    documents = make_documents(args.documents, args.paragraphs, args.copies)
+    for filename, paragraphs in documents:
+        engine.add_documents(processor.iter_records(filename, "\n\n".join(paragraphs).encode()))
+    print(f"corpus      {len(documents)} documents, {engine.chunk_count()} chunks")
+
+    rng = random.Random(1)
+    queries = []
+    for _ in range(args.queries):
+        _, paragraphs = rng.choice(documents)
+        paragraph = rng.choice(paragraphs)
+        queries.append((" ".join(rng.sample(paragraph.split(), 8)), paragraph))
+
+    baseline = evaluate(engine, queries, None, 3)
+    results = [
+        ("top3", baseline),
+        ("packed 800", evaluate(engine, queries, ContextBuilder(800, count_tokens), 8)),
+        (f"packed {int(baseline[0])}", evaluate(engine, queries, ContextBuilder(int(baseline[0]), count_tokens), 8)),
+    ]
+    print(f"\n{'strategy':12} {'tokens':>7} {'distinct':>9} {'per token':>10} {'target':>7}")
+    for name, (tokens, distinct, target) in results:
+        print(f"{name:12} {tokens:7.0f} {distinct:9.0f} {distinct / tokens:10.3f} {target:7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+LLM router benchmark - single backend vs routed failover and hedging
+
+Two scenarios against local fake LLMs:
+
+  failover  the primary fails a share of calls with a 429 (--failure-rate)
+            and is down completely for the middle third of the run; the
+            secondary is healthy but slower. Reports failed requests and
+            latency for the primary alone and for the router.
+  hedging   two backends with the same latency tail (--slow-rate of calls
+            take --slow-latency); reports p50/p95/p99 with hedging off and
+            on, and the extra calls hedging sent.
+
+Usage: python -m benchmarks.bench_llm_router [--requests 600] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+from app.llm_router import Backend, LLMRouter
+from benchmarks.fakes import FakeLLM
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(llm, requests: int, concurrency: int, on_request=None):
+    """(latencies of successful requests, failed requests)"""
+    latencies, failures = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal failures
+        for i in counter:
+            if on_request:
+                on_request(i)
+            start = time.perf_counter()
+            try:
+                await llm.ainvoke("What is in the report?")
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, failures
+
+
+def report(name: str, latencies, failures: int, extra: str = ""):
+    print(
+        f"{name:18} failed {failures:4d}  p50 {percentile(latencies, 0.5) * 1000:6.0f}ms  "
+        f"p95 {percentile(latencies, 0.95) * 1000:6.0f}ms  p99 {percentile(latencies, 0.99) * 1000:6.0f}ms  "
+        f"mean {statistics.mean(latencies) * 1000:6.0f}ms{extra}"
+    )
+
+
+async def failover(args):
+    print(f"failover: primary fails {args.failure_rate:.0%} of calls and is down for the middle third")
+
+    def outage(primary):
+        def on_request(i):
+            primary.failure_rate = 1.0 if args.requests // 3 <= i < 2 * args.requests // 3 else args.failure_rate
+        return on_request
+
+    primary = FakeLLM(latency=args.latency, failure_rate=args.failure_rate, answer="primary")
+    report("primary only", *await run(primary, args.requests, args.concurrency, outage(primary)))
+
+    primary = FakeLLM(latency=args.latency, failure_rate=args.failure_rate, answer="primary")
+    router = LLMRouter([
+        Backend("primary", primary, timeout=5, cooldown=args.cooldown),
+        Backend("secondary", FakeLLM(latency=args.latency * 2, answer="secondary"), timeout=5, cooldown=args.cooldown)
+    ])
+    report("router", *await run(router, args.requests, args.concurrency, outage(primary)))
+    print("  " + ", ".join(f"{s['name']}: {s['requests']} calls, {s['error_rate']:.0%} errors, {s['state']}" for s in router.stats()))
+
+
+async def hedging(args):
+    print(f"\nhedging: {args.slow_rate:.0%} of calls take {args.slow_latency * 1000:.0f}ms instead of {args.latency * 1000:.0f}ms")
+    for hedge in (False, True):
+        backends = [
+            Backend(name, FakeLLM(latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency), timeout=30)
+            for name in ("a", "b")
+        ]
+        router = LLMRouter(backends, hedge=hedge)
+        # Warm up the latency windows so the p95 hedge threshold is known
+        await run(router, 100, args.concurrency)
+        warmup_hedges = router.hedges
+        latencies, failures = await run(router, args.requests, args.concurrency)
+        extra = f"  extra calls {(router.hedges - warmup_hedges) / args.requests:.1%}" if hedge else ""
+        report("hedge on" if hedge else "hedge off", latencies, failures, extra)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--cooldown", type=float, default=0.5, help="circuit breaker cooldown in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    args = parser.parse_args()
+    random.seed(0)
+    # Every failover is logged; keep the report readable
+    logging.getLogger("app.llm_router").setLevel(logging.ERROR)
+    asyncio.run(failover(args))
+    asyncio.run(hedging(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Micro-batching benchmark - local models called per request vs micro-batched
+
+Runs CPU stand-ins for a local sentence-transformer (query embedding) and a
+local HuggingFacePipeline (generation) from `--concurrency` threads, each
+issuing single requests back to back, once calling the model directly (one
+forward pass per request, as before) and once through the micro-batcher.
+Reports throughput and latency per concurrency level.
+
+Usage: python -m benchmarks.bench_micro_batching [--concurrency 1,8,32] [--seconds 3]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from app.micro_batcher import BatchedEmbeddings, BatchedLLM
+from benchmarks.fakes import CPUEmbeddings, CPULLM
+
+
+def measure(call, concurrency: int, seconds: float):
+    """(requests per second, p50, p95 latency in ms) of `concurrency` callers for `seconds`"""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(index: int):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            call(f"question {index} about the report")
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies) * 1000, latencies[int(0.95 * (len(latencies) - 1))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each run")
+    parser.add_argument("--wait-ms", type=float, default=5.0, help="batching window")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    embeddings = CPUEmbeddings()
+    llm = CPULLM()
+    models = [
+        ("embed_query", embeddings.embed_query, BatchedEmbeddings(embeddings, 32, args.wait_ms).embed_query),
+        ("generate", llm.invoke, BatchedLLM(llm=llm, max_batch_size=32, max_wait_ms=args.wait_ms).invoke),
+    ]
+    print(f"{'model':12} {'callers':>7} {'mode':8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, direct, batched in models:
+        for concurrency in levels:
+            for mode, call in (("direct", direct), ("batched", batched)):
+                throughput, p50, p95 = measure(call, concurrency, args.seconds)
+                print(f"{name:12} {concurrency:7d} {mode:8} {throughput:8.1f} {p50:8.1f} {p95:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
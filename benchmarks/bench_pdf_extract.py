@@ -0,0 +1,96 @@
+"""
+PDF extraction benchmark - streaming / parallel extractor vs the original
+
+Builds a synthetic PDF (1,000 pages by default) and runs each mode in a
+fresh subprocess, reporting wall time and peak RSS:
+
+  legacy     the original `_process_pdf`: `text += page.extract_text()`
+             for every page, then chunk the whole string
+  streaming  DocumentProcessor.iter_chunks, single process
+  parallel   DocumentProcessor.iter_chunks with a process pool
+
+Chunks are consumed one by one and dropped, as the ingest pipeline does.
+
+Usage: python -m benchmarks.bench_pdf_extract [--pages 1000] [--workers N]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+
+def legacy_chunks(processor, content: bytes):
+    from pypdf import PdfReader
+    pdf_reader = PdfReader(BytesIO(content))
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text() + "\n"
+    return processor._chunk_text(text)
+
+
+def run_mode(mode: str, path: str, workers: int) -> dict:
+    os.environ["PDF_WORKERS"] = str(workers if mode == "parallel" else 1)
+    os.environ["PDF_PARALLEL_MIN_PAGES"] = "1"
+    from app.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor()
+    with open(path, "rb") as f:
+        content = f.read()
+
+    start = time.perf_counter()
+    if mode == "legacy":
+        count = len(legacy_chunks(processor, content))
+    else:
+        count = sum(1 for _ in processor.iter_chunks("bench.pdf", content))
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on Linux
+    return {
+        "mode": mode,
+        "chunks": count,
+        "seconds": round(elapsed, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "worker_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.path, args.workers)))
+        return
+
+    from benchmarks.corpus import make_pdf
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(make_pdf(args.pages))
+        path = f.name
+    try:
+        print(f"{args.pages}-page PDF ({os.path.getsize(path) / 1e6:.1f} MB), {args.workers} workers")
+        for mode in ("legacy", "streaming", "parallel"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_pdf_extract", "--mode", mode, "--path", path,
+                 "--workers", str(args.workers)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<10} {result['seconds']:7.2f}s  peak RSS {result['peak_rss_mb']:7.1f} MB  "
+                  f"(workers {result['worker_peak_rss_mb']:.1f} MB)  {result['chunks']} chunks")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Retrieval quality and latency benchmark - vector-only vs BM25-only vs hybrid
+
+Builds a synthetic corpus where every chunk is pseudo-English text that also
+mentions an identifier (error code, part number) and a name. Each query
+targets one chunk, so recall@k is the fraction of queries whose chunk is in
+the top k. Three query sets are run:
+
+  exact     "what does error E-004213 mean" - the identifier is the only signal
+  name      "who is Kalo Mirute" - a rare proper name
+  topical   a handful of words sampled from the chunk's text
+
+Vector search is brute-force cosine over FakeEmbeddings (hashed
+bag-of-words) vectors; hybrid fuses the top candidates of both retrievers
+with reciprocal-rank fusion, as RAGEngine does with RETRIEVAL_MODE=hybrid.
+
+Usage: python -m benchmarks.bench_retrieval [--chunks 100000] [--queries 500] [--k 3]
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.bm25_index import BM25Index, reciprocal_rank_fusion
+from benchmarks.fakes import FakeEmbeddings
+
+_SYLLABLES = "ka lo mi ne ru sa te vo zi pa qu re ti no la be do fi gu ha".split()
+
+
+def make_vocabulary(size: int, rng: random.Random) -> List[str]:
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(vocabulary)
+
+
+def make_corpus(count: int, words: int, seed: int = 0) -> Tuple[List[str], List[str], List[str]]:
+    """Chunks plus the identifier and name each one mentions"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(5000, rng)
+    # Zipf-like word frequencies, as in natural text
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    codes = [f"{rng.choice('EPX')}-{i:06d}" for i in range(count)]
+    names = [f"{rng.choice(vocabulary).capitalize()} {rng.choice(vocabulary).capitalize()}" for _ in range(count)]
+    chunks = []
+    for i in range(count):
+        body = rng.choices(vocabulary, weights=weights, k=words)
+        middle = words // 2
+        chunks.append(
+            " ".join(body[:middle]) + f" error {codes[i]} reported by {names[i]} " + " ".join(body[middle:]) + "."
+        )
+    return chunks, codes, names
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    return float(np.percentile(np.array(values), pct))
+
+
+def evaluate(search: Callable[[str], List[int]], queries: List[Tuple[str, int]], k: int) -> Tuple[float, float, float]:
+    hits, latencies = 0, []
+    for query, target in queries:
+        start = time.perf_counter()
+        results = search(query)[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += target in results
+    return hits / len(queries), percentile(latencies, 50), percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--words", type=int, default=60, help="words per chunk")
+    parser.add_argument("--queries", type=int, default=500, help="queries per query set")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=20, help="per-retriever candidates fused in hybrid mode")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    chunks, codes, names = make_corpus(args.chunks, args.words)
+    ids = [str(i) for i in range(len(chunks))]
+    print(f"corpus      {len(chunks)} chunks generated in {time.perf_counter() - start:.1f}s")
+
+    embeddings = FakeEmbeddings()
+    start = time.perf_counter()
+    matrix = np.array(embeddings.embed_documents(chunks), dtype=np.float32)
+    print(f"vectors     embedded in {time.perf_counter() - start:.1f}s")
+
+    index = BM25Index()
+    start = time.perf_counter()
+    for i in range(0, len(chunks), 1000):
+        index.add(ids[i:i + 1000], chunks[i:i + 1000])
+    print(f"bm25        indexed in {time.perf_counter() - start:.1f}s")
+
+    def vector_search(query: str, k: int = args.candidates) -> List[int]:
+        scores = matrix @ np.array(embeddings.embed_query(query), dtype=np.float32)
+        top = np.argpartition(-scores, k)[:k]
+        return top[np.argsort(-scores[top])].tolist()
+
+    def bm25_search(query: str, k: int = args.candidates) -> List[int]:
+        return [int(cid) for cid, _ in index.search(query, k=k)]
+
+    def hybrid_search(query: str) -> List[int]:
+        rankings = [[str(i) for i in vector_search(query)], [str(i) for i in bm25_search(query)]]
+        return [int(cid) for cid, _ in reciprocal_rank_fusion(rankings)]
+
+    rng = random.Random(1)
+    targets = rng.sample(range(len(chunks)), args.queries)
+    query_sets = {
+        "exact": [(f"what does error {codes[t]} mean", t) for t in targets],
+        "name": [(f"who is {names[t]}", t) for t in targets],
+        "topical": [(" ".join(rng.sample(chunks[t].split(), 8)), t) for t in targets],
+    }
+
+    print(f"\n{'mode':8} {'queries':8} {f'recall@{args.k}':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, search in (("vector", vector_search), ("bm25", bm25_search), ("hybrid", hybrid_search)):
+        for name, queries in query_sets.items():
+            recall, p50, p99 = evaluate(search, queries, args.k)
+            print(f"{mode:8} {name:8} {recall:9.3f} {p50:8.2f} {p99:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
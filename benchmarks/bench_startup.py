@@ -0,0 +1,85 @@
+"""
+Startup benchmark - time to liveness and readiness, per component
+
+Runs in a fresh subprocess each time and reports:
+  import      importing app.main (the server can answer /health/live after this)
+  sequential  embeddings, LLM and vector store initialized one after another
+  parallel    RAGEngine.initialize(), with its per-component breakdown
+
+Components are initialized from the current environment (.env). With
+--simulate SECONDS each initializer additionally sleeps that long, standing
+in for a model download/load on the fallback paths.
+
+Usage: python -m benchmarks.bench_startup [--simulate 0]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def measure(mode: str, simulate: float) -> dict:
+    start = time.perf_counter()
+    from app import main
+    import_seconds = time.perf_counter() - start
+    from app.rag_engine import RAGEngine
+
+    if simulate:
+        for name in ("_initialize_embeddings", "_initialize_llm", "_open_chroma_client"):
+            original = getattr(RAGEngine, name)
+
+            def slow(self, *args, _original=original, **kwargs):
+                time.sleep(simulate)
+                return _original(self, *args, **kwargs)
+            setattr(RAGEngine, name, slow)
+
+    engine = main.rag_engine
+    start = time.perf_counter()
+    if mode == "sequential":
+        timings = {}
+        for name, fn in (("embeddings", engine._initialize_embeddings_with_cache), ("llm", engine._initialize_llm)):
+            stage = time.perf_counter()
+            fn()
+            timings[name] = round(time.perf_counter() - stage, 3)
+        stage = time.perf_counter()
+        engine._initialize_vector_store(engine._open_chroma_client())
+        timings["vector_store"] = round(time.perf_counter() - stage, 3)
+    else:
+        engine.initialize()
+        timings = dict(engine.startup_timings)
+    timings.pop("total", None)
+    return {
+        "mode": mode,
+        "import_seconds": round(import_seconds, 3),
+        "init_seconds": round(time.perf_counter() - start, 3),
+        "components": timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--simulate", type=float, default=0.0, help="extra seconds per initializer")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.simulate)))
+        return
+
+    env = dict(os.environ, CHROMA_DB_PATH=tempfile.mkdtemp(), UPLOAD_DIR=tempfile.mkdtemp())
+    for mode in ("sequential", "parallel"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--mode", mode, "--simulate", str(args.simulate)],
+            check=True, capture_output=True, text=True, env=env
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        components = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in result["components"].items())
+        print(f"{mode:<10} import {result['import_seconds']:.2f}s  init {result['init_seconds']:.2f}s  ({components})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Time-to-first-token benchmark - buffered /api/chat vs streamed /api/chat/stream
+
+Serves the FastAPI app with uvicorn on a local port, using a fake LLM that emits one word per
+`--token-latency` seconds after `--latency` seconds, and reports the time the
+user waits before seeing any text on each endpoint.
+
+Usage: python -m benchmarks.bench_ttft [--requests 10] [--latency 0.3] [--token-latency 0.05]
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from app import main
+from app.rag_engine import RAGEngine
+from benchmarks.fakes import FakeEmbeddings, FakeLLM
+
+ANSWER = " ".join(f"word{i}" for i in range(40))
+
+
+async def buffered_latency(client: httpx.AsyncClient) -> float:
+    start = time.perf_counter()
+    response = await client.post("/api/chat", json={"message": "What is topic 3?"})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def streamed_latency(client: httpx.AsyncClient):
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", "/api/chat/stream", json={"message": "What is topic 3?"}) as response:
+        async for line in response.aiter_lines():
+            if first is None and line.startswith("event: token"):
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def start_server() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run(args):
+    embeddings = FakeEmbeddings()
+    vector_store = InMemoryVectorStore(embedding=embeddings)
+    vector_store.add_texts([f"Document {i} talks about topic {i % 7}." for i in range(200)])
+    main.rag_engine = RAGEngine(
+        embeddings=embeddings,
+        llm=FakeLLM(latency=args.latency, token_latency=args.token_latency, answer=ANSWER),
+        vector_store=vector_store
+    )
+
+    # A real socket: in-process ASGI transports buffer the whole response body
+    base_url = start_server()
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        buffered = [await buffered_latency(client) for _ in range(args.requests)]
+        streamed = [await streamed_latency(client) for _ in range(args.requests)]
+
+    ttft = [first for first, _ in streamed]
+    total = [t for _, t in streamed]
+    print(f"/api/chat         first text after p50 {statistics.median(buffered) * 1000:7.1f} ms")
+    print(f"/api/chat/stream  first text after p50 {statistics.median(ttft) * 1000:7.1f} ms "
+          f"(complete after {statistics.median(total) * 1000:.1f} ms)")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.05, help="fake LLM time per token (s)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
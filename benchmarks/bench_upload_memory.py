@@ -0,0 +1,178 @@
+"""
+Upload memory benchmark - server peak RSS while large uploads arrive concurrently
+
+Serves the API in a subprocess and posts several large TXT files at once,
+first to /api/upload-document (spooled to disk and copied in blocks) and then,
+in a fresh server, to a route that reads each upload into memory the way the
+endpoint used to. Ingestion is held back (the engine never initializes) so
+only the upload path is measured. Peak RSS growth is read from
+/proc/<pid>/status; the streaming path must stay under --max-growth-mb
+whatever the upload sizes, and the run fails otherwise. Also times the
+rejection of an upload over MAX_UPLOAD_MB, which is answered from its
+Content-Length before the body is read.
+
+Usage: python -m benchmarks.bench_upload_memory [--uploads 4] [--megabytes 40] [--max-growth-mb 32]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.corpus import make_paragraphs
+
+LEGACY_PATH = "/bench/read-upload"
+
+
+def create_app():
+    """App factory run in the server: uploads queue up but are never ingested"""
+    from fastapi import File, Form, UploadFile
+    from app import main
+    main.rag_engine.initialize = lambda: None
+
+    @main.app.post(LEGACY_PATH, status_code=202)
+    async def read_upload(file: UploadFile = File(...), collection: str = Form(main.DEFAULT_COLLECTION)):
+        # The previous endpoint: the whole upload as one bytes object
+        content = await file.read()
+        return {"job_id": main.ingest_queue.submit(file.filename, content, collection=collection)}
+
+    return main.app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def memory_kb(pid: int) -> dict:
+    """VmRSS and VmHWM (peak RSS) of a process, in KiB"""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "VmHWM"):
+                values[name] = int(value.split()[0])
+    return values
+
+
+def write_upload(path: str, megabytes: int):
+    paragraph = "\n\n".join(make_paragraphs(50)).encode() + b"\n\n"
+    with open(path, "wb") as f:
+        while f.tell() < megabytes * 1024 * 1024:
+            f.write(paragraph)
+
+
+class Server:
+    def __init__(self, env: dict):
+        self.port = free_port()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "benchmarks.bench_upload_memory:create_app", "--factory",
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            env=env, stderr=subprocess.DEVNULL
+        )
+        self.url = f"http://127.0.0.1:{self.port}"
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                httpx.get(f"{self.url}/health/live").raise_for_status()
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("Server did not start within 60s")
+                time.sleep(0.05)
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            # Ingest workers are still waiting for the engine
+            self.process.kill()
+            self.process.wait()
+
+
+async def upload_all(url: str, path: str, files: list):
+    async def upload(client, name):
+        with open(name, "rb") as f:
+            response = await client.post(path, files={"file": (os.path.basename(name), f, "text/plain")})
+        response.raise_for_status()
+
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        await asyncio.gather(*(upload(client, name) for name in files))
+
+
+def measure(env: dict, path: str, files: list) -> tuple:
+    """Seconds for the concurrent uploads and the server's peak RSS growth in MB"""
+    server = Server(env)
+    try:
+        before = memory_kb(server.process.pid)
+        start = time.perf_counter()
+        asyncio.run(upload_all(server.url, path, files))
+        elapsed = time.perf_counter() - start
+        after = memory_kb(server.process.pid)
+    finally:
+        server.stop()
+    return elapsed, (after["VmHWM"] - before["VmRSS"]) / 1024
+
+
+def time_rejection(env: dict, name: str) -> tuple:
+    server = Server(env)
+    try:
+        start = time.perf_counter()
+        try:
+            with open(name, "rb") as f:
+                status = httpx.post(f"{server.url}/api/upload-document", files={"file": ("big.txt", f)}, timeout=60).status_code
+        except httpx.TransportError:
+            # The server answered and closed before the client finished sending
+            status = "connection closed"
+        return time.perf_counter() - start, status
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=4, help="concurrent uploads")
+    parser.add_argument("--megabytes", type=int, default=40, help="size of each upload")
+    parser.add_argument("--max-growth-mb", type=float, default=32, help="allowed peak RSS growth of the streaming path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            CHROMA_DB_PATH=os.path.join(tmp, "db"),
+            UPLOAD_DIR=os.path.join(tmp, "uploads"),
+            MAX_UPLOAD_MB=str(args.megabytes + 10),
+            WEB_CONCURRENCY="1"
+        )
+        files = []
+        for i in range(args.uploads):
+            files.append(os.path.join(tmp, f"upload{i}.txt"))
+            write_upload(files[-1], args.megabytes)
+        print(f"uploads     {args.uploads} x {args.megabytes}MB at once")
+
+        elapsed, streamed = measure(env, "/api/upload-document", files)
+        print(f"streaming   {elapsed:6.2f}s  peak RSS +{streamed:7.1f}MB")
+        elapsed, legacy = measure(env, LEGACY_PATH, files)
+        print(f"read whole  {elapsed:6.2f}s  peak RSS +{legacy:7.1f}MB")
+
+        oversized = os.path.join(tmp, "oversized.txt")
+        with open(oversized, "wb") as f:
+            f.truncate((args.megabytes + 100) * 1024 * 1024)
+        elapsed, status = time_rejection(env, oversized)
+        print(f"oversized   {elapsed * 1000:6.1f}ms  {status}")
+
+    if streamed > args.max_growth_mb:
+        raise SystemExit(f"Streaming uploads grew peak RSS by {streamed:.1f}MB, over the {args.max_growth_mb}MB bound")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Vector store benchmark - built-in memory-mapped index vs Chroma
+
+For each corpus size, every backend runs in a fresh subprocess that ingests
+clustered synthetic 384-d vectors in batches of 1,000 (the way
+RAGEngine._write_embeddings stores precomputed embeddings), then runs
+single-vector queries. Reported per run: ingest rate, query p50/p99, peak
+RSS, and recall@10 against exact float32 search (approximate modes lose
+some recall in exchange for memory or speed):
+
+  chroma        langchain Chroma on a PersistentClient (HNSW, cosine space)
+  memmap-f32    MemmapVectorStore, float32 brute force
+  memmap-f16    float16 matrix (half the disk and page cache; NumPy's
+                float16 conversion makes scans slower than float32)
+  memmap-int8   int8 matrix with per-row scales (a quarter)
+  memmap-ivf    float32 with IVF partitioning (sqrt(n) lists, nprobe 8)
+
+Vectors are regenerated per batch from a seed, so the harness itself never
+holds the corpus in memory.
+
+Usage: python -m benchmarks.bench_vector_store [--sizes 10000,100000,1000000] [--backends chroma,memmap-f32,...]
+"""
+
+import argparse
+import json
+import math
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DIM = 384
+BATCH = 1000
+CLUSTERS = 256
+
+
+def _centers() -> np.ndarray:
+    return np.random.default_rng(0).normal(size=(CLUSTERS, DIM)).astype(np.float32)
+
+
+def make_batch(index: int, size: int, centers: np.ndarray) -> np.ndarray:
+    rng = np.random.default_rng(1000 + index)
+    return centers[rng.integers(0, CLUSTERS, size)] + rng.normal(scale=0.8, size=(size, DIM)).astype(np.float32)
+
+
+def make_queries(count: int, centers: np.ndarray) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    return centers[rng.integers(0, CLUSTERS, count)] + rng.normal(scale=0.8, size=(count, DIM)).astype(np.float32)
+
+
+def exact_top_k(size: int, queries: np.ndarray, k: int, centers: np.ndarray):
+    """Ground-truth ids by streaming over the regenerated corpus"""
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), k), dtype=np.int64)
+    for batch, start in enumerate(range(0, size, BATCH)):
+        vectors = make_batch(batch, min(BATCH, size - start), centers)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        scores = np.concatenate([best_scores, queries @ vectors.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + len(vectors)), (len(queries), len(vectors)))], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    return [set(row.tolist()) for row in best_ids]
+
+
+def make_store(backend: str, path: str, size: int):
+    from benchmarks.fakes import FakeEmbeddings
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        return Chroma(
+            persist_directory=path, embedding_function=FakeEmbeddings(size=DIM),
+            collection_metadata={"hnsw:space": "cosine"}
+        )
+    from app.vector_index import MemmapVectorStore
+    dtype = {"memmap-f16": "float16", "memmap-int8": "int8"}.get(backend, "float32")
+    ivf_lists = int(math.sqrt(size)) if backend == "memmap-ivf" else 0
+    return MemmapVectorStore(path, FakeEmbeddings(size=DIM), dtype=dtype, ivf_lists=ivf_lists)
+
+
+def run(backend: str, size: int, queries: int, path: str) -> dict:
+    centers = _centers()
+    store = make_store(backend, path, size)
+
+    start = time.perf_counter()
+    for batch, offset in enumerate(range(0, size, BATCH)):
+        vectors = make_batch(batch, min(BATCH, size - offset), centers).tolist()
+        ids = [str(i) for i in range(offset, offset + len(vectors))]
+        texts = [f"chunk {i}" for i in ids]
+        if backend == "chroma":
+            store._collection.upsert(ids=ids, embeddings=vectors, documents=texts)
+        else:
+            store.add_embeddings(list(zip(texts, vectors)), ids=ids)
+    ingest_seconds = time.perf_counter() - start
+
+    query_vectors = make_queries(queries, centers)
+    latencies, results = [], []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        docs = store.similarity_search_by_vector(vector.tolist(), k=10)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({int(doc.page_content.split()[1]) for doc in docs})
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    truth = exact_top_k(size, query_vectors, 10, centers)
+    recall = sum(len(found & expected) for found, expected in zip(results, truth)) / (10 * len(truth))
+    return {
+        "backend": backend,
+        "size": size,
+        "ingest_per_s": round(size / ingest_seconds),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "recall_at_10": round(recall, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--backends", default="chroma,memmap-f32,memmap-f16,memmap-int8,memmap-ivf")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        backend, size = args.run.split(":")
+        print(json.dumps(run(backend, int(size), args.queries, args.path)))
+        return
+
+    print(f"{'backend':12} {'chunks':>8} {'ingest/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'recall@10':>9}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        for backend in args.backends.split(","):
+            workdir = tempfile.mkdtemp()
+            try:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_vector_store", "--run", f"{backend}:{size}",
+                     "--path", workdir, "--queries", str(args.queries)],
+                    check=True, capture_output=True, text=True
+                ).stdout
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{backend:12} {size:8d} {result['ingest_per_s']:9d} {result['p50_ms']:8.2f} {result['p99_ms']:8.2f} "
+                  f"{result['peak_rss_mb']:8.1f} {result['recall_at_10']:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
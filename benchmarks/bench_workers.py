@@ -0,0 +1,142 @@
+"""
+Multi-worker benchmark - chat throughput at 1, 2, 4 and 8 server workers
+
+Ingests a corpus into the memmap vector index in a temporary directory, then
+serves the API with uvicorn at each worker count (one writer, the rest
+read-only replicas of the same index) using CPU stand-ins for a local
+embedding model and LLM, and drives /api/chat at a fixed concurrency.
+Throughput can only grow with the worker count up to the number of cores.
+
+Usage: python -m benchmarks.bench_workers [--workers 1,2,4,8] [--requests 400] [--concurrency 32]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.corpus import make_paragraphs
+from benchmarks.fakes import CPUEmbeddings, CPULLM
+
+
+def create_app():
+    """App factory run in each server worker: local CPU models instead of downloads"""
+    from app import main
+    main.rag_engine.embeddings = CPUEmbeddings()
+    main.rag_engine.llm = CPULLM()
+    return main.app
+
+
+def build_index(documents: int, paragraphs: int):
+    from app.document_processor import DocumentProcessor
+    from app.rag_engine import RAGEngine
+    engine = RAGEngine(embeddings=CPUEmbeddings(), llm=CPULLM())
+    processor = DocumentProcessor()
+    for i in range(documents):
+        text = "\n\n".join(make_paragraphs(paragraphs, seed=i))
+        engine.add_documents(processor.iter_records(f"doc{i}.txt", text.encode()))
+    return engine.chunk_count()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client: httpx.AsyncClient, workers: int, timeout: float = 120):
+    """Poll /health until every worker process has answered as initialized"""
+    ready = set()
+    deadline = time.monotonic() + timeout
+    while len(ready) < workers:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Only {len(ready)} of {workers} workers became ready")
+        try:
+            # A new connection each time, so the kernel hands it to any worker
+            health = (await client.get("/health", headers={"Connection": "close"})).json()
+            if health["initialized"]:
+                ready.add(health["worker"]["pid"])
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+
+
+async def drive(client: httpx.AsyncClient, requests: int, concurrency: int):
+    """(requests per second, p50, p95 latency in ms)"""
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(f"What does the report say about topic {i}?")
+
+    async def caller():
+        while not queue.empty():
+            message = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post("/api/chat", json={"message": message})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (
+        requests / elapsed,
+        statistics.median(latencies) * 1000,
+        latencies[int(len(latencies) * 0.95) - 1] * 1000
+    )
+
+
+async def measure(workers: int, args) -> tuple:
+    port = free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_workers:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            await wait_ready(client, workers)
+            # Warm up every worker before timing
+            await drive(client, args.concurrency * 2, args.concurrency)
+            return await drive(client, args.requests, args.concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            VECTOR_STORE="memmap",
+            CHROMA_DB_PATH=os.path.join(tmp, "db"),
+            UPLOAD_DIR=os.path.join(tmp, "uploads"),
+            EMBEDDING_CACHE_ENABLED="false",
+            ANSWER_CACHE_ENABLED="false"
+        )
+        print(f"corpus      {build_index(args.documents, args.paragraphs)} chunks, {os.cpu_count()} CPUs")
+        baseline = None
+        for workers in [int(n) for n in args.workers.split(",")]:
+            throughput, p50, p95 = asyncio.run(measure(workers, args))
+            baseline = baseline or throughput
+            print(f"workers {workers:<3} {throughput:8.1f} req/s  p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  "
+                  f"({throughput / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Synthetic corpus generation for benchmarks
+"""
+
+import random
+from io import BytesIO
+from typing import List, Tuple
+
+WORDS = (
+    "retrieval augmented generation vector embedding index query document chunk "
+    "latency throughput cache token model context answer source page section "
+    "database cluster network protocol server client request response memory "
+    "storage compute batch stream worker queue schedule budget metric trace"
+).split()
+
+
+def make_paragraphs(count: int, words_per_paragraph: int = 80, seed: int = 0) -> List[str]:
+    """Deterministic pseudo-English paragraphs"""
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(words_per_paragraph)).capitalize() + "."
+        for _ in range(count)
+    ]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, lines_per_page: int = 40, words_per_line: int = 12, seed: int = 0) -> bytes:
+    """Build a text-only PDF with Helvetica text on every page"""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page in range(pages):
+        lines = [f"Page {page + 1}."] + [
+            " ".join(rng.choice(WORDS) for _ in range(words_per_line)) for _ in range(lines_per_page)
+        ]
+        stream = "BT /F1 10 Tf 12 TL 50 760 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream_bytes = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream_bytes) + stream_bytes + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_txt(sections: int = 5, paragraphs_per_section: int = 6, seed: int = 0) -> bytes:
+    """Markdown-style text: a heading per section, then paragraphs"""
+    paragraphs = make_paragraphs(sections * paragraphs_per_section, seed=seed)
+    parts = []
+    for section in range(sections):
+        parts.append(f"## Section {section + 1}")
+        parts.extend(paragraphs[section * paragraphs_per_section:(section + 1) * paragraphs_per_section])
+    return "\n\n".join(parts).encode("utf-8")
+
+
+def make_docx(sections: int = 5, paragraphs_per_section: int = 6, seed: int = 0) -> bytes:
+    """A Word document with a Heading 1 per section, then paragraphs"""
+    from docx import Document
+    paragraphs = make_paragraphs(sections * paragraphs_per_section, seed=seed)
+    document = Document()
+    for section in range(sections):
+        document.add_heading(f"Section {section + 1}", level=1)
+        for paragraph in paragraphs[section * paragraphs_per_section:(section + 1) * paragraphs_per_section]:
+            document.add_paragraph(paragraph)
+    out = BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_documents(count: int, file_type: str, size: int = 5, seed: int = 0) -> List[Tuple[str, bytes]]:
+    """`count` (filename, content) pairs of one type: pdf, docx or txt
+
+    `size` is pages for PDFs and sections of six paragraphs otherwise.
+    """
+    makers = {
+        "pdf": lambda i: make_pdf(size, seed=seed + i),
+        "docx": lambda i: make_docx(size, seed=seed + i),
+        "txt": lambda i: make_txt(size, seed=seed + i),
+    }
+    return [(f"{file_type}_{i:04d}.{file_type}", makers[file_type](i)) for i in range(count)]
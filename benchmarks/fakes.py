@@ -0,0 +1,257 @@
+"""
+Local fake backends for benchmarks - no network, no model downloads
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+from pydantic import PrivateAttr
+
+
+class FakeLLM(LLM):
+    """LLM that answers after a fixed latency, like a remote completion API
+
+    `latency` is the time to the first token; each further token of the
+    answer takes `token_latency` seconds. A `slow_rate` share of calls take
+    `slow_latency` instead of `latency` (a latency tail), and a
+    `failure_rate` share fail after `latency` with `error` (a 429 by default).
+    """
+
+    latency: float = 0.5
+    token_latency: float = 0.0
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    failure_rate: float = 0.0
+    error: str = "Error code: 429 - Rate limit reached for requests"
+    answer: str = "This is a canned answer from the fake LLM."
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency"
+
+    def _tokens(self) -> List[str]:
+        words = self.answer.split(" ")
+        return [words[0]] + [" " + word for word in words[1:]]
+
+    def _first_token(self):
+        """(seconds to the first token, whether the call fails)"""
+        latency = self.slow_latency if random.random() < self.slow_rate else self.latency
+        return latency, random.random() < self.failure_rate
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        latency, fails = self._first_token()
+        time.sleep(latency)
+        if fails:
+            raise RuntimeError(self.error)
+        time.sleep(self.token_latency * (len(self._tokens()) - 1))
+        return self.answer
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        latency, fails = self._first_token()
+        await asyncio.sleep(latency)
+        if fails:
+            raise RuntimeError(self.error)
+        await asyncio.sleep(self.token_latency * (len(self._tokens()) - 1))
+        return self.answer
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        latency, fails = self._first_token()
+        for i, token in enumerate(self._tokens()):
+            time.sleep(latency if i == 0 else self.token_latency)
+            if fails:
+                raise RuntimeError(self.error)
+            yield GenerationChunk(text=token)
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        latency, fails = self._first_token()
+        for i, token in enumerate(self._tokens()):
+            await asyncio.sleep(latency if i == 0 else self.token_latency)
+            if fails:
+                raise RuntimeError(self.error)
+            yield GenerationChunk(text=token)
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words embeddings"""
+
+    def __init__(self, size: int = 384, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for token in text.lower().split():
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.size
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
+
+
+def _dense_layers(sizes: List[int], seed: int) -> List[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return [
+        (rng.standard_normal((inputs, outputs)) / np.sqrt(inputs)).astype(np.float32)
+        for inputs, outputs in zip(sizes, sizes[1:])
+    ]
+
+
+class CPUEmbeddings(Embeddings):
+    """Dense network on CPU standing in for a local sentence-transformer
+
+    As with a transformer on CPU, each forward pass reads all the weights,
+    so one input costs almost as much as a small batch of them.
+    """
+
+    def __init__(self, size: int = 384, hidden: int = 2048, layers: int = 4, seed: int = 0):
+        self.hashing = FakeEmbeddings(size=size)
+        self.weights = _dense_layers([size] + [hidden] * layers + [size], seed)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        x = np.asarray(self.hashing.embed_documents(texts), dtype=np.float32)
+        for weights in self.weights:
+            x = np.tanh(x @ weights)
+        x /= np.linalg.norm(x, axis=1, keepdims=True) + 1e-12
+        return x.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class CPULLM(LLM):
+    """Decoder loop on CPU standing in for a local HuggingFacePipeline
+
+    Each of `tokens` decode steps is one pass through a dense network for
+    all prompts of the call at once, like batched generation.
+    """
+
+    tokens: int = 32
+    hidden: int = 1024
+    layers: int = 2
+    answer: str = "This is a canned answer from the CPU model."
+    _weights: List[np.ndarray] = PrivateAttr(default_factory=list)
+
+    def model_post_init(self, __context: Any):
+        self._weights = _dense_layers([self.hidden] * (self.layers + 1), seed=1)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-cpu"
+
+    def _generate(self, prompts: List[str], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> LLMResult:
+        state = np.ones((len(prompts), self.hidden), dtype=np.float32)
+        for _ in range(self.tokens):
+            for weights in self._weights:
+                state = np.tanh(state @ weights)
+        return LLMResult(generations=[[Generation(text=self.answer)] for _ in prompts])
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return self._generate([prompt]).generations[0][0].text
+
+
+class FakeEmbeddingsServer:
+    """OpenAI-compatible /v1/embeddings endpoint on a local port
+
+    Each request takes `latency` seconds plus `token_latency` per input token
+    (approximated as words). More than `rate_limit` requests per second are
+    answered with 429 and a Retry-After header.
+    """
+
+    def __init__(self, size: int = 384, latency: float = 0.1, token_latency: float = 0.0, rate_limit: float = 0.0):
+        self.embeddings = FakeEmbeddings(size=size)
+        self.latency = latency
+        self.token_latency = token_latency
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._server = None
+
+    def _admit(self) -> bool:
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_count = now, 0
+            if self._window_count >= self.rate_limit:
+                self.rejected += 1
+                return False
+            self._window_count += 1
+            return True
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: Optional[dict] = None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake._lock:
+                    fake.requests += 1
+                if not fake._admit():
+                    self._send(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                               {"Retry-After": "1"})
+                    return
+                inputs = request["input"]
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                tokens = sum(len(text.split()) for text in inputs)
+                time.sleep(fake.latency + fake.token_latency * tokens)
+                vectors = fake.embeddings.embed_documents(inputs)
+                data = []
+                for index, vector in enumerate(vectors):
+                    if request.get("encoding_format") == "base64":
+                        vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+                    data.append({"object": "embedding", "index": index, "embedding": vector})
+                self._send(200, {
+                    "object": "list",
+                    "data": data,
+                    "model": request.get("model", "fake"),
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+                })
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
@@ -0,0 +1,295 @@
+"""
+Benchmark suite - end-to-end scenarios with results as JSON for comparing commits
+
+Runs every scenario offline against the fake backends in benchmarks/fakes.py
+and the synthetic corpus in benchmarks/corpus.py (fixed seeds), each in a
+fresh subprocess so peak RSS is per scenario:
+
+  ingest     documents/s, chunks/s and MB/s for PDF, DOCX and TXT files
+  query      retrieval and full chat pipeline latency p50/p99 (LLM answers at once)
+  chat_load  /api/chat over a local socket at a fixed concurrency: req/s, p50/p99
+  startup    seconds until a fresh server process is live and ready, and its RSS
+
+The results, with the git commit, machine and configuration, are written as
+JSON; --compare prints the change of every metric between two result files.
+
+Usage: python -m benchmarks.suite [--output bench-results.json] [--scale 1] [--only ingest,query] [--vector-store chroma]
+       python -m benchmarks.suite --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+SCENARIOS = ("ingest", "query", "chat_load", "startup")
+SEED = 0
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, float]:
+    values = np.array(seconds) * 1000
+    return {"p50_ms": round(float(np.percentile(values, 50)), 2), "p99_ms": round(float(np.percentile(values, 99)), 2)}
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def _engine(llm_latency: float = 0.0):
+    from app.rag_engine import RAGEngine
+    from benchmarks.fakes import FakeEmbeddings, FakeLLM
+    return RAGEngine(embeddings=FakeEmbeddings(), llm=FakeLLM(latency=llm_latency))
+
+
+def _ingest_txt(engine, count: int):
+    """Ingest `count` synthetic TXT documents"""
+    from app.document_processor import DocumentProcessor
+    from benchmarks.corpus import make_documents
+    processor = DocumentProcessor()
+    for filename, content in make_documents(count, "txt", seed=SEED):
+        engine.add_documents(processor.iter_records(filename, content))
+
+
+def _queries(count: int) -> List[str]:
+    from benchmarks.corpus import make_paragraphs
+    rng = random.Random(SEED)
+    queries = []
+    for paragraph in make_paragraphs(count, seed=SEED + 1):
+        words = paragraph.rstrip(".").split()
+        start = rng.randrange(len(words) - 12)
+        queries.append(" ".join(words[start:start + 12]))
+    return queries
+
+
+def run_ingest(scale: float) -> dict:
+    from app.document_processor import DocumentProcessor
+    from benchmarks.corpus import make_documents
+    engine = _engine()
+    processor = DocumentProcessor()
+    results = {}
+    for file_type in ("pdf", "docx", "txt"):
+        documents = make_documents(max(1, int(20 * scale)), file_type, seed=SEED)
+        chunks = 0
+        start = time.perf_counter()
+        for filename, content in documents:
+            counts = engine.add_documents(processor.iter_records(filename, content, collection=file_type))
+            chunks += counts["added"] + counts["skipped"]
+        elapsed = time.perf_counter() - start
+        megabytes = sum(len(content) for _, content in documents) / 1e6
+        results[file_type] = {
+            "documents": len(documents),
+            "chunks": chunks,
+            "seconds": round(elapsed, 3),
+            "documents_per_s": round(len(documents) / elapsed, 2),
+            "chunks_per_s": round(chunks / elapsed, 1),
+            "mb_per_s": round(megabytes / elapsed, 3)
+        }
+    return results
+
+
+def run_query(scale: float) -> dict:
+    engine = _engine()
+    _ingest_txt(engine, max(1, int(100 * scale)))
+    queries = _queries(max(10, int(200 * scale)))
+    for query in queries[:10]:
+        engine.generate_response(query)
+    retrieve, chat = [], []
+    for query in queries:
+        start = time.perf_counter()
+        engine._retrieve(query, True)
+        retrieve.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        engine.generate_response(query)
+        chat.append(time.perf_counter() - start)
+    return {"chunks": engine.chunk_count(), "queries": len(queries), "retrieve": _percentiles(retrieve), "chat": _percentiles(chat)}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_chat_load(scale: float, concurrency: int = 16, llm_latency: float = 0.05) -> dict:
+    import httpx
+    import uvicorn
+    from app import main
+    main.rag_engine = _engine(llm_latency)
+    _ingest_txt(main.rag_engine, max(1, int(100 * scale)))
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=_free_port(), log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    queries = _queries(max(concurrency, int(400 * scale)))
+
+    async def drive():
+        latencies = []
+        pending = iter(queries)
+
+        async def caller(client):
+            for query in pending:
+                start = time.perf_counter()
+                response = await client.post("/api/chat", json={"message": query})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(caller(client) for _ in range(concurrency)))
+            return time.perf_counter() - start, latencies
+
+    elapsed, latencies = asyncio.run(drive())
+    server.should_exit = True
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "llm_latency_ms": llm_latency * 1000,
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        **_percentiles(latencies)
+    }
+
+
+def create_app():
+    """App factory for the startup scenario: fake models instead of downloads"""
+    from app import main
+    from benchmarks.fakes import FakeEmbeddings, FakeLLM
+    main.rag_engine.embeddings = FakeEmbeddings()
+    main.rag_engine.llm = FakeLLM(latency=0)
+    return main.app
+
+
+def run_startup(scale: float) -> dict:
+    import httpx
+    # The server opens an index of realistic size
+    _ingest_txt(_engine(), max(1, int(100 * scale)))
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.suite:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        stderr=subprocess.DEVNULL
+    )
+    live = ready = None
+    try:
+        while ready is None:
+            if time.perf_counter() - start > 120:
+                raise RuntimeError("Server did not become ready within 120s")
+            try:
+                status = httpx.get(f"http://127.0.0.1:{port}/health/ready").status_code
+                live = live or time.perf_counter() - start
+                if status == 200:
+                    ready = time.perf_counter() - start
+            except httpx.TransportError:
+                time.sleep(0.02)
+    finally:
+        server.terminate()
+        server.wait()
+    return {"live_seconds": round(live, 3), "ready_seconds": round(ready, 3), "server_peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+
+def run_scenario(name: str, scale: float) -> dict:
+    # Keep engine logging out of the scenario's output
+    logging.basicConfig(level=logging.WARNING)
+    result = {"ingest": run_ingest, "query": run_query, "chat_load": run_chat_load, "startup": run_startup}[name](scale)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"before {before.get('commit', '?')[:10]}  after {after.get('commit', '?')[:10]}")
+    old, new = _flatten(before["scenarios"]), _flatten(after["scenarios"])
+    for name in sorted(old.keys() | new.keys()):
+        a, b = old.get(name), new.get(name)
+        change = f"{(b - a) / a * 100:+7.1f}%" if a and b is not None else ""
+        print(f"{name:<40} {a if a is not None else '-':>12} {b if b is not None else '-':>12} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--scale", type=float, default=1.0, help="corpus and request counts relative to the defaults")
+    parser.add_argument("--only", help=f"comma-separated scenarios ({', '.join(SCENARIOS)})")
+    parser.add_argument("--vector-store", default="chroma", choices=("chroma", "memmap"))
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario, args.scale)))
+        return
+
+    scenarios = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    report = {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {"scale": args.scale, "vector_store": args.vector_store, "seed": SEED},
+        "scenarios": {}
+    }
+    for name in scenarios:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                VECTOR_STORE=args.vector_store,
+                CHROMA_DB_PATH=os.path.join(tmp, "db"),
+                UPLOAD_DIR=os.path.join(tmp, "uploads"),
+                ANSWER_CACHE_ENABLED="false",
+                WEB_CONCURRENCY="1"
+            )
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.suite", "--scenario", name, "--scale", str(args.scale)],
+                check=True, capture_output=True, text=True, env=env
+            ).stdout
+        result = report["scenarios"][name] = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:<10} {json.dumps(result)}")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
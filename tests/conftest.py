@@ -0,0 +1,29 @@
+"""
+Shared fixtures - engines over temporary stores with the local fake backends
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.rag_engine import RAGEngine
+from benchmarks.fakes import FakeEmbeddings, FakeLLM
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    """RAGEngine factory over a fresh store under tmp_path; no network, no model downloads"""
+    monkeypatch.setenv("CHROMA_DB_PATH", str(tmp_path / "db"))
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+    monkeypatch.delenv("CHROMA_SERVER_HOST", raising=False)
+
+    def make(vector_store: str = "memmap", **env) -> RAGEngine:
+        monkeypatch.setenv("VECTOR_STORE", vector_store)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return RAGEngine(embeddings=FakeEmbeddings(latency=0), llm=FakeLLM(latency=0))
+
+    return make
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from app import bm25_index
+from app.bm25_index import BM25Index
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda sigma omega".split()
+
+
+def corpus(n, seed=7):
+    rng = random.Random(seed)
+    return {
+        f"c{i}": (" ".join(rng.choice(WORDS) for _ in range(12)), {"document_id": f"d{i % 10}", "collection": "default"})
+        for i in range(n)
+    }
+
+
+def build(chunks, path=None):
+    index = BM25Index(path)
+    ids = list(chunks)
+    index.add(ids, [chunks[i][0] for i in ids], [chunks[i][1] for i in ids])
+    return index
+
+
+@pytest.mark.parametrize("compact_after", [1, 10 ** 6])
+def test_remove_matches_a_fresh_index(tmp_path, monkeypatch, compact_after):
+    monkeypatch.setattr(bm25_index, "_COMPACT_MIN_TOMBSTONES", compact_after)
+    chunks = corpus(200)
+    index = build(chunks, str(tmp_path / "bm25.sqlite"))
+    removed = [chunk_id for chunk_id in chunks if chunk_id.endswith(("3", "7"))]
+
+    index.remove(removed)
+
+    survivors = {chunk_id: value for chunk_id, value in chunks.items() if chunk_id not in removed}
+    fresh = build(survivors)
+    assert len(index) == len(survivors)
+    for query in ("alpha beta", "omega", "kappa sigma theta"):
+        expected = fresh.search(query, k=len(survivors))
+        actual = index.search(query, k=len(survivors))
+        assert [chunk_id for chunk_id, _ in actual] == [chunk_id for chunk_id, _ in expected]
+        assert [score for _, score in actual] == pytest.approx([score for _, score in expected], rel=1e-5)
+    assert index.search("alpha", collection="default", document_ids=["d3", "d7"]) == []
+    if compact_after == 1:
+        assert index._tombstones == []
+
+
+def test_replica_sees_removals(tmp_path):
+    path = str(tmp_path / "bm25.sqlite")
+    writer = build(corpus(50), path)
+    replica = BM25Index(path, read_only=True)
+
+    writer.remove(["c1", "c2"])
+
+    hits = {chunk_id for chunk_id, _ in replica.search("alpha beta gamma", k=50)}
+    assert hits and not hits & {"c1", "c2"}
@@ -0,0 +1,52 @@
+import time
+
+from app.document_processor import DocumentProcessor
+from app.ingest_jobs import IngestJobQueue
+from benchmarks.corpus import make_paragraphs
+
+
+def wait_for(queue, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    job = queue.get(job_id)
+    while job["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline, f"job {job_id} still {job['status']}"
+        time.sleep(0.05)
+        job = queue.get(job_id)
+    return job
+
+
+def test_same_content_under_another_name_is_a_duplicate(make_engine, tmp_path):
+    engine = make_engine()
+    queue = IngestJobQueue(engine, DocumentProcessor(), upload_dir=str(tmp_path / "uploads"), workers=1)
+    content = "\n\n".join(make_paragraphs(10)).encode()
+    try:
+        first = wait_for(queue, queue.submit("handbook.txt", content))
+        chunks = engine.chunk_count()
+        second = wait_for(queue, queue.submit("handbook-copy.txt", content))
+    finally:
+        queue.shutdown()
+
+    assert first["status"] == "done" and first["new_chunks"] == chunks > 0
+    assert second["status"] == "done"
+    assert second["details"]["duplicate_of"] == "handbook.txt"
+    assert second["new_chunks"] == 0
+    assert engine.chunk_count() == chunks
+    assert [document["filename"] for document in engine.list_documents()[0]] == ["handbook.txt"]
+
+
+def test_repeated_and_already_indexed_chunks_are_reported_apart(make_engine, tmp_path):
+    engine = make_engine()
+    queue = IngestJobQueue(engine, DocumentProcessor(), upload_dir=str(tmp_path / "uploads"), workers=1)
+    paragraphs = make_paragraphs(12, words_per_paragraph=400)
+    try:
+        first = wait_for(queue, queue.submit("handbook.txt", "\n\n".join(paragraphs + paragraphs[:4]).encode()))
+        second = wait_for(queue, queue.submit("handbook.txt", "\n\n".join(paragraphs + make_paragraphs(2, words_per_paragraph=400, seed=7)).encode()))
+    finally:
+        queue.shutdown()
+
+    assert first["status"] == "done"
+    assert first["skipped_chunks"] > 0
+    assert f"0 already in the knowledge base, {first['skipped_chunks']} repeated within the document" in first["message"]
+    assert first["started_at"] < first["embedding_started_at"] < first["finished_at"]
+    assert second["new_chunks"] > 0
+    assert f"{second['skipped_chunks']} already in the knowledge base, 0 repeated" in second["message"]
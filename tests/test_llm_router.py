@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from app.llm_router import Backend, LLMRouter, LLMUnavailableError
+from benchmarks.fakes import FakeLLM
+
+
+def backend(name, cooldown=30.0, timeout=5.0, **llm):
+    return Backend(name, FakeLLM(**dict(dict(latency=0, answer=name), **llm)), timeout=timeout, failure_threshold=2, cooldown=cooldown)
+
+
+def test_fails_over_to_next_backend():
+    primary, secondary = backend("primary", failure_rate=1.0), backend("secondary")
+    router = LLMRouter([primary, secondary])
+
+    assert router.invoke("question") == "secondary"
+    assert asyncio.run(router.ainvoke("question")) == "secondary"
+    assert primary.stats()["requests"] == 2
+    assert primary.state == "open"
+
+
+def test_all_backends_failing_raises():
+    router = LLMRouter([backend("a", failure_rate=1.0), backend("b", failure_rate=1.0)])
+
+    with pytest.raises(LLMUnavailableError, match="All LLM backends failed"):
+        router.invoke("question")
+
+
+def test_circuit_opens_then_half_opens_and_closes_after_cooldown():
+    primary, secondary = backend("primary", cooldown=0.2, failure_rate=1.0), backend("secondary")
+    router = LLMRouter([primary, secondary])
+
+    for _ in range(2):
+        router.invoke("question")
+    assert primary.state == "open"
+    # While open, requests skip the primary without calling it
+    router.invoke("question")
+    assert primary.stats()["requests"] == 2
+
+    time.sleep(0.25)
+    assert primary.state == "half_open"
+    primary.llm.failure_rate = 0.0
+    # The trial request goes to the primary and closes the circuit
+    assert router.invoke("question") == "primary"
+    assert primary.state == "closed"
+
+
+def test_failed_trial_reopens_circuit():
+    primary, secondary = backend("primary", cooldown=0.2, failure_rate=1.0), backend("secondary")
+    router = LLMRouter([primary, secondary])
+    for _ in range(2):
+        router.invoke("question")
+
+    time.sleep(0.25)
+    assert router.invoke("question") == "secondary"
+    assert primary.state == "open"
+
+
+def test_hedged_request_wins_over_slow_primary():
+    primary, secondary = backend("primary", latency=1.0), backend("secondary")
+    router = LLMRouter([primary, secondary], hedge=True, hedge_min_samples=5)
+    # The primary's p95 so far is 50ms
+    for _ in range(5):
+        primary.record_success(0.05)
+
+    start = time.perf_counter()
+    answer = router.invoke("question")
+    elapsed = time.perf_counter() - start
+
+    assert answer == "secondary"
+    assert router.hedges == 1
+    assert elapsed < 0.5
+
+
+def test_stream_fails_over_when_first_chunk_times_out():
+    slow, fast = backend("slow answer", timeout=0.2, latency=1.0), backend("fast answer")
+    router = LLMRouter([slow, fast])
+
+    async def collect():
+        return "".join([chunk async for chunk in router.astream("question")])
+
+    start = time.perf_counter()
+    answer = asyncio.run(collect())
+    elapsed = time.perf_counter() - start
+
+    assert answer == "fast answer"
+    assert elapsed < 0.6
+    assert slow.stats()["error_rate"] == 1.0
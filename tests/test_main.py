@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_creates_no_files(tmp_path):
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        CHROMA_DB_PATH=str(tmp_path / "db"),
+        CONVERSATION_DB_PATH=str(tmp_path / "conversations" / "conversations.sqlite"),
+        WEB_CONCURRENCY="4"
+    )
+    subprocess.run([sys.executable, "-c", "import app.main"], cwd=tmp_path, env=env, check=True, timeout=120)
+    assert os.listdir(tmp_path) == []
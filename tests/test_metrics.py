@@ -0,0 +1,63 @@
+import time
+
+from app.metrics import Counter, Gauge, Histogram, Registry, SharedMetrics
+
+
+def worker_metrics(path, pid, interval=60.0):
+    registry = Registry()
+    metrics = (
+        registry.register(Counter("jobs_total", "Jobs", labelnames=("status",))),
+        registry.register(Histogram("stage_seconds", "Stages", labelnames=("stage",), buckets=(0.1, 1.0))),
+        registry.register(Gauge("circuit_open", "Open circuits", labelnames=("backend",)))
+    )
+    shared = SharedMetrics(registry, str(path), interval=interval)
+    shared.pid = pid
+    return shared, metrics
+
+
+def test_a_scrape_of_one_worker_covers_every_worker(tmp_path):
+    path = tmp_path / "metrics.sqlite"
+    first, (jobs, stages, circuit) = worker_metrics(path, pid=1)
+    second, (other_jobs, other_stages, other_circuit) = worker_metrics(path, pid=2)
+    jobs.inc(status="done")
+    stages.observe(0.05, stage="embed")
+    circuit.set(0, backend="openai")
+    other_jobs.inc(2, status="done")
+    other_jobs.inc(status="failed")
+    other_stages.observe(0.5, stage="embed")
+    other_circuit.set(1, backend="openai")
+    try:
+        second.flush()
+        lines = first.render().splitlines()
+    finally:
+        first.close()
+        second.close()
+
+    assert 'jobs_total{status="done"} 3.0' in lines
+    assert 'jobs_total{status="failed"} 1.0' in lines
+    buckets = [line for line in lines if line.startswith("stage_seconds_bucket")]
+    assert buckets == [
+        'stage_seconds_bucket{stage="embed",le="0.1"} 1',
+        'stage_seconds_bucket{stage="embed",le="1.0"} 2',
+        'stage_seconds_bucket{stage="embed",le="+Inf"} 2'
+    ]
+    assert 'stage_seconds_count{stage="embed"} 2' in lines
+    assert 'circuit_open{backend="openai"} 1' in lines
+
+
+def test_exited_workers_keep_their_counts_but_not_their_gauges(tmp_path):
+    path = tmp_path / "metrics.sqlite"
+    exited, (jobs, _, circuit) = worker_metrics(path, pid=1, interval=0.01)
+    jobs.inc(status="done")
+    circuit.set(1, backend="openai")
+    exited.close()
+    time.sleep(0.1)
+
+    live, _ = worker_metrics(path, pid=2, interval=0.01)
+    try:
+        lines = live.render().splitlines()
+    finally:
+        live.close()
+
+    assert 'jobs_total{status="done"} 1.0' in lines
+    assert not any(line.startswith("circuit_open{") for line in lines)
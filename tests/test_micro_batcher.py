@@ -0,0 +1,44 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.language_models.llms import LLM
+
+from app.micro_batcher import BatchedLLM
+
+
+class ThreadRecordingLLM(LLM):
+    """Answers with the prompt and records the threads it ran on"""
+
+    threads: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "thread-recording"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        self.threads.append(threading.current_thread().name)
+        if prompt == "fail":
+            raise RuntimeError("model failed")
+        return f"{prompt}|{','.join(stop or [])}"
+
+
+def test_calls_with_options_run_on_the_batcher_thread():
+    inner = ThreadRecordingLLM()
+    llm = BatchedLLM(llm=inner, max_batch_size=8, max_wait_ms=20)
+    calls = [("plain", None), ("stopped", ["\n"]), ("other", None), ("also", ["END"])]
+    with ThreadPoolExecutor(len(calls)) as pool:
+        answers = list(pool.map(lambda call: llm.invoke(call[0], stop=call[1]), calls))
+    assert answers == ["plain|", "stopped|\n", "other|", "also|END"]
+    assert set(inner.threads) == {"llm-batcher"}
+
+
+def test_a_failing_call_with_options_fails_alone():
+    llm = BatchedLLM(llm=ThreadRecordingLLM(), max_batch_size=8, max_wait_ms=20)
+    with ThreadPoolExecutor(2) as pool:
+        failing = pool.submit(llm.invoke, "fail", stop=["\n"])
+        plain = pool.submit(llm.invoke, "plain")
+        assert plain.result() == "plain|"
+        with pytest.raises(RuntimeError, match="model failed"):
+            failing.result()
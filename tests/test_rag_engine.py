@@ -0,0 +1,60 @@
+import asyncio
+
+from app.document_processor import ChunkRecord
+
+
+def records(document_id, filename, texts, collection="default"):
+    return [
+        ChunkRecord(text, {"source": filename, "document_id": document_id, "collection": collection})
+        for text in texts
+    ]
+
+
+def test_add_documents_two_documents_chroma(make_engine):
+    engine = make_engine("chroma")
+    chunks = (
+        records("doc-a", "a.txt", [f"Alpha paragraph {i} about retrieval." for i in range(5)])
+        + records("doc-b", "b.txt", [f"Beta paragraph {i} about indexing." for i in range(3)])
+    )
+
+    counts = engine.add_documents(iter(chunks))
+
+    assert counts == {"added": 8, "skipped": 0, "repeated": 0, "removed": 0}
+    assert engine.chunk_count() == 8
+    assert engine.get_document("doc-a")["chunk_count"] == 5
+    assert engine.get_document("doc-b")["chunk_count"] == 3
+    # Re-ingesting stores nothing new
+    assert engine.add_documents(iter(chunks)) == {"added": 0, "skipped": 8, "repeated": 0, "removed": 0}
+
+
+def test_near_duplicate_distance_above_three_is_rejected(make_engine, caplog):
+    engine = make_engine(NEAR_DUPLICATE_DETECTION="true", NEAR_DUPLICATE_DISTANCE="5")
+    assert engine.near_duplicates is None
+    assert "between 0 and 3, got 5" in caplog.text
+
+    engine = make_engine(NEAR_DUPLICATE_DETECTION="true", NEAR_DUPLICATE_DISTANCE="2")
+    assert engine.near_duplicates.max_distance == 2
+
+
+def test_streamed_answer_is_not_cached_across_a_knowledge_base_change(make_engine):
+    engine = make_engine(ANSWER_CACHE_ENABLED="true")
+    engine.add_documents(iter(records("doc-a", "a.txt", ["Alpha paragraph about retrieval."])))
+    lookup = engine.answer_cache.lookup
+
+    def lookup_during_ingest(query_vector, scope):
+        # Another upload lands while the cache is consulted
+        engine.answer_cache.invalidate()
+        return lookup(query_vector, scope)
+
+    async def stream(query):
+        return [event async for event in engine.astream_response(query)]
+
+    engine.answer_cache.lookup = lookup_during_ingest
+    events = asyncio.run(stream("What is alpha about?"))
+    assert events[-1]["event"] == "done" and not events[-1]["cached"]
+    engine.answer_cache.lookup = lookup
+
+    events = asyncio.run(stream("What is alpha about?"))
+    assert not events[-1]["cached"]
+    events = asyncio.run(stream("What is alpha about?"))
+    assert events[-1]["cached"]
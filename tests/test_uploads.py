@@ -0,0 +1,26 @@
+import os
+
+from benchmarks.bench_upload_memory import measure, write_upload
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_concurrent_uploads_keep_peak_rss_flat(tmp_path):
+    """Four 16MB uploads at once: a server that read each one into memory would grow by over 64MB"""
+    uploads, megabytes = 4, 16
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+        CHROMA_DB_PATH=str(tmp_path / "db"),
+        UPLOAD_DIR=str(tmp_path / "uploads"),
+        MAX_UPLOAD_MB=str(megabytes + 10),
+        WEB_CONCURRENCY="1"
+    )
+    files = []
+    for i in range(uploads):
+        files.append(str(tmp_path / f"upload{i}.txt"))
+        write_upload(files[-1], megabytes)
+
+    _, growth_mb = measure(env, "/api/upload-document", files)
+
+    assert growth_mb < 24, f"peak RSS grew by {growth_mb:.1f}MB during {uploads} x {megabytes}MB uploads"